@@ -1,30 +1,662 @@
-import streamlit as st
-import pandas as pd
-import mysql.connector as db
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+import os
+import sys
 import json
+import functools
+import importlib
+import logging
 import re
+import time
+import random
+import sqlite3
+import threading
+import queue
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from contextlib import contextmanager
 from datetime import datetime
+from urllib.parse import urlsplit, parse_qsl, urlencode
+from zoneinfo import ZoneInfo
 
-# Suppress warnings globally
-st.set_option('deprecation.showfileUploaderEncoding', False)
-st.set_option('deprecation.showPyplotGlobalUse', False)
+import storage
+
+# Stand-in for a module that is only imported when one of its attributes is first used
+# pandas, numpy and MySQL Connector (with the discovery client, see build_youtube_client) take about
+# half a second to import, which the Home and Technologies Used pages don't need to pay
+class LazyModule:
+    def __init__(self, name):
+        self.name = name
+        self.module = None
+
+    def __getattr__(self, attr):
+        if self.module is None:
+            self.module = importlib.import_module(self.name)
+        return getattr(self.module, attr)
+
+pd = LazyModule("pandas")
+np = LazyModule("numpy")
+pooling = LazyModule("mysql.connector.pooling")
+
+# Storage backend (MySQL, SQLite or DuckDB, see storage.py); db.Error is the backend's error class
+db = storage.create_backend()
+
+logger = logging.getLogger("youtube_harvest")
+
+# Function to check whether the code runs inside a Streamlit script run
+# Streamlit is never imported here, so headless callers don't pay its import cost
+def running_in_streamlit():
+    if "streamlit" not in sys.modules:
+        return False
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return True
+    return get_script_run_ctx() is not None
+
+# Function to report an error in the Streamlit UI when available, and in the log
+def show_error(message):
+    logger.error(message)
+    metrics.increment("youtube_harvest_reported_total", level="error")
+    if running_in_streamlit():
+        import streamlit as st
+        st.error(message)
+
+# Function to report a warning in the Streamlit UI when available, and in the log
+def show_warning(message):
+    logger.warning(message)
+    metrics.increment("youtube_harvest_reported_total", level="warning")
+    if running_in_streamlit():
+        import streamlit as st
+        st.warning(message)
+
+# Upper bounds (seconds) of the latency histogram buckets
+METRIC_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# In-process counters and latency histograms for the harvest hot paths
+# Series are keyed by metric name plus a sorted tuple of label pairs
+class Metrics:
+    def __init__(self, buckets=METRIC_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.histograms = {}
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                # One slot per bucket plus +Inf; counts are per bucket, made cumulative on export
+                histogram = self.histograms[key] = {"counts": [0] * (len(self.buckets) + 1), "count": 0, "sum": 0.0}
+            slot = len(self.buckets)
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    slot = index
+                    break
+            histogram["counts"][slot] += 1
+            histogram["count"] += 1
+            histogram["sum"] += seconds
+
+    # Record one timed call: a latency sample plus a call count by status
+    def record(self, name, seconds, status="ok", **labels):
+        self.observe(name + "_seconds", seconds, **labels)
+        self.increment(name + "_total", status=status, **labels)
+
+    # Time the body of a with block as one call
+    @contextmanager
+    def timed(self, name, **labels):
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            self.record(name, time.perf_counter() - start, status, **labels)
+
+    # Approximate quantile from the histogram: the upper bound of the bucket holding it
+    # None when it falls in the +Inf bucket
+    def quantile(self, histogram, q):
+        target = q * histogram["count"]
+        seen = 0
+        for bound, count in zip(self.buckets, histogram["counts"]):
+            seen += count
+            if seen >= target:
+                return bound
+        return None
+
+    def snapshot(self):
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = dict((key, {"counts": list(value["counts"]), "count": value["count"], "sum": value["sum"]})
+                              for key, value in self.histograms.items())
+        return counters, histograms
+
+    def to_dict(self):
+        counters, histograms = self.snapshot()
+        return {
+            "counters": [{"name": name, "labels": dict(labels), "value": value}
+                         for (name, labels), value in sorted(counters.items())],
+            "histograms": [{"name": name, "labels": dict(labels), "count": value["count"], "sum": value["sum"],
+                            "p50": self.quantile(value, 0.5), "p95": self.quantile(value, 0.95),
+                            "buckets": dict(zip([str(bound) for bound in self.buckets] + ["+Inf"], value["counts"]))}
+                           for (name, labels), value in sorted(histograms.items())]
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    # Prometheus text exposition format (version 0.0.4)
+    def to_prometheus(self):
+        counters, histograms = self.snapshot()
+        format_labels = lambda labels: ",".join('{}="{}"'.format(name, str(value).replace('"', '\\"'))
+                                                for name, value in labels)
+        lines = []
+        typed = set()
+        for (name, labels), value in sorted(counters.items()):
+            if name not in typed:
+                lines.append("# TYPE {} counter".format(name))
+                typed.add(name)
+            lines.append("{}{{{}}} {}".format(name, format_labels(labels), value))
+        for (name, labels), value in sorted(histograms.items()):
+            if name not in typed:
+                lines.append("# TYPE {} histogram".format(name))
+                typed.add(name)
+            cumulative = 0
+            for bound, count in zip([str(bound) for bound in self.buckets] + ["+Inf"], value["counts"]):
+                cumulative += count
+                lines.append("{}_bucket{{{}}} {}".format(name, format_labels(labels + (("le", bound),)), cumulative))
+            lines.append("{}_sum{{{}}} {}".format(name, format_labels(labels), value["sum"]))
+            lines.append("{}_count{{{}}} {}".format(name, format_labels(labels), value["count"]))
+        return "\n".join(lines) + "\n"
+
+    # Statuses are "ok"/"error" for timed calls and the HTTP status for API requests
+    @staticmethod
+    def is_error(status):
+        return status == "error" or (status.isdigit() and int(status) >= 400)
+
+    # One row per timed series for display: calls, errors, mean and approximate p50/p95 in ms
+    def summary_rows(self):
+        counters, histograms = self.snapshot()
+        to_ms = lambda seconds: None if seconds is None else 1000 * seconds
+        rows = []
+        for (name, labels), value in sorted(histograms.items()):
+            base = name[:-len("_seconds")]
+            errors = sum(count for (counter, counter_labels), count in counters.items()
+                         if counter == base + "_total" and self.is_error(dict(counter_labels).get("status"))
+                         and all(item in counter_labels for item in labels))
+            rows.append({"Metric": base, "Labels": ", ".join("{}={}".format(*item) for item in labels),
+                         "Calls": value["count"], "Errors": errors,
+                         "Mean_ms": round(1000 * value["sum"] / value["count"], 2) if value["count"] else 0.0,
+                         "P50_ms": to_ms(self.quantile(value, 0.5)), "P95_ms": to_ms(self.quantile(value, 0.95))})
+        return rows
+
+# Process-wide metrics shared by the app, the CLI and the benchmarks
+metrics = Metrics()
+
+# Decorator timing every call of a function as youtube_harvest_call{kind, function}
+def instrumented(kind):
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with metrics.timed("youtube_harvest_call", kind=kind, function=func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+# Function to serve the metrics over HTTP on a background thread
+# GET /metrics returns the Prometheus text format, GET /metrics.json the JSON dump
+def start_metrics_server(port, host="0.0.0.0"):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.startswith("/metrics.json"):
+                body, content_type = metrics.to_json(), "application/json"
+            elif self.path.startswith("/metrics"):
+                body, content_type = metrics.to_prometheus(), "text/plain; version=0.0.4"
+            else:
+                self.send_error(404)
+                return
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# Database settings, overridable through the environment
+DB_CONFIG = {
+    "host": os.environ.get("MYSQL_HOST", "localhost"),
+    "port": int(os.environ.get("MYSQL_PORT", "3306")),
+    "user": os.environ.get("MYSQL_USER", "root"),
+    "password": os.environ.get("MYSQL_PASSWORD", "123"),
+    "database": os.environ.get("MYSQL_DATABASE", "y_data")
+}
+DB_POOL_SIZE = int(os.environ.get("MYSQL_POOL_SIZE", "5"))
+
+db_pool = None
+db_pool_lock = threading.Lock()
+
+# Function to create a MySQL connection pool of DB_POOL_SIZE connections
+# The Streamlit app keeps the one it creates in st.cache_resource, so reruns don't open new pools
+def create_connection_pool():
+    return pooling.MySQLConnectionPool(pool_name="y_data_pool",
+                                       pool_size=DB_POOL_SIZE,
+                                       pool_reset_session=True,
+                                       **DB_CONFIG)
+
+# Function to create the shared connection pool on first use
+def get_connection_pool():
+    global db_pool
+    with db_pool_lock:
+        if db_pool is None:
+            db_pool = create_connection_pool()
+        return db_pool
+
+# Function to borrow a connection from the pool; close() hands it back
+# The embedded backends open a connection to their database file instead
+def get_connection():
+    if db.name == "mysql":
+        return get_connection_pool().get_connection()
+    return db.connect()
+
+# Function to switch the storage backend, e.g. use_storage("sqlite", "youtube.sqlite3")
+# Cached query results and tag IDs belong to the old database and are dropped
+def use_storage(name, path=None):
+    global db
+    if hasattr(db, "close"):
+        db.close()
+    db = storage.create_backend(name, path)
+    query_cache.clear()
+    with tag_ids_lock:
+        tag_ids.clear()
+    return db
+
+# Context manager that returns the borrowed connection to the pool even on errors
+@contextmanager
+def pooled_connection():
+    connection = get_connection()
+    try:
+        yield connection
+    finally:
+        connection.close()
 
 # Establish database connection
 def establish_connection():
     try:
-        connection = db.connect(host="localhost", user="root", password="123", database="y_data")
+        connection = get_connection()
         return connection
     except db.Error as e:
-        st.error("Error establishing connection: {}".format(e))
+        show_error("Error establishing connection: {}".format(e))
+        return None
+
+# YouTube Data API v3 discovery document shipped with the app, so building a client never downloads it
+DISCOVERY_DOCUMENT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "discovery", "youtube.v3.json")
+
+# Function to read and parse the bundled discovery document (kept across reruns with st.cache_resource)
+def load_discovery_document(path=DISCOVERY_DOCUMENT_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+# Function to build a YouTube API client from the discovery document, without any network call
+# Building from an already parsed document takes well under a millisecond
+def build_youtube_client(api_key, document=None, **kwargs):
+    from googleapiclient.discovery import build_from_document
+    return build_from_document(document or load_discovery_document(), developerKey=api_key, **kwargs)
+
+# Quota units charged by the YouTube Data API for each list endpoint
+QUOTA_COSTS = {
+    "channels": 1,
+    "playlistItems": 1,
+    "playlists": 1,
+    "videos": 1,
+    "commentThreads": 1,
+    "comments": 1,
+    "search": 100
+}
+
+# Error reasons that mean "slow down" rather than "this request is wrong"
+RETRYABLE_REASONS = ("quotaExceeded", "rateLimitExceeded", "userRateLimitExceeded")
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+# Raised when a request would go over the daily quota tracked by the rate limiter
+class QuotaExceededError(Exception):
+    pass
+
+# Token-bucket rate limiter shared by every thread that calls the API
+# Tracks requests per second and the daily quota units spent per endpoint
+class RateLimiter:
+    def __init__(self, requests_per_second=10, daily_quota=10000, quota_costs=None):
+        self.rate = requests_per_second
+        self.capacity = max(1, requests_per_second)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.daily_quota = daily_quota
+        self.quota_costs = quota_costs or QUOTA_COSTS
+        self.quota_used = {}
+        self.quota_day = self._today()
+        self.paused_until = 0
+        self.lock = threading.Lock()
+
+    # The API quota resets at midnight Pacific time
+    def _today(self):
+        return datetime.now(ZoneInfo("America/Los_Angeles")).date()
+
+    def total_quota_used(self):
+        with self.lock:
+            return sum(self.quota_used.values())
+
+    # Make every thread wait, e.g. after a 429 response
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    # Block until a request to the endpoint may be sent
+    def acquire(self, endpoint):
+        cost = self.quota_costs.get(endpoint, 1)
+        while True:
+            with self.lock:
+                if self._today() != self.quota_day:
+                    self.quota_day = self._today()
+                    self.quota_used = {}
+                if sum(self.quota_used.values()) + cost > self.daily_quota:
+                    raise QuotaExceededError("Daily quota of {} units used up".format(self.daily_quota))
+
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    self.quota_used[endpoint] = self.quota_used.get(endpoint, 0) + cost
+                    return
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+# Shared limiter used by execute_request
+api_limiter = RateLimiter()
+
+# Function to read the error reason (e.g. "quotaExceeded") from an HttpError
+def get_error_reason(error):
+    try:
+        content = json.loads(error.content.decode("utf-8"))
+        return content["error"]["errors"][0]["reason"]
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+        return ""
+
+# Seconds a cached API response is served without asking the API again
+CACHE_TTLS = {
+    "channels": 6 * 3600,
+    "playlists": 6 * 3600,
+    "playlistItems": 3600,
+    "videos": 3600,
+    "commentThreads": 1800,
+    "comments": 1800
+}
+RESPONSE_CACHE_PATH = os.environ.get("YOUTUBE_CACHE_PATH", "youtube_cache.sqlite3")
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("YOUTUBE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Persistent SQLite cache of API responses keyed by endpoint and parameters
+# Fresh entries are served directly; stale ones are revalidated with If-None-Match
+# and the least recently used entries are evicted once max_bytes is exceeded
+class ResponseCache:
+    def __init__(self, path, max_bytes=RESPONSE_CACHE_MAX_BYTES, ttls=None):
+        self.max_bytes = max_bytes
+        self.ttls = ttls or CACHE_TTLS
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('''CREATE TABLE IF NOT EXISTS responses (
+                                       Cache_Key TEXT PRIMARY KEY,
+                                       Endpoint TEXT,
+                                       Etag TEXT,
+                                       Body TEXT,
+                                       Size INTEGER,
+                                       Stored_At REAL,
+                                       Accessed_At REAL
+                                   )''')
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (Accessed_At)")
+        self.connection.commit()
+
+    # The API key is left out so that rotating keys keeps the cache valid
+    @staticmethod
+    def make_key(request):
+        parts = urlsplit(request.uri)
+        params = sorted((name, value) for name, value in parse_qsl(parts.query) if name != "key")
+        return "{} {}?{}".format(request.method, parts.path, urlencode(params))
+
+    # Returns (body, etag, fresh) or None
+    def get(self, key, endpoint):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT Body, Etag, Stored_At FROM responses WHERE Cache_Key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            now = time.time()
+            self.connection.execute("UPDATE responses SET Accessed_At = ? WHERE Cache_Key = ?", (now, key))
+            self.connection.commit()
+            fresh = now - row[2] < self.ttls.get(endpoint, 0)
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return json.loads(row[0]), row[1], fresh
+
+    def put(self, key, endpoint, body):
+        data = json.dumps(body)
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, endpoint, body.get("etag"), data, len(data), now, now))
+            self.connection.commit()
+            self._evict()
+
+    # Mark a stale entry fresh again after a 304 Not Modified (a miss that cost no download)
+    def touch(self, key):
+        with self.lock:
+            self.revalidated += 1
+            self.connection.execute("UPDATE responses SET Stored_At = ? WHERE Cache_Key = ?", (time.time(), key))
+            self.connection.commit()
+
+    def _evict(self):
+        total = self.connection.execute("SELECT COALESCE(SUM(Size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.connection.execute("SELECT Cache_Key, Size FROM responses ORDER BY Accessed_At").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self.connection.execute("DELETE FROM responses WHERE Cache_Key = ?", (key,))
+            total -= size
+        self.connection.commit()
+
+    def stats(self):
+        with self.lock:
+            entries, size = self.connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(Size), 0) FROM responses").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "revalidated": self.revalidated,
+                "entries": entries, "bytes": size}
+
+response_cache = None
+response_cache_lock = threading.Lock()
+
+# Function to open the shared response cache on first use (disabled if YOUTUBE_CACHE_PATH is empty)
+def get_response_cache():
+    global response_cache
+    with response_cache_lock:
+        if response_cache is None and RESPONSE_CACHE_PATH:
+            response_cache = ResponseCache(RESPONSE_CACHE_PATH)
+        return response_cache
+
+# Seconds a channel's uploads playlist and video count are trusted without asking the API again
+CHANNEL_CACHE_TTL = int(os.environ.get("YOUTUBE_CHANNEL_CACHE_TTL", "600"))
+
+# Channel lookups kept in memory and in the cache file next to the API responses:
+# handles and usernames resolved to channel IDs, each channel's uploads playlist and video count,
+# and the channel's full list of upload IDs, valid while its videoCount stays the same
+class ChannelCache:
+    def __init__(self, path=None):
+        self.lock = threading.Lock()
+        self.channel_ids = {}
+        self.channels = {}
+        self.connection = None
+        if path:
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS channel_names (
+                                           Name TEXT PRIMARY KEY,
+                                           Channel_Id TEXT
+                                       )''')
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS channel_uploads (
+                                           Channel_Id TEXT PRIMARY KEY,
+                                           Playlist_Id TEXT,
+                                           Video_Count INTEGER,
+                                           Checked_At REAL,
+                                           Ids_Video_Count INTEGER,
+                                           Video_Ids TEXT
+                                       )''')
+            self.connection.commit()
+
+    def get_channel_id(self, name):
+        with self.lock:
+            if name not in self.channel_ids and self.connection:
+                row = self.connection.execute(
+                    "SELECT Channel_Id FROM channel_names WHERE Name = ?", (name,)).fetchone()
+                if row:
+                    self.channel_ids[name] = row[0]
+            return self.channel_ids.get(name)
+
+    def put_channel_id(self, name, channel_id):
+        with self.lock:
+            self.channel_ids[name] = channel_id
+            if self.connection:
+                self.connection.execute("INSERT OR REPLACE INTO channel_names VALUES (?, ?)", (name, channel_id))
+                self.connection.commit()
+
+    # Returns a dict with Playlist_Id, Video_Count, Checked_At, Ids_Video_Count and Video_Ids, or None
+    def get_channel(self, channel_id):
+        with self.lock:
+            if channel_id not in self.channels and self.connection:
+                row = self.connection.execute(
+                    '''SELECT Playlist_Id, Video_Count, Checked_At, Ids_Video_Count, Video_Ids
+                       FROM channel_uploads WHERE Channel_Id = ?''', (channel_id,)).fetchone()
+                if row:
+                    self.channels[channel_id] = {
+                        "Playlist_Id": row[0], "Video_Count": row[1], "Checked_At": row[2],
+                        "Ids_Video_Count": row[3], "Video_Ids": json.loads(row[4]) if row[4] else None}
+            return self.channels.get(channel_id)
+
+    # Records a fresh channels().list answer; the stored ID list stays but only matches its own count
+    def put_channel(self, channel_id, playlist_id, video_count):
+        entry = self.get_channel(channel_id) or {"Ids_Video_Count": None, "Video_Ids": None}
+        with self.lock:
+            entry = dict(entry, Playlist_Id=playlist_id, Video_Count=video_count, Checked_At=time.time())
+            self.channels[channel_id] = entry
+            self._store(channel_id, entry)
+
+    # Returns the stored upload IDs if they were listed when the channel had video_count videos
+    def get_video_ids(self, channel_id, video_count):
+        entry = self.get_channel(channel_id)
+        if entry and entry["Video_Ids"] is not None and entry["Ids_Video_Count"] == video_count:
+            return list(entry["Video_Ids"])
         return None
 
+    def put_video_ids(self, channel_id, video_count, video_ids):
+        entry = self.get_channel(channel_id)
+        if entry is None:
+            return
+        with self.lock:
+            entry = dict(entry, Ids_Video_Count=video_count, Video_Ids=list(video_ids))
+            self.channels[channel_id] = entry
+            self._store(channel_id, entry)
+
+    def _store(self, channel_id, entry):
+        if self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO channel_uploads VALUES (?, ?, ?, ?, ?, ?)",
+                (channel_id, entry["Playlist_Id"], entry["Video_Count"], entry["Checked_At"],
+                 entry["Ids_Video_Count"], json.dumps(entry["Video_Ids"]) if entry["Video_Ids"] is not None else None))
+            self.connection.commit()
+
+channel_cache = None
+
+# Function to open the shared channel cache on first use (in memory only if YOUTUBE_CACHE_PATH is empty)
+def get_channel_cache():
+    global channel_cache
+    with response_cache_lock:
+        if channel_cache is None:
+            channel_cache = ChannelCache(RESPONSE_CACHE_PATH or None)
+        return channel_cache
+
+# Function to execute an API request through the response cache and the rate limiter
+# Backs off exponentially on 429 and on 403 quota/rate-limit responses
+# use_cache=False always asks the API, for callers that must see changes newer than the cache TTL
+def execute_request(request, endpoint, limiter=None, max_retries=5, backoff=1.0, cache=None, use_cache=True):
+    limiter = limiter or api_limiter
+    cache = (cache or get_response_cache()) if use_cache else None
+    cacheable = cache is not None and getattr(request, "method", None) == "GET"
+    cached = None
+    if cacheable:
+        key = cache.make_key(request)
+        cached = cache.get(key, endpoint)
+        if cached and cached[2]:
+            metrics.increment("youtube_api_cache_hits_total", endpoint=endpoint)
+            return cached[0]
+        if cached and cached[1]:
+            etag = cached[1] if cached[1].startswith('"') else '"{}"'.format(cached[1])
+            request.headers["If-None-Match"] = etag
+
+    for attempt in range(max_retries + 1):
+        limiter.acquire(endpoint)
+        metrics.increment("youtube_api_quota_units_total", limiter.quota_costs.get(endpoint, 1), endpoint=endpoint)
+        start = time.perf_counter()
+        try:
+            body = request.execute()
+            metrics.record("youtube_api_request", time.perf_counter() - start, "200", endpoint=endpoint)
+            if cacheable:
+                cache.put(key, endpoint, body)
+            return body
+        except HttpError as e:
+            status = e.resp.status
+            metrics.record("youtube_api_request", time.perf_counter() - start, str(status), endpoint=endpoint)
+            if status == 304 and cached:
+                cache.touch(key)
+                return cached[0]
+            retryable = status in RETRYABLE_STATUSES or (status == 403 and get_error_reason(e) in RETRYABLE_REASONS)
+            if not retryable or attempt == max_retries:
+                raise
+            metrics.increment("youtube_api_retries_total", endpoint=endpoint, status=str(status))
+            delay = min(backoff * 2 ** attempt, 60) + random.uniform(0, backoff)
+            limiter.pause(delay)
+
 # Function to create the channels table
+@instrumented("db")
 def create_channel_table(connection):
     try:
         cursor = connection.cursor()
-        cursor.execute('''CREATE TABLE IF NOT EXISTS channels (
+        db.create_table(cursor, '''CREATE TABLE IF NOT EXISTS channels (
                               Channel_Name VARCHAR(100),
                               Channel_Id VARCHAR(100) PRIMARY KEY,
                               Subscribers BIGINT,
@@ -34,69 +666,329 @@ def create_channel_table(connection):
                               Playlist_Id VARCHAR(100)
                           )''')
     except db.Error as e:
-        st.error("Error creating channels table: {}".format(e))
+        show_error("Error creating channels table: {}".format(e))
+
+# Function to mark tables as changed, so cached query results that read them go stale
+def bump_table_version(*tables):
+    query_cache.bump(tables)
+
+# Function to list the tables a query reads from
+def query_tables(query):
+    return sorted(set(table.lower() for table in re.findall(r'\b(?:FROM|JOIN)\s+`?(\w+)', query, re.IGNORECASE)))
+
+# Seconds a cached query result is served; bounds how stale it gets after writes of other processes
+QUERY_CACHE_TTL = float(os.environ.get("YOUTUBE_QUERY_CACHE_TTL", "30"))
+
+# Size-limited LRU cache of query results, independent of Streamlit
+# It keeps a version counter per table, bumped by every write; the key includes the
+# current version of every table the query reads, so any write to one of those tables
+# makes the old entry unreachable
+# The counters only see this process's writes; harvest.py, jobs.py and other server processes
+# write to the same database, so an entry also expires ttl seconds after it was stored
+class QueryCache:
+    def __init__(self, max_entries=64, max_rows=100000, ttl=None):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.ttl = QUERY_CACHE_TTL if ttl is None else ttl
+        self.entries = OrderedDict()
+        self.versions = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def bump(self, tables):
+        with self.lock:
+            for table in tables:
+                self.versions[table.lower()] = self.versions.get(table.lower(), 0) + 1
+
+    def make_key(self, query, params):
+        with self.lock:
+            versions = tuple((table, self.versions.get(table, 0)) for table in query_tables(query))
+        return (" ".join(query.split()), tuple(params or ()), versions)
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                stored_at, columns, rows = self.entries[key]
+                if time.monotonic() - stored_at < self.ttl:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return columns, rows
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, columns, rows):
+        if len(rows) > self.max_rows:
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic(), columns, rows)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+query_cache = QueryCache()
+
+# Function to run a SELECT through the query cache; returns (columns, rows)
+def cached_query(connection, query, params=None):
+    key = query_cache.make_key(query, params)
+    cached = query_cache.get(key)
+    if cached is not None:
+        return cached
+    cursor = connection.cursor()
+    cursor.execute(query, params or ())
+    columns = [col[0] for col in cursor.description]
+    rows = cursor.fetchall()
+    cursor.close()
+    query_cache.put(key, columns, rows)
+    return columns, rows
+
+# Rows fetched per round trip by the streaming query functions
+QUERY_CHUNK_SIZE = int(os.environ.get("QUERY_CHUNK_SIZE", "5000"))
+# Rows shown for a query result in the UI; the full result is only available as an export
+QUERY_DISPLAY_ROWS = 1000
+EXPORT_DIR = os.environ.get("YOUTUBE_EXPORT_DIR", "exports")
+
+# Function to stream a SELECT with an unbuffered cursor; yields (columns, rows) chunks
+# Rows stay on the server until fetched, so memory is bounded by chunk_size whatever the
+# result size. The first chunk is always yielded, even when it is empty.
+def iter_query_chunks(connection, query, params=None, chunk_size=QUERY_CHUNK_SIZE):
+    cursor = connection.cursor(buffered=False)
+    try:
+        cursor.execute(query, params or ())
+        columns = [col[0] for col in cursor.description]
+        rows = cursor.fetchmany(chunk_size)
+        yield columns, rows
+        while rows:
+            rows = cursor.fetchmany(chunk_size)
+            if rows:
+                yield columns, rows
+    finally:
+        # A consumer that stops early leaves rows unread on the connection
+        if connection.unread_result:
+            connection.consume_results()
+        cursor.close()
+
+# Function to cap a query at limit rows on the server, unless it already ends with a LIMIT
+def limit_query(query, limit):
+    query = query.strip().rstrip(";").rstrip()
+    if re.search(r'\bLIMIT\s+\d+(\s*,\s*\d+)?$', query, re.IGNORECASE):
+        return query
+    return "{} LIMIT {:d}".format(query, limit)
+
+# Primary keys used for keyset pagination of the stored tables
+TABLE_KEYS = {"channels": "Channel_Id", "videos": "Video_Id", "playlists": "Playlist_id", "comments": "Comment_Id"}
+
+# Function to read one page of a table in primary key order, starting after the key `after`
+# Keyset pagination: every page is an index range scan, however deep it is, unlike OFFSET
+# where (with its params) restricts the rows, e.g. to one channel
+# Returns (columns, rows, last key of the page)
+def fetch_table_page(connection, table, after=None, page_size=100, columns=None, where=None, params=()):
+    key = TABLE_KEYS[table]
+    if columns and key not in columns:
+        columns = [key] + list(columns)
+    query = "SELECT {} FROM {}".format(", ".join(columns) if columns else "*", table)
+    conditions = [where] if where else []
+    params = tuple(params)
+    if after is not None:
+        conditions.append("{} > %s".format(key))
+        params += (after,)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY {} LIMIT {:d}".format(key, page_size)
+    names, rows = cached_query(connection, query, params)
+    last_key = rows[-1][names.index(key)] if rows else None
+    return names, rows, last_key
+
+# Function to turn the first chunk of a result into the Parquet schema of the whole export
+# All-NULL columns become strings and DECIMAL columns doubles, so later chunks can be cast to it
+def parquet_schema(table):
+    import pyarrow as pa
+    fields = []
+    for field in table.schema:
+        if pa.types.is_null(field.type):
+            field = field.with_type(pa.string())
+        elif pa.types.is_decimal(field.type):
+            field = field.with_type(pa.float64())
+        fields.append(field)
+    return pa.schema(fields)
+
+# Function to write a query result to a CSV or Parquet file chunk by chunk
+# Only one chunk is in memory at a time; Parquet (needs pyarrow) gets one row group per chunk
+@instrumented("db")
+def export_query(connection, query, path, file_format="csv", params=None, chunk_size=QUERY_CHUNK_SIZE):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    written = 0
+    start = time.perf_counter()
+    if file_format == "csv":
+        import csv
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            for columns, rows in iter_query_chunks(connection, query, params, chunk_size):
+                if written == 0:
+                    writer.writerow(columns)
+                writer.writerows(rows)
+                written += len(rows)
+    elif file_format == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        writer = None
+        try:
+            for columns, rows in iter_query_chunks(connection, query, params, chunk_size):
+                table = pa.Table.from_pandas(pd.DataFrame(rows, columns=columns), preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, parquet_schema(table))
+                writer.write_table(table.cast(writer.schema))
+                written += len(rows)
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        raise ValueError("Unknown export format: {}".format(file_format))
+    elapsed = time.perf_counter() - start
+    return {"path": path, "rows": written, "bytes": os.path.getsize(path), "seconds": elapsed,
+            "rows_per_second": written / elapsed if elapsed > 0 else 0.0}
+
+# Rows sent to MySQL per executemany call / commit
+BULK_BATCH_SIZE = 1000
+
+# Column order used by the bulk writer for each table
+CHANNEL_COLUMNS = ["Channel_Name", "Channel_Id", "Subscribers", "Views", "Total_Videos",
+                   "Channel_Description", "Playlist_Id"]
+VIDEO_COLUMNS = ["Video_Name", "Channel_Id", "Video_Id", "Title", "Description", "Publish_Date",
+                 "Duration", "Definition", "Caption", "Views_Count", "Comments", "Favorite_Count",
+                 "Like_Count", "Dislike_Count", "Thumbnail_Url", "Duration_Seconds"]
+PLAYLIST_COLUMNS = ["Playlist_id", "Title", "Channel_id", "Channel_Title", "Published_Date", "Item_Count"]
+COMMENT_COLUMNS = ["Comment_Id", "Video_Id", "Text_Display", "Author_Name", "Comment_Date", "Parent_Id"]
+VIDEO_TAG_COLUMNS = ["Video_Id", "Tag_Id", "Position"]
+
+# Video columns that change between harvests and are refreshed on re-harvest
+VIDEO_STAT_COLUMNS = ["Views_Count", "Comments", "Favorite_Count", "Like_Count", "Dislike_Count"]
+VIDEO_STATS_HISTORY_COLUMNS = ["Video_Id"] + VIDEO_STAT_COLUMNS
+# Columns refreshed when a stored channel or playlist is harvested again
+CHANNEL_UPDATE_COLUMNS = ["Channel_Name", "Subscribers", "Views", "Total_Videos", "Channel_Description"]
+PLAYLIST_UPDATE_COLUMNS = ["Title", "Item_Count"]
+
+# Function to convert an API timestamp (2023-01-01T10:00:00Z) to MySQL format
+def convert_timestamp(value):
+    return datetime.strptime(value[:-1], '%Y-%m-%dT%H:%M:%S').strftime('%Y-%m-%d %H:%M:%S')
+
+# Function to write rows into a table with executemany, committing once per batch
+# mysql.connector rewrites executemany INSERTs into a single multi-row VALUES statement
+# update_columns turns the insert into an upsert on the table's key (ON DUPLICATE KEY UPDATE in MySQL)
+# commit=False leaves the rows in the open transaction, for a caller that commits them with other writes
+# Returns the number of rows written and the rows per second
+def bulk_insert(connection, table, columns, rows, batch_size=BULK_BATCH_SIZE, ignore=False, update_columns=None,
+                commit=True):
+    query = "{} {} ({}) VALUES ({})".format(
+        db.insert_prefix(ignore), table, ", ".join(columns), ", ".join(["%s"] * len(columns)))
+    if update_columns:
+        query += " {} ".format(db.upsert_clause([TABLE_KEYS[table]])) + ", ".join(
+            "{} = {}".format(column, db.new_value(column)) for column in update_columns)
+    cursor = connection.cursor()
+    written = 0
+    start = time.perf_counter()
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            cursor.executemany(query, batch)
+            if commit:
+                connection.commit()
+            bump_table_version(table)
+            metrics.increment("youtube_db_rows_written_total", len(batch), table=table)
+            written += len(batch)
+            batch = []
+    if batch:
+        cursor.executemany(query, batch)
+        if commit:
+            connection.commit()
+        bump_table_version(table)
+        metrics.increment("youtube_db_rows_written_total", len(batch), table=table)
+        written += len(batch)
+    cursor.close()
+    elapsed = time.perf_counter() - start
+    return {"table": table, "rows": written, "seconds": elapsed,
+            "rows_per_second": written / elapsed if elapsed > 0 else 0.0}
+
+# Function to show the throughput reported by bulk_insert
+def show_insert_stats(stats):
+    import streamlit as st
+    if stats:
+        st.info("Wrote {} rows to {} in {:.2f}s ({:.0f} rows/s)".format(
+            stats["rows"], stats["table"], stats["seconds"], stats["rows_per_second"]))
+
+# Function to convert a channel dict into a channels row
+def channel_row(channel):
+    return (channel["Channel_Name"],
+            channel["Channel_Id"],
+            channel["Subscribers"],
+            channel["Views"],
+            channel["Total_Videos"],
+            channel["Channel_Description"],
+            channel["Playlist_Id"])
+
+# Function to write channel details into the channels table; database errors are raised
+@instrumented("db")
+def write_channel_details(connection, channels, batch_size=BULK_BATCH_SIZE):
+    return bulk_insert(connection, "channels", CHANNEL_COLUMNS,
+                       (channel_row(channel) for channel in channels), batch_size,
+                       update_columns=CHANNEL_UPDATE_COLUMNS)
 
 # Function to insert channel details into the channels table
-def insert_channel_details(connection, channels):
+def insert_channel_details(connection, channels, batch_size=BULK_BATCH_SIZE):
     try:
-        cursor = connection.cursor()
-        for channel in channels:
-            query = '''INSERT IGNORE INTO channels (
-                                            Channel_Name,
-                                            Channel_Id,
-                                            Subscribers,
-                                            Views,
-                                            Total_Videos,
-                                            Channel_Description,
-                                            Playlist_Id)
-                                        VALUES (%s, %s, %s, %s, %s, %s, %s)'''
-            val = (channel["Channel_Name"],
-                   channel["Channel_Id"],
-                   channel["Subscribers"],
-                   channel["Views"],
-                   channel["Total_Videos"],
-                   channel["Channel_Description"],
-                   channel["Playlist_Id"])
-            cursor.execute(query, val)
-        connection.commit()
+        return write_channel_details(connection, channels, batch_size)
     except db.Error as e:
-        st.error("Error inserting channel details: {}".format(e))
+        show_error("Error inserting channel details: {}".format(e))
+
+# Function to fetch channel details; API errors are raised, an unknown channel gives []
+# use_cache=False asks the API even if the channels response is still in the response cache
+@instrumented("api")
+def fetch_channel_info(YouTube, Y_ChannelId, use_cache=True):
+    req = YouTube.channels().list(
+        part="snippet, contentDetails, statistics",
+        id=Y_ChannelId
+    )
+    res = execute_request(req, "channels", use_cache=use_cache)
+    channel_info = []
+    for item in res.get("items", []):
+        info = {
+            "Channel_Name": item["snippet"]["title"],
+            "Channel_Id": item["id"],
+            "Subscribers": item["statistics"]["subscriberCount"],
+            "Views": item["statistics"]["viewCount"],
+            "Total_Videos": item["statistics"]["videoCount"],
+            "Channel_Description": item["snippet"]["description"],
+            "Playlist_Id": item["contentDetails"]["relatedPlaylists"]["uploads"]
+        }
+        channel_info.append(info)
+        remember_channel(item)
+    return channel_info
 
 # Function to retrieve channel details
 def get_channel_info(YouTube, Y_ChannelId):
     try:
-        req = YouTube.channels().list(
-            part="snippet, contentDetails, statistics",
-            id=Y_ChannelId
-        )
-        res = req.execute()
-        channel_info = []
-
-        if "items" in res:
-            for item in res["items"]:
-                info = {
-                    "Channel_Name": item["snippet"]["title"],
-                    "Channel_Id": item["id"],
-                    "Subscribers": item["statistics"]["subscriberCount"],
-                    "Views": item["statistics"]["viewCount"],
-                    "Total_Videos": item["statistics"]["videoCount"],
-                    "Channel_Description": item["snippet"]["description"],
-                    "Playlist_Id": item["contentDetails"]["relatedPlaylists"]["uploads"]
-                }
-                channel_info.append(info)
-        else:
-            st.warning("No channel found")
+        channel_info = fetch_channel_info(YouTube, Y_ChannelId)
+        if not channel_info:
+            show_warning("No channel found")
         return channel_info
     except Exception as e:
-        st.error("Error retrieving channel info: {}".format(e))
+        show_error("Error retrieving channel info: {}".format(e))
         return []
 
 # Function to create the Videos table
+@instrumented("db")
 def create_videos_table():
     try:
-        db_connection = db.connect(host="localhost", user="root", password="123", database="y_data")
-        cursor = db_connection.cursor()
-        cursor.execute('''CREATE TABLE IF NOT EXISTS videos (
+        with pooled_connection() as db_connection:
+            cursor = db_connection.cursor()
+            db.create_table(cursor, '''CREATE TABLE IF NOT EXISTS videos (
                               Video_Name VARCHAR(100),
                               Channel_Id VARCHAR(100),
                               Video_Id VARCHAR(100) PRIMARY KEY,
@@ -114,160 +1006,864 @@ def create_videos_table():
                               Tags TEXT,
                               Thumbnails TEXT
                           )''')
-        db_connection.close()
     except db.Error as e:
-        st.error("Error creating videos table: {}".format(e))
+        show_error("Error creating videos table: {}".format(e))
 
-# Function to fetch video details from the database
-def fetch_video_details():
+# Function to fetch video details from the database, at most limit rows
+def fetch_video_details(limit=QUERY_DISPLAY_ROWS):
     try:
-        db_connection = db.connect(host="localhost", user="root", password="123", database="y_data")
-        cursor = db_connection.cursor()
-        cursor.execute("SELECT * FROM videos")
-        columns = [col[0] for col in cursor.description]
-        data = cursor.fetchall()
-        db_connection.close()
+        with pooled_connection() as db_connection:
+            columns, data = cached_query(db_connection, limit_query("SELECT * FROM videos", limit))
         return pd.DataFrame(data, columns=columns)
     except db.Error as e:
-        st.error("Error fetching video details: {}".format(e))
+        show_error("Error fetching video details: {}".format(e))
         return pd.DataFrame()
 
+# ISO-8601 duration as returned by the API, e.g. PT4M13S, P1DT2H or PT1.5S
+DURATION_PATTERN = re.compile(r'^P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+(?:\.\d+)?)S)?)?$')
+DURATION_FACTORS = (604800, 86400, 3600, 60, 1)
+
+# Function to convert YouTube duration format to a number of seconds
+def convert_duration_seconds(duration):
+    matches = DURATION_PATTERN.match(duration or "")
+    if matches:
+        total = 0.0
+        for value, factor in zip(matches.groups(), DURATION_FACTORS):
+            if value:
+                total += float(value) * factor
+        return int(round(total))
+    return 0
+
+# Function to format a number of seconds as HH:MM:SS (hours may exceed 23)
+def format_seconds(total):
+    return '{:02d}:{:02d}:{:02d}'.format(total // 3600, total % 3600 // 60, total % 60)
+
 # Function to convert YouTube duration format to HH:MM:SS format
 def convert_duration(duration):
-    matches = re.match(r'PT(\d+H)?(\d+M)?(\d+S)?', duration)
-    if matches:
-        hours = int(matches.group(1)[:-1]) if matches.group(1) else 0
-        minutes = int(matches.group(2)[:-1]) if matches.group(2) else 0
-        seconds = int(matches.group(3)[:-1]) if matches.group(3) else 0
-        return '{:02d}:{:02d}:{:02d}'.format(hours, minutes, seconds)
+    return format_seconds(convert_duration_seconds(duration))
+
+# Function to record a channels().list item in the channel cache
+def remember_channel(item):
+    video_count = item.get("statistics", {}).get("videoCount")
+    get_channel_cache().put_channel(item["id"], item["contentDetails"]["relatedPlaylists"]["uploads"],
+                                    int(video_count) if video_count is not None else None)
+
+# Function to look up a channel's uploads playlist and video count; returns (None, None) if not found
+# Served from the channel cache when it was checked within max_age seconds; otherwise the channel
+# is fetched past the response cache, so a cached videoCount can't hide new uploads
+def get_channel_uploads(YouTube, Y_ChannelId, max_age=None):
+    max_age = CHANNEL_CACHE_TTL if max_age is None else max_age
+    entry = get_channel_cache().get_channel(Y_ChannelId)
+    if entry and time.time() - entry["Checked_At"] < max_age:
+        metrics.increment("youtube_channel_cache_hits_total", kind="uploads")
+        return entry["Playlist_Id"], entry["Video_Count"]
+    if fetch_channel_info(YouTube, Y_ChannelId, use_cache=False):
+        entry = get_channel_cache().get_channel(Y_ChannelId)
+        return entry["Playlist_Id"], entry["Video_Count"]
+    return None, None
+
+CHANNEL_ID_PATTERN = re.compile(r"^UC[\w-]{22}$")
+
+# Function to turn a channel ID, @handle, legacy username or channel URL into a channel ID
+# Handles and usernames cost one channels().list unit (not a 100-unit search.list) the first
+# time and are answered from the channel cache afterwards; returns None if nothing matches
+def resolve_channel_id(YouTube, text):
+    name = text.strip()
+    if "youtube.com/" in name:
+        path = urlsplit(name if "://" in name else "https://" + name).path.strip("/").split("/")
+        if len(path) > 1 and path[0] in ("channel", "user", "c"):
+            name = path[1] if path[0] != "user" else "user/" + path[1]
+        elif path and path[0]:
+            name = path[0]
+    if CHANNEL_ID_PATTERN.match(name):
+        return name
+
+    cache = get_channel_cache()
+    key = name.lower()
+    channel_id = cache.get_channel_id(key)
+    if channel_id:
+        metrics.increment("youtube_channel_cache_hits_total", kind="name")
+        return channel_id
+    if name.startswith("user/"):
+        lookups = [{"forUsername": name[5:]}]
+    elif name.startswith("@"):
+        lookups = [{"forHandle": name}]
     else:
-        return '00:00:00'  # Return default duration if no match is found
+        # A bare name may be a legacy username or a handle typed without its @
+        lookups = [{"forUsername": name}, {"forHandle": "@" + name}]
+    for lookup in lookups:
+        res = execute_request(YouTube.channels().list(part="contentDetails, statistics", **lookup), "channels")
+        if res.get("items"):
+            item = res["items"][0]
+            remember_channel(item)
+            cache.put_channel_id(key, item["id"])
+            return item["id"]
+    return None
+
+# Function to fetch one page of a playlist's video IDs; returns (video IDs, next page token)
+def fetch_video_id_page(YouTube, playlist_id, page_token=None, use_cache=True):
+    req = execute_request(YouTube.playlistItems().list(
+        part="snippet",
+        playlistId=playlist_id,
+        maxResults=50,
+        pageToken=page_token
+    ), "playlistItems", use_cache=use_cache)
+    return [item["snippet"]["resourceId"]["videoId"] for item in req["items"]], req.get("nextPageToken")
+
+# Generator yielding one page of video IDs per playlistItems request
+# The uploads playlist is newest first, so pagination stops at the first ID in stop_at
+# With stop_at the listing looks for new uploads, so the pages are not served from the response cache
+def iter_video_id_pages(YouTube, playlist_id, stop_at=None):
+    next_page_token = None
+    while True:
+        video_ids, next_page_token = fetch_video_id_page(YouTube, playlist_id, next_page_token,
+                                                         use_cache=not stop_at)
+        page = []
+        reached_known = False
+        for video_id in video_ids:
+            if stop_at and video_id in stop_at:
+                reached_known = True
+                break
+            page.append(video_id)
+        if page:
+            yield page
+
+        if next_page_token is None or reached_known:
+            break
+
+# Function to fetch the video IDs of a channel's uploads; API errors are raised
+@instrumented("api")
+def fetch_video_ids(YouTube, Y_ChannelId, stop_at=None):
+    video_ids = []
+    playlist_id, video_count = get_channel_uploads(YouTube, Y_ChannelId)
+    if playlist_id:
+        # A full listing is reused until the channel's videoCount changes
+        cached_ids = None if stop_at else get_channel_cache().get_video_ids(Y_ChannelId, video_count)
+        if cached_ids is not None:
+            metrics.increment("youtube_channel_cache_hits_total", kind="video_ids")
+            return cached_ids
+        for page in iter_video_id_pages(YouTube, playlist_id, stop_at):
+            video_ids.extend(page)
+        if not stop_at:
+            get_channel_cache().put_video_ids(Y_ChannelId, video_count, video_ids)
+    else:
+        show_warning("No items found")
+    return video_ids
 
 # Function to retrieve video IDs from a given channel ID
-def get_video_ids(YouTube, Y_ChannelId):
+def get_video_ids(YouTube, Y_ChannelId, stop_at=None):
     try:
-        video_ids = []
-        req = YouTube.channels().list(id=Y_ChannelId, part="contentDetails")
-        res = req.execute()
-        if "items" in res and len(res["items"]) > 0:
-            playlist_id = res["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
-            next_page_token = None
-
-            while True:
-                req1 = YouTube.playlistItems().list(
-                    part="snippet",
-                    playlistId=playlist_id,
-                    maxResults=50,
-                    pageToken=next_page_token
-                ).execute()
-                for item in req1["items"]:
-                    video_ids.append(item["snippet"]["resourceId"]["videoId"])
-                next_page_token = req1.get("nextPageToken")
-
-                if next_page_token is None:
-                    break
-        else:
-            st.warning("No items found")        
-        return video_ids
+        return fetch_video_ids(YouTube, Y_ChannelId, stop_at)
     except Exception as e:
-        st.error("Error retrieving video IDs:{}". format(e))
+        show_error("Error retrieving video IDs:{}". format(e))
         return []
 
+# Function to split an iterable into lists of a given size
+def chunk_list(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# Thumbnail sizes in order of preference; only the URL of the first one present is stored
+THUMBNAIL_SIZES = ("high", "medium", "default")
+
+# Function to pick the stored thumbnail URL from the API's thumbnails dict
+def pick_thumbnail_url(thumbnails):
+    for size in THUMBNAIL_SIZES:
+        if thumbnails and size in thumbnails:
+            return thumbnails[size]["url"]
+    return None
+
+# Function to convert a videos().list item into a video row
+# Tags stay a list here; they are stored in video_tags, not in the videos row
+def parse_video_item(item):
+    return {
+        "Video_Name": item["snippet"]["channelTitle"],
+        "Channel_Id": item["snippet"]["channelId"],
+        "Video_Id": item["id"],
+        "Title": item["snippet"]["title"],
+        "Tags": item["snippet"].get("tags", []),
+        "Thumbnail_Url": pick_thumbnail_url(item["snippet"].get("thumbnails")),
+        "Description": item["snippet"]["description"],
+        "Publish_Date": item["snippet"]["publishedAt"],
+        "Duration": item["contentDetails"]["duration"],
+        "Definition": item["contentDetails"]["definition"],
+        "Caption": item["contentDetails"]["caption"],
+        "Views_Count": item["statistics"].get("viewCount", 0),
+        "Comments": item["statistics"].get("commentCount", 0),
+        "Favorite_Count": item["statistics"].get("favoriteCount", 0),
+        "Like_Count" : item["statistics"].get("likeCount", 0),
+        "Dislike_Count" : item["statistics"].get("dislikeCount", 0)
+    }
+
+# Function to fetch video items in batches of up to 50 IDs per request
+# Returns the items in the order of video_ids and the IDs missing from the response
+def fetch_video_items(YouTube, video_ids, batch_size=50):
+    batch_size = max(1, min(batch_size, 50))
+    items_by_id = {}
+    for batch in chunk_list(list(video_ids), batch_size):
+        res = execute_request(YouTube.videos().list(
+            part="snippet,contentDetails,statistics",
+            id=",".join(batch),
+            maxResults=len(batch)
+        ), "videos")
+        for item in res.get("items", []):
+            items_by_id[item["id"]] = item
+
+    items = []
+    missing_ids = []
+    for video_id in video_ids:
+        if video_id in items_by_id:
+            items.append(items_by_id[video_id])
+        else:
+            missing_ids.append(video_id)
+    return items, missing_ids
+
+# Function to fetch the video rows of the given IDs; API errors are raised
+# IDs the API doesn't return (private or deleted videos) are reported with a warning
+@instrumented("api")
+def fetch_video_page(YouTube, video_ids):
+    items, missing_ids = fetch_video_items(YouTube, video_ids)
+    if missing_ids:
+        show_warning("{} video(s) not returned by the API: {}".format(len(missing_ids), ", ".join(missing_ids)))
+    return [parse_video_item(item) for item in items]
+
+# Generator yielding one page of video rows per videos().list request
+# video_ids may itself be a generator, e.g. IDs streamed from iter_video_id_pages
+def iter_video_pages(YouTube, video_ids):
+    for batch in chunk_list(video_ids, 50):
+        yield fetch_video_page(YouTube, batch)
+
 # Function to retrieve video details based on video IDs
 def get_video_info(YouTube, video_ids):
     try:
-        video_data = []
-        for video_id in video_ids:
-            req = YouTube.videos().list(
-                part="snippet,contentDetails,statistics",
-                id=video_id
-            ).execute()
-
-            for item in req["items"]:
-                video_info = {
-                    "Video_Name": item["snippet"]["channelTitle"],
-                    "Channel_Id": item["snippet"]["channelId"],
-                    "Video_Id": item["id"],
-                    "Title": item["snippet"]["title"],
-                    "Tags": item["snippet"].get("tags", []),
-                    "Thumbnails": item["snippet"]["thumbnails"],
-                    "Description": item["snippet"]["description"],
-                    "Publish_Date": item["snippet"]["publishedAt"],
-                    "Duration": item["contentDetails"]["duration"],
-                    "Definition": item["contentDetails"]["definition"],
-                    "Caption": item["contentDetails"]["caption"],
-                    "Views_Count": item["statistics"].get("viewCount", 0),
-                    "Comments": item["statistics"].get("commentCount", 0),
-                    "Favorite_Count": item["statistics"].get("favoriteCount", 0),
-                    "Like_Count" : item["statistics"].get("likeCount", 0),
-                    "Dislike_Count" : item["statistics"].get("dislikeCount", 0)
-                }
-                video_data.append(video_info)
-        return video_data
+        return fetch_video_page(YouTube, video_ids)
     except Exception as e:
-        st.error("Error retrieving video info: {}".format(e))
+        show_error("Error retrieving video info: {}".format(e))
+        return []
+
+# Function to convert a column of ISO-8601 durations to (HH:MM:SS list, seconds list)
+# The parts are pulled out with one str.extract over the column and summed as a matrix product;
+# durations that don't match count as 0, like in convert_duration_seconds
+def convert_duration_column(durations):
+    if not durations:
+        return [], []
+    parts = pd.Series(durations, dtype=object).str.extract(DURATION_PATTERN).astype(float).fillna(0)
+    seconds = np.rint(parts.to_numpy() @ np.array(DURATION_FACTORS, dtype=float)).astype(np.int64)
+    hours, rest = np.divmod(seconds, 3600)
+    minutes, rest = np.divmod(rest, 60)
+    two_digits = lambda values: np.char.zfill(values.astype(str), 2)
+    hms = np.char.add(np.char.add(two_digits(hours), ":"),
+                      np.char.add(np.char.add(two_digits(minutes), ":"), two_digits(rest)))
+    return hms.tolist(), seconds.tolist()
+
+# Function to convert a column of API timestamps (always UTC, 2023-01-01T10:00:00[.000]Z) to MySQL format
+# Fractional seconds are dropped
+def convert_timestamp_column(values):
+    if not values:
         return []
+    timestamps = pd.to_datetime(pd.Series(values, dtype=object), format="ISO8601", utc=True)
+    return timestamps.dt.floor("s").dt.tz_localize(None).astype(str).tolist()
+
+# Function to cast a column of API counts (strings, missing for hidden counts) to integers
+# One numpy cast covers the usual page of digit strings; pandas handles pages with missing values
+def convert_count_column(values):
+    try:
+        return np.array(values, dtype=object).astype(np.int64).tolist()
+    except (TypeError, ValueError, OverflowError):
+        return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").fillna(0).astype("int64").tolist()
+
+# Function to normalise a page of video dicts column by column into videos rows
+def video_rows(videos):
+    videos = list(videos)
+    if not videos:
+        return []
+    columns = dict((column, [video[column] for video in videos])
+                   for column in VIDEO_COLUMNS if column != "Duration_Seconds")
+    columns["Duration"], columns["Duration_Seconds"] = convert_duration_column(columns["Duration"])
+    columns["Publish_Date"] = convert_timestamp_column(columns["Publish_Date"])
+    # The API sends caption as the string "true"/"false"
+    columns["Caption"] = (np.char.lower(np.array(columns["Caption"], dtype=str)) == "true").astype(int).tolist()
+    for column in VIDEO_STAT_COLUMNS:
+        columns[column] = convert_count_column(columns[column])
+    return list(zip(*(columns[column] for column in VIDEO_COLUMNS)))
+
+# Function to write video details into the Videos table
+# Rows are normalised one batch at a time, so videos may be a generator of any length
+# The tags of each batch are written to video_tags, and the words of new videos indexed for search, before its rows
+# Only new videos and videos whose statistics changed are written; see changed_video_rows
+# Database errors are raised; insert_video_details reports them and borrows its own connection
+@instrumented("db")
+def write_video_details(connection, videos, batch_size=BULK_BATCH_SIZE):
+    def pages():
+        for batch in chunk_list(videos, batch_size):
+            write_video_tags(connection, batch)
+            changed = changed_video_rows(connection, video_rows(batch))
+            index_search_documents(connection, "videos", changed, VIDEO_COLUMNS)
+            yield changed
+    return upsert_changed_videos(connection, VIDEO_COLUMNS, pages(), batch_size)
+
+# Function to upsert pages of changed video rows, one commit per page
+# changed_video_rows leaves the stats history of a page uncommitted, so the history and the
+# statistics replacing it are committed together (as are the page's new search postings)
+def upsert_changed_videos(connection, columns, pages, batch_size=BULK_BATCH_SIZE):
+    totals = {"table": "videos", "rows": 0, "seconds": 0.0, "rows_per_second": 0.0}
+    start = time.perf_counter()
+    for rows in pages:
+        if rows:
+            totals["rows"] += bulk_insert(connection, "videos", columns, rows, max(batch_size, len(rows)),
+                                          update_columns=VIDEO_STAT_COLUMNS)["rows"]
+    totals["seconds"] = time.perf_counter() - start
+    if totals["seconds"] > 0:
+        totals["rows_per_second"] = totals["rows"] / totals["seconds"]
+    return totals
+
+# Function to insert video details into the videos table on a connection from the pool
+def insert_video_details(videos, batch_size=BULK_BATCH_SIZE):
+    try:
+        with pooled_connection() as db_connection:
+            return write_video_details(db_connection, videos, batch_size)
+    except db.Error as e:
+        show_error("Error inserting video details: {}".format(e))
+
+# Interned tag IDs by tag text, shared by all threads
+tag_ids = {}
+tag_ids_lock = threading.Lock()
+
+# Function to look up the IDs of the given tags, adding the ones not in the tags table yet
+# New tags are shared by every video and their IDs are cached, so they are committed right away.
+# Workers adding the same new tag at once conflict on DuckDB, whose transactions fail on commit
+# instead of waiting; the retry then finds the tag stored by the other worker.
+def intern_tags(connection, tags, retries=3):
+    tags = set(tags)
+    with tag_ids_lock:
+        missing = sorted(tag for tag in tags if tag not in tag_ids)
+    cursor = connection.cursor()
+    for batch in chunk_list(missing, 500):
+        for attempt in range(retries + 1):
+            try:
+                cursor.executemany("{} tags (Tag) VALUES (%s)".format(db.insert_prefix(ignore=True)),
+                                   [(tag,) for tag in batch])
+                connection.commit()
+                break
+            except db.Error:
+                connection.rollback()
+                if attempt == retries:
+                    raise
+        cursor.execute("SELECT Tag_Id, Tag FROM tags WHERE Tag IN ({})".format(", ".join(["%s"] * len(batch))), batch)
+        found = cursor.fetchall()
+        with tag_ids_lock:
+            tag_ids.update((tag, tag_id) for tag_id, tag in found)
+    cursor.close()
+    with tag_ids_lock:
+        return dict((tag, tag_ids[tag]) for tag in tags if tag in tag_ids)
+
+# Function to replace the video_tags rows of the given videos whose tags changed
+# The delete and the re-insert are one transaction, so a video never loses its tags on a failure
+def write_video_tags(connection, videos):
+    videos = list(videos)
+    if not videos:
+        return
+    cursor = connection.cursor()
+    ids = intern_tags(connection, [tag for video in videos for tag in video.get("Tags") or []])
+    # {video ID: {tag ID: position}}; a tag listed twice on one video keeps its first position
+    wanted = {}
+    for video in videos:
+        positions = wanted.setdefault(video["Video_Id"], {})
+        for position, tag in enumerate(video.get("Tags") or []):
+            if tag in ids and ids[tag] not in positions:
+                positions[ids[tag]] = position
+    placeholders = ", ".join(["%s"] * len(wanted))
+    cursor.execute("SELECT Video_Id, Tag_Id, Position FROM video_tags WHERE Video_Id IN ({})".format(placeholders),
+                   list(wanted))
+    stored = {}
+    for video_id, tag_id, position in cursor.fetchall():
+        stored.setdefault(video_id, {})[tag_id] = position
+    changed = [video_id for video_id, positions in wanted.items() if stored.get(video_id, {}) != positions]
+    if changed:
+        cursor.execute("DELETE FROM video_tags WHERE Video_Id IN ({})".format(", ".join(["%s"] * len(changed))),
+                       changed)
+        bulk_insert(connection, "video_tags", VIDEO_TAG_COLUMNS,
+                    ((video_id, tag_id, position) for video_id in changed
+                     for tag_id, position in wanted[video_id].items()), ignore=True, commit=False)
+    connection.commit()
+    cursor.close()
+    # video_tags is bumped here too: a video whose tags were all removed only had rows deleted
+    bump_table_version("tags", "video_tags")
+
+# Function to keep only the video rows that are new or whose statistics changed
+# The statistics being replaced are appended to video_stats_history first, without a commit:
+# the caller commits them with the upsert of the returned rows (see upsert_changed_videos)
+# rows are tuples in `columns` order, which must include Video_Id and VIDEO_STAT_COLUMNS
+def changed_video_rows(connection, rows, columns=VIDEO_COLUMNS):
+    rows = list(rows)
+    if not rows:
+        return []
+    id_index = columns.index("Video_Id")
+    stat_indexes = [columns.index(column) for column in VIDEO_STAT_COLUMNS]
+    cursor = connection.cursor()
+    cursor.execute("SELECT Video_Id, {} FROM videos WHERE Video_Id IN ({})".format(
+        ", ".join(VIDEO_STAT_COLUMNS), ", ".join(["%s"] * len(rows))), [row[id_index] for row in rows])
+    stored = dict((row[0], tuple(row[1:])) for row in cursor.fetchall())
+    cursor.close()
+    changed = []
+    history = []
+    for row in rows:
+        previous = stored.get(row[id_index])
+        if previous == tuple(row[index] for index in stat_indexes):
+            continue
+        if previous is not None:
+            history.append((row[id_index],) + previous)
+        changed.append(row)
+    if history:
+        bulk_insert(connection, "video_stats_history", VIDEO_STATS_HISTORY_COLUMNS, history, ignore=True, commit=False)
+    metrics.increment("youtube_db_rows_unchanged_total", len(rows) - len(changed), table="videos")
+    return changed
+
+# Function to list the videos carrying a tag, most viewed first; uses the video_tags Tag_Id index
+def fetch_videos_by_tag(connection, tag, limit=QUERY_DISPLAY_ROWS):
+    return execute_query(connection, '''SELECT v.Video_Id, v.Title, v.Views_Count
+                                        FROM tags t
+                                        INNER JOIN video_tags vt ON vt.Tag_Id = t.Tag_Id
+                                        INNER JOIN videos v ON v.Video_Id = vt.Video_Id
+                                        WHERE t.Tag = %s
+                                        ORDER BY v.Views_Count DESC''', (tag,), limit)
+
+# Tables of the search section: the text columns that are indexed and the columns shown for a hit
+SEARCH_TABLES = {
+    "videos": {"columns": ["Title", "Description"],
+               "show": ["Video_Id", "Title", "Channel_Id", "Views_Count", "Publish_Date"]},
+    "comments": {"columns": ["Text_Display"],
+                 "show": ["Comment_Id", "Video_Id", "Author_Name", "Text_Display", "Comment_Date"]}
+}
+SEARCH_POSTING_COLUMNS = ["Doc_Table", "Doc_Id", "Term", "Hits"]
+# Hits shown per search
+SEARCH_RESULTS = 50
+
+# Function to add the words of rows to search_postings, on backends without a full-text index
+# rows are tuples in `columns` order; rows already stored are skipped unless skip_stored is False,
+# since a re-harvest only refreshes the statistics of a video and never changes a comment
+def index_search_documents(connection, table, rows, columns, skip_stored=True):
+    rows = list(rows)
+    if not db.search_postings or not rows:
+        return
+    key = TABLE_KEYS[table]
+    key_index = columns.index(key)
+    text_indexes = [columns.index(column) for column in SEARCH_TABLES[table]["columns"]]
+    stored = set()
+    if skip_stored:
+        cursor = connection.cursor()
+        cursor.execute("SELECT {0} FROM {1} WHERE {0} IN ({2})".format(key, table, ", ".join(["%s"] * len(rows))),
+                       [row[key_index] for row in rows])
+        stored = set(doc_id for (doc_id,) in cursor.fetchall())
+        cursor.close()
+    postings = []
+    for row in rows:
+        if row[key_index] in stored:
+            continue
+        words = Counter(storage.search_words(" ".join(row[index] or "" for index in text_indexes)))
+        postings.extend((table, row[key_index], word, hits) for word, hits in words.items())
+    if postings:
+        # Committed with the rows they index by the caller's bulk_insert
+        bulk_insert(connection, "search_postings", SEARCH_POSTING_COLUMNS, postings, commit=False)
+
+# Function to rank the rows of a table by relevance to the words of text, best first; returns (columns, rows)
+# MySQL uses its FULLTEXT indexes, SQLite FTS5 and DuckDB the search_postings table
+@instrumented("db")
+def search_table(connection, table, text, limit=SEARCH_RESULTS):
+    if not storage.search_words(text):
+        return [], []
+    search = SEARCH_TABLES[table]
+    query, params = db.search_query(table, TABLE_KEYS[table], search["columns"],
+                                    ", ".join("t." + column for column in search["show"]), text, limit)
+    return cached_query(connection, query, params)
+
+# Function to check whether a column exists in the current database
+def column_exists(cursor, table, column):
+    return db.column_exists(cursor, table, column)
+
+# Function to check whether an index exists in the current database
+def index_exists(cursor, table, index):
+    return db.index_exists(cursor, table, index)
+
+# Function to add a column unless it is already there
+def add_column_if_missing(cursor, table, column, definition):
+    if not column_exists(cursor, table, column):
+        cursor.execute("ALTER TABLE {} ADD COLUMN {} {}".format(table, column, definition))
+
+# Function to add an index unless it is already there (or the backend does without secondary indexes)
+def add_index_if_missing(cursor, table, index, columns):
+    if db.secondary_indexes and not index_exists(cursor, table, index):
+        cursor.execute("CREATE INDEX {} ON {} ({})".format(index, table, columns))
+
+# Migration 1: integer duration so averages don't need TIME_TO_SEC(TIMEDIFF(...))
+def migrate_duration_seconds(connection):
+    cursor = connection.cursor()
+    add_column_if_missing(cursor, "videos", "Duration_Seconds", "INT")
+    # Only MySQL databases can hold rows written before Duration_Seconds existed
+    if db.name == "mysql":
+        cursor.execute('''UPDATE videos SET Duration_Seconds = TIME_TO_SEC(Duration)
+                          WHERE Duration_Seconds IS NULL AND Duration IS NOT NULL''')
+
+# Migration 2: indexes for the joins and rankings of the analytic queries
+def migrate_analytic_indexes(connection):
+    cursor = connection.cursor()
+    add_index_if_missing(cursor, "comments", "idx_comments_video", "Video_Id")
+    add_index_if_missing(cursor, "videos", "idx_videos_channel", "Channel_Id")
+    add_index_if_missing(cursor, "videos", "idx_videos_publish_date", "Publish_Date")
+    add_index_if_missing(cursor, "videos", "idx_videos_views", "Views_Count")
+    add_index_if_missing(cursor, "videos", "idx_videos_likes", "Like_Count")
+    add_index_if_missing(cursor, "videos", "idx_videos_comments", "Comments")
+
+# Function to recompute the per-channel summary rows of the given channels (all if None)
+def refresh_channel_stats(connection, channel_ids=None):
+    cursor = connection.cursor()
+    batches = chunk_list(list(channel_ids), 500) if channel_ids is not None else [None]
+    for batch in batches:
+        # SQLite needs a WHERE clause before the upsert clause of an INSERT ... SELECT
+        where = "WHERE Channel_Id IN ({})".format(", ".join(["%s"] * len(batch))) if batch else "WHERE 1 = 1"
+        cursor.execute('''INSERT INTO channel_stats (Channel_Id, Video_Count, Total_Views,
+                                                    Total_Duration_Seconds, Avg_Duration_Seconds)
+                          SELECT Channel_Id, COUNT(*), COALESCE(SUM(Views_Count), 0),
+                                 COALESCE(SUM(Duration_Seconds), 0), AVG(Duration_Seconds)
+                          FROM videos {}
+                          GROUP BY Channel_Id
+                          {}
+                              Video_Count = {},
+                              Total_Views = {},
+                              Total_Duration_Seconds = {},
+                              Avg_Duration_Seconds = {}'''.format(
+                           where, db.upsert_clause(["Channel_Id"]), db.new_value("Video_Count"),
+                           db.new_value("Total_Views"), db.new_value("Total_Duration_Seconds"),
+                           db.new_value("Avg_Duration_Seconds")), batch or ())
+    connection.commit()
+    bump_table_version("channel_stats")
+    cursor.close()
+
+# Function to recompute the comment counts of the given videos (all if None)
+def refresh_comment_counts(connection, video_ids=None):
+    cursor = connection.cursor()
+    batches = chunk_list(list(video_ids), 500) if video_ids is not None else [None]
+    for batch in batches:
+        where = "WHERE v.Video_Id IN ({})".format(", ".join(["%s"] * len(batch))) if batch else "WHERE 1 = 1"
+        cursor.execute('''INSERT INTO video_comment_counts (Video_Id, Channel_Id, Comment_Count)
+                          SELECT v.Video_Id, v.Channel_Id, COUNT(c.Comment_Id)
+                          FROM videos v
+                          LEFT JOIN comments c ON v.Video_Id = c.Video_Id
+                          {}
+                          GROUP BY v.Video_Id, v.Channel_Id
+                          {}
+                              Channel_Id = {},
+                              Comment_Count = {}'''.format(
+                           where, db.upsert_clause(["Video_Id"]), db.new_value("Channel_Id"),
+                           db.new_value("Comment_Count")), batch or ())
+    connection.commit()
+    bump_table_version("video_comment_counts")
+    cursor.close()
+
+# Function to bring the summary tables up to date after a harvest
+@instrumented("db")
+def refresh_aggregates(connection, channel_ids=None, video_ids=None):
+    try:
+        if channel_ids:
+            refresh_channel_stats(connection, channel_ids)
+        if video_ids:
+            refresh_comment_counts(connection, video_ids)
+    except db.Error as e:
+        show_error("Error refreshing summary tables: {}".format(e))
+
+# Migration 3: summary tables read by the dashboard instead of GROUP BY over videos/comments
+def migrate_summary_tables(connection):
+    cursor = connection.cursor()
+    db.create_table(cursor, '''CREATE TABLE IF NOT EXISTS channel_stats (
+                          Channel_Id VARCHAR(100) PRIMARY KEY,
+                          Video_Count INT,
+                          Total_Views BIGINT,
+                          Total_Duration_Seconds BIGINT,
+                          Avg_Duration_Seconds DOUBLE,
+                          Updated_At TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                      )''')
+    db.create_table(cursor, '''CREATE TABLE IF NOT EXISTS video_comment_counts (
+                          Video_Id VARCHAR(100) PRIMARY KEY,
+                          Channel_Id VARCHAR(100),
+                          Comment_Count INT
+                      )''')
+    add_index_if_missing(cursor, "video_comment_counts", "idx_comment_counts_count", "Comment_Count")
+    refresh_channel_stats(connection)
+    refresh_comment_counts(connection)
+
+# Migration 4: replies are stored next to top-level comments with their thread's ID
+def migrate_comment_parent(connection):
+    cursor = connection.cursor()
+    add_column_if_missing(cursor, "comments", "Parent_Id", "VARCHAR(100) NULL")
+
+# Migration 5: tags move to interned rows in tags/video_tags, and only one thumbnail URL is kept
+# Old rows only have the comma-joined Tags text, so tags that contained commas can't be recovered
+def migrate_video_tags(connection):
+    cursor = connection.cursor()
+    db.create_table(cursor, '''CREATE TABLE IF NOT EXISTS tags (
+                          Tag_Id INT AUTO_INCREMENT PRIMARY KEY,
+                          Tag VARCHAR(500) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
+                          UNIQUE KEY uq_tags_tag (Tag)
+                      )''')
+    db.create_table(cursor, '''CREATE TABLE IF NOT EXISTS video_tags (
+                          Video_Id VARCHAR(100),
+                          Tag_Id INT,
+                          Position SMALLINT,
+                          PRIMARY KEY (Video_Id, Tag_Id),
+                          KEY idx_video_tags_tag (Tag_Id)
+                      )''')
+    add_column_if_missing(cursor, "videos", "Thumbnail_Url", "VARCHAR(255) NULL")
+    if column_exists(cursor, "videos", "Thumbnails"):
+        cursor.execute('''UPDATE videos
+                          SET Thumbnail_Url = COALESCE({}, {}, {})
+                          WHERE Thumbnail_Url IS NULL AND JSON_VALID(Thumbnails)'''.format(
+                           db.json_text("Thumbnails", "$.high.url"), db.json_text("Thumbnails", "$.medium.url"),
+                           db.json_text("Thumbnails", '$."default".url')))
+        connection.commit()
+    if column_exists(cursor, "videos", "Tags"):
+        last_id = ""
+        while True:
+            cursor.execute('''SELECT Video_Id, Tags FROM videos
+                              WHERE Video_Id > %s AND Tags <> ''
+                              ORDER BY Video_Id LIMIT 1000''', (last_id,))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            write_video_tags(connection, [{"Video_Id": video_id, "Tags": tags.split(",")} for video_id, tags in rows])
+            last_id = rows[-1][0]
+    for column in ("Tags", "Thumbnails"):
+        if column_exists(cursor, "videos", column):
+            cursor.execute("ALTER TABLE videos DROP COLUMN {}".format(column))
+
+# Migration 6: statistics replaced by a re-harvest, one row per video and change
+# Recorded_At is when the values were replaced
+def migrate_video_stats_history(connection):
+    cursor = connection.cursor()
+    db.create_table(cursor, '''CREATE TABLE IF NOT EXISTS video_stats_history (
+                          Video_Id VARCHAR(100) NOT NULL,
+                          Recorded_At TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                          Views_Count BIGINT,
+                          Comments INT,
+                          Favorite_Count INT,
+                          Like_Count BIGINT,
+                          Dislike_Count BIGINT,
+                          PRIMARY KEY (Video_Id, Recorded_At)
+                      )''')
+
+# Migration 7: full-text search over video titles and descriptions and comment texts
+# DuckDB gets the search_postings inverted index, filled here from the stored rows
+def migrate_search_index(connection):
+    cursor = connection.cursor()
+    if db.search_postings:
+        db.create_table(cursor, '''CREATE TABLE IF NOT EXISTS search_postings (
+                              Doc_Table VARCHAR(20) NOT NULL,
+                              Doc_Id VARCHAR(100) NOT NULL,
+                              Term VARCHAR(100) NOT NULL,
+                              Hits INT NOT NULL
+                          )''')
+    for table, search in SEARCH_TABLES.items():
+        db.create_search_index(cursor, table, TABLE_KEYS[table], search["columns"])
+        if not db.search_postings:
+            continue
+        key = TABLE_KEYS[table]
+        columns = [key] + search["columns"]
+        last_id = ""
+        while True:
+            cursor.execute("SELECT {0} FROM {1} WHERE {2} > %s ORDER BY {2} LIMIT 1000".format(
+                ", ".join(columns), table, key), (last_id,))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            index_search_documents(connection, table, rows, columns, skip_stored=False)
+            last_id = rows[-1][0]
+    connection.commit()
+
+# Migration 8: SQLite FTS5 indexes keyed on the primary key instead of the rowid
+# The other backends' search indexes are left as they are
+def migrate_search_index_keys(connection):
+    cursor = connection.cursor()
+    for table, search in SEARCH_TABLES.items():
+        db.create_search_index(cursor, table, TABLE_KEYS[table], search["columns"])
+    connection.commit()
+
+# Versioned schema migrations, applied in order and recorded in schema_migrations
+# Each migration is idempotent, so a run interrupted half-way can simply be repeated
+MIGRATIONS = [
+    (1, "video_duration_seconds", migrate_duration_seconds),
+    (2, "analytic_indexes", migrate_analytic_indexes),
+    (3, "summary_tables", migrate_summary_tables),
+    (4, "comment_parent", migrate_comment_parent),
+    (5, "video_tags", migrate_video_tags),
+    (6, "video_stats_history", migrate_video_stats_history),
+    (7, "search_index", migrate_search_index),
+    (8, "search_index_keys", migrate_search_index_keys)
+]
+
+# Function to apply the migrations that have not been applied yet
+# Expects the base tables to exist; returns the versions applied by this call
+def run_migrations(connection):
+    applied_now = []
+    try:
+        cursor = connection.cursor()
+        db.create_table(cursor, '''CREATE TABLE IF NOT EXISTS schema_migrations (
+                              Version INT PRIMARY KEY,
+                              Name VARCHAR(100),
+                              Applied_At TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                          )''')
+        cursor.execute("SELECT Version FROM schema_migrations")
+        applied = set(version for (version,) in cursor.fetchall())
+        for version, name, migrate in MIGRATIONS:
+            if version in applied:
+                continue
+            migrate(connection)
+            cursor.execute("INSERT INTO schema_migrations (Version, Name) VALUES (%s, %s)", (version, name))
+            connection.commit()
+            applied_now.append(version)
+        if applied_now:
+            query_cache.clear()
+            with tag_ids_lock:
+                tag_ids.clear()
+        cursor.close()
+    except db.Error as e:
+        show_error("Error running schema migrations: {}".format(e))
+    return applied_now
+
+# Function to create the table holding the per-channel high-water mark
+@instrumented("db")
+def create_harvest_state_table(connection):
+    try:
+        cursor = connection.cursor()
+        db.create_table(cursor, '''CREATE TABLE IF NOT EXISTS harvest_state (
+                              Channel_Id VARCHAR(100) PRIMARY KEY,
+                              Last_Video_Id VARCHAR(100),
+                              Last_Publish_Date TIMESTAMP NULL,
+                              Updated_At TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                          )''')
+        connection.commit()
+    except db.Error as e:
+        show_error("Error creating harvest_state table: {}".format(e))
+
+# Function to read the high-water mark and stored video IDs of a channel
+def get_harvest_state(connection, channel_id):
+    cursor = connection.cursor()
+    cursor.execute("SELECT Last_Video_Id, Last_Publish_Date FROM harvest_state WHERE Channel_Id = %s", (channel_id,))
+    row = cursor.fetchone()
+    cursor.execute("SELECT Video_Id FROM videos WHERE Channel_Id = %s", (channel_id,))
+    stored_ids = [video_id for (video_id,) in cursor.fetchall()]
+    cursor.close()
+    return {
+        "Last_Video_Id": row[0] if row else None,
+        "Last_Publish_Date": row[1] if row else None,
+        "Video_Ids": stored_ids
+    }
+
+# Function to move the high-water mark to the newest harvested video
+def update_harvest_state(connection, channel_id, videos):
+    if not videos:
+        return
+    newest = max(videos, key=lambda video: video["Publish_Date"])
+    cursor = connection.cursor()
+    cursor.execute('''INSERT INTO harvest_state (Channel_Id, Last_Video_Id, Last_Publish_Date)
+                      VALUES (%s, %s, %s)
+                      {0}
+                          Last_Video_Id = CASE WHEN Last_Publish_Date IS NULL OR {1} >= Last_Publish_Date
+                                               THEN {2} ELSE Last_Video_Id END,
+                          Last_Publish_Date = CASE WHEN Last_Publish_Date IS NULL OR {1} >= Last_Publish_Date
+                                                   THEN {1} ELSE Last_Publish_Date END'''.format(
+                       db.upsert_clause(["Channel_Id"]), db.new_value("Last_Publish_Date"),
+                       db.new_value("Last_Video_Id")),
+                   (channel_id, newest["Video_Id"], convert_timestamp(newest["Publish_Date"])))
+    connection.commit()
+    cursor.close()
+
+# Function to fetch only the statistics of videos that are already stored
+# Always asks the API: a cached response would only return the stats that are already stored
+@instrumented("api")
+def get_video_stats(YouTube, video_ids):
+    stats = []
+    for batch in chunk_list(list(video_ids), 50):
+        res = execute_request(YouTube.videos().list(
+            part="statistics",
+            id=",".join(batch),
+            maxResults=len(batch)
+        ), "videos", use_cache=False)
+        for item in res.get("items", []):
+            stats.append({
+                "Video_Id": item["id"],
+                "Views_Count": item["statistics"].get("viewCount", 0),
+                "Comments": item["statistics"].get("commentCount", 0),
+                "Favorite_Count": item["statistics"].get("favoriteCount", 0),
+                "Like_Count": item["statistics"].get("likeCount", 0),
+                "Dislike_Count": item["statistics"].get("dislikeCount", 0)
+            })
+    return stats
+
+# Function to upsert refreshed statistics of stored videos; unchanged videos are skipped
+@instrumented("db")
+def update_video_stats(connection, stats, batch_size=BULK_BATCH_SIZE):
+    columns = ["Video_Id"] + VIDEO_STAT_COLUMNS
+    pages = (changed_video_rows(connection, (tuple([video["Video_Id"]] + convert_stat_values(video))
+                                             for video in batch), columns)
+             for batch in chunk_list(stats, batch_size))
+    return upsert_changed_videos(connection, columns, pages, batch_size)
 
-# Function to insert video details into the Videos table
-def insert_video_details(videos):
+# Function to cast the API statistics of one video to integers, in VIDEO_STAT_COLUMNS order
+def convert_stat_values(video):
+    return [int(video.get(column) or 0) for column in VIDEO_STAT_COLUMNS]
+
+# Number of stored videos, newest first, whose stats an incremental harvest refreshes
+INCREMENTAL_STATS_VIDEOS = int(os.environ.get("YOUTUBE_INCREMENTAL_STATS_VIDEOS", "200"))
+
+# Function to list the IDs of a channel's newest stored videos
+def recent_video_ids(connection, channel_id, limit=INCREMENTAL_STATS_VIDEOS):
+    cursor = connection.cursor()
+    cursor.execute("SELECT Video_Id FROM videos WHERE Channel_Id = %s ORDER BY Publish_Date DESC LIMIT %s",
+                   (channel_id, limit))
+    video_ids = [video_id for (video_id,) in cursor.fetchall()]
+    cursor.close()
+    return video_ids
+
+# Function to harvest only new videos of a channel and refresh the stats of its newest stored ones
+# Older videos change little, so a run costs a few videos().list units instead of one per 50 stored videos
+def harvest_videos_incremental(YouTube, connection, channel_id):
     try:
-        db_connection = db.connect(host="localhost", user="root", password="123", database="y_data")
-        cursor = db_connection.cursor()
-
-        for video in videos:
-            publish_date = datetime.strptime(video["Publish_Date"][:-1], '%Y-%m-%dT%H:%M:%S').strftime('%Y-%m-%d %H:%M:%S')
-            caption_value = 1 if video["Caption"] else 0
-            thumbnails_str = json.dumps(video["Thumbnails"])
-
-            # Convert YouTube duration format to HH:MM:SS format
-            duration = convert_duration(video["Duration"])
-
-            query = '''INSERT INTO videos (
-                                           Video_Name,
-                                           Channel_Id,
-                                           Video_Id,
-                                           Title,
-                                           Description,
-                                           Publish_Date,
-                                           Duration,
-                                           Definition,
-                                           Caption,
-                                           Views_Count,
-                                           Comments,
-                                           Favorite_Count,
-                                           Like_Count,
-                                           Dislike_Count,
-                                           Tags,
-                                           Thumbnails)
-                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)'''
-            val = (video["Video_Name"],
-                   video["Channel_Id"],
-                   video["Video_Id"],
-                   video["Title"],
-                   video["Description"],
-                   publish_date,
-                   duration,
-                   video["Definition"],
-                   caption_value,
-                   video["Views_Count"],
-                   video["Comments"],
-                   video["Favorite_Count"],
-                   video["Like_Count"],
-                   video["Dislike_Count"],
-                   ",".join(video["Tags"]),
-                   thumbnails_str)
-            cursor.execute(query, val)
-            db_connection.commit()
-        db_connection.close()
+        state = get_harvest_state(connection, channel_id)
+        # Picked before the new videos are stored; those are fetched with their stats anyway
+        refresh_ids = recent_video_ids(connection, channel_id)
+        stop_at = set(state["Video_Ids"])
+        if state["Last_Video_Id"]:
+            stop_at.add(state["Last_Video_Id"])
+
+        new_ids = get_video_ids(YouTube, channel_id, stop_at=stop_at)
+        new_videos = get_video_info(YouTube, new_ids) if new_ids else []
+        # write_video_details raises, so the high-water mark only moves once every page is committed
+        if new_videos:
+            write_video_details(connection, new_videos)
+            update_harvest_state(connection, channel_id, new_videos)
+
+        refreshed = get_video_stats(YouTube, refresh_ids)
+        if refreshed:
+            update_video_stats(connection, refreshed)
+        refresh_aggregates(connection, [channel_id], [video["Video_Id"] for video in new_videos])
+        return {"new_videos": new_videos, "refreshed": len(refreshed)}
     except db.Error as e:
-        st.error("Error inserting video details: {}".format(e))
+        connection.rollback()
+        show_error("Error during incremental harvest: {}".format(e))
+        return {"new_videos": [], "refreshed": 0}
 
 # Function to create the playlists table
+@instrumented("db")
 def create_playlists_table():
     try:
-        db_connection = db.connect(host="localhost", user="root", password="123", database="y_data")
-        cursor = db_connection.cursor()
-        cursor.execute('''CREATE TABLE IF NOT EXISTS playlists (
+        with pooled_connection() as db_connection:
+            cursor = db_connection.cursor()
+            db.create_table(cursor, '''CREATE TABLE IF NOT EXISTS playlists (
                               Playlist_id VARCHAR(100) PRIMARY KEY,
                               Title VARCHAR(255),
                               Channel_id VARCHAR(100),
@@ -275,75 +1871,75 @@ def create_playlists_table():
                               Published_Date TIMESTAMP,
                               Item_Count INT
                           )''')
-        db_connection.close()
     except db.Error as e:
-        st.error("Error creating playlists table:", e)
+        show_error("Error creating playlists table: {}".format(e))
+
+# Function to convert a playlist dict into a playlists row
+def playlist_row(playlist):
+    return (playlist["Playlist_id"],
+            playlist["Title"],
+            playlist["Channel_id"],
+            playlist["Channel_Title"],
+            convert_timestamp(playlist["Published_Date"]),
+            playlist["Item_Count"])
+
+# Function to write playlist details into the playlists table; database errors are raised
+@instrumented("db")
+def write_playlist_details(connection, playlists, batch_size=BULK_BATCH_SIZE):
+    return bulk_insert(connection, "playlists", PLAYLIST_COLUMNS,
+                       (playlist_row(playlist) for playlist in playlists), batch_size,
+                       update_columns=PLAYLIST_UPDATE_COLUMNS)
 
 # Function to insert playlist details into the playlists table
-def insert_playlist_details(playlists):
+def insert_playlist_details(playlists, batch_size=BULK_BATCH_SIZE):
     try:
-        db_connection = db.connect(host="localhost", user="root", password="123", database="y_data")
-        cursor = db_connection.cursor()
-
-        for playlist in playlists:
-            publish_date = datetime.strptime(playlist["Published_Date"][:-1], '%Y-%m-%dT%H:%M:%S').strftime('%Y-%m-%d %H:%M:%S')
-
-            query = '''INSERT IGNORE INTO playlists (
-                                           Playlist_id,
-                                           Title,
-                                           Channel_id,
-                                           Channel_Title,
-                                           Published_Date,
-                                           Item_Count)
-                       VALUES (%s, %s, %s, %s, %s, %s)'''
-            val = (playlist["Playlist_id"],
-                   playlist["Title"],
-                   playlist["Channel_id"],
-                   playlist["Channel_Title"],
-                   publish_date,
-                   playlist["Item_Count"])
-            cursor.execute(query, val)
-            db_connection.commit()
-        db_connection.close()
+        with pooled_connection() as db_connection:
+            return write_playlist_details(db_connection, playlists, batch_size)
     except db.Error as e:
-        st.error("Error inserting playlist details: {}".format(str(e)))
+        show_error("Error inserting playlist details: {}".format(str(e)))
+
+# Function to fetch the playlists of a channel; API errors are raised
+@instrumented("api")
+def fetch_playlist_details(YouTube, Channel_id):
+    next_page_token = None
+    playlist_data = []
+    while True:
+        req = execute_request(YouTube.playlists().list(
+            part="snippet, contentDetails",
+            channelId=Channel_id,
+            maxResults=50,
+            pageToken=next_page_token
+        ), "playlists")
+
+        for item in req["items"]:
+            df = {
+                "Playlist_id": item["id"],
+                "Title": item["snippet"]["title"],
+                "Channel_id": item["snippet"]["channelId"],
+                "Channel_Title": item["snippet"]["channelTitle"],
+                "Published_Date": item["snippet"]["publishedAt"],
+                "Item_Count": item["contentDetails"]["itemCount"]
+            }
+            playlist_data.append(df)
+        next_page_token = req.get("nextPageToken")
+        if next_page_token is None:
+            break
+    return playlist_data
 
 # Function to get Playlist Details
 def get_playlist_details(YouTube, Channel_id):
     try:
-        next_page_token = None
-        playlist_data = []
-        while True:
-            req = YouTube.playlists().list(
-                part="snippet, contentDetails",
-                channelId=Channel_id,
-                maxResults=50,
-                pageToken=next_page_token
-            ).execute()
-
-            for item in req["items"]:
-                df = {
-                    "Playlist_id": item["id"],
-                    "Title": item["snippet"]["title"],
-                    "Channel_id": item["snippet"]["channelId"],
-                    "Channel_Title": item["snippet"]["channelTitle"],
-                    "Published_Date": item["snippet"]["publishedAt"],
-                    "Item_Count": item["contentDetails"]["itemCount"]
-                }
-                playlist_data.append(df)
-            next_page_token = req.get("nextPageToken")      
-            if next_page_token is None:
-                break
-        return playlist_data
+        return fetch_playlist_details(YouTube, Channel_id)
     except Exception as e:
-        st.error("Error retrieving playlist details: {}".format(e))
+        show_error("Error retrieving playlist details: {}".format(e))
         return []
 
 # Function to create the comments table
+@instrumented("db")
 def create_comments_table(connection):
     try:
         cursor = connection.cursor()
-        cursor.execute('''CREATE TABLE IF NOT EXISTS comments (
+        db.create_table(cursor, '''CREATE TABLE IF NOT EXISTS comments (
                               Comment_Id VARCHAR(100) PRIMARY KEY,
                               Video_Id VARCHAR(100),
                               Text_Display TEXT,
@@ -352,226 +1948,736 @@ def create_comments_table(connection):
                           ''')
         connection.commit()
     except db.Error as e:
-        st.error("Error creating comments table:", e)
+        show_error("Error creating comments table: {}".format(e))
+
+# Function to normalise a page of comment dicts column by column into comments rows
+def comment_rows(comments):
+    comments = list(comments)
+    columns = dict((column, [comment.get(column) for comment in comments]) for column in COMMENT_COLUMNS)
+    columns["Comment_Date"] = convert_timestamp_column(columns["Comment_Date"])
+    return list(zip(*(columns[column] for column in COMMENT_COLUMNS)))
+
+# Function to write comment details into the comments table
+# The words of new comments are indexed for search before their rows are written
+# Database errors are raised; insert_comment_details reports them
+@instrumented("db")
+def write_comment_details(connection, comments, batch_size=BULK_BATCH_SIZE):
+    def rows():
+        for batch in chunk_list(comments, batch_size):
+            batch_rows = comment_rows(batch)
+            index_search_documents(connection, "comments", batch_rows, COMMENT_COLUMNS)
+            yield from batch_rows
+    return bulk_insert(connection, "comments", COMMENT_COLUMNS, rows(), batch_size, ignore=True)
 
 # Function to insert comment details into the comments table
-def insert_comment_details(connection, comments):
+def insert_comment_details(connection, comments, batch_size=BULK_BATCH_SIZE):
     try:
-        cursor = connection.cursor()
-        for comment in comments:
-            publish_date = datetime.strptime(comment["Comment_Date"][:-1], '%Y-%m-%dT%H:%M:%S').strftime('%Y-%m-%d %H:%M:%S')
-            query = '''INSERT IGNORE INTO comments (
-                                            Comment_Id,
-                                            Video_Id,
-                                            Text_Display,
-                                            Author_Name,
-                                            Comment_Date)
-                                        VALUES (%s, %s, %s, %s, %s)'''
-            val = (comment["Comment_Id"],
-                   comment["Video_Id"],
-                   comment["Text_Display"],
-                   comment["Author_Name"],
-                   publish_date)
-            cursor.execute(query, val)
-        connection.commit()
+        return write_comment_details(connection, comments, batch_size)
     except db.Error as e:
-        st.error("Error inserting comment details: {}".format(e))
+        show_error("Error inserting comment details: {}".format(e))
 
-# Function to retrieve comment details
-def get_comment_info(YouTube, video_ids):
-    comment_data = []
+# Error reasons meaning a video's comments can't be read at all; the video is skipped
+UNAVAILABLE_COMMENT_REASONS = ("commentsDisabled", "videoNotFound", "forbidden")
+
+# Function to convert a comment snippet into a comments row
+def parse_comment(comment_id, video_id, snippet, parent_id=None):
+    return {
+        "Comment_Id": comment_id,
+        "Video_Id": video_id,
+        "Text_Display": snippet["textDisplay"],
+        "Author_Name": snippet["authorDisplayName"],
+        "Comment_Date": snippet["publishedAt"],
+        "Parent_Id": parent_id
+    }
+
+# Generator yielding one page of replies per comments().list request for a thread
+def iter_reply_pages(YouTube, video_id, parent_id):
+    next_page_token = None
+    while True:
+        req = execute_request(YouTube.comments().list(
+            part="snippet",
+            parentId=parent_id,
+            maxResults=100,
+            pageToken=next_page_token
+        ), "comments")
+        yield [parse_comment(item["id"], video_id, item["snippet"], parent_id) for item in req["items"]]
+        next_page_token = req.get("nextPageToken")
+        if not next_page_token:
+            break
+
+# Generator yielding (page of comments, next page token) per commentThreads request for a video
+# Replies come along with their thread; threads with more replies than the API inlines
+# (up to 5) get the rest from comments().list
+def iter_comment_pages(YouTube, video_id, page_token=None, include_replies=True):
+    next_page_token = page_token
+    while True:
+        req = execute_request(YouTube.commentThreads().list(
+            part="snippet, replies",
+            videoId=video_id,
+            maxResults=50,
+            pageToken = next_page_token
+        ), "commentThreads")
+
+        page = []
+        for item in req["items"]:
+            page.append(parse_comment(item["id"], item["snippet"]["videoId"],
+                                      item["snippet"]["topLevelComment"]["snippet"]))
+            if not include_replies:
+                continue
+            replies = item.get("replies", {}).get("comments", [])
+            if item["snippet"].get("totalReplyCount", 0) > len(replies):
+                for reply_page in iter_reply_pages(YouTube, video_id, item["id"]):
+                    page.extend(reply_page)
+            else:
+                page.extend(parse_comment(reply["id"], video_id, reply["snippet"], item["id"]) for reply in replies)
+        next_page_token = req.get("nextPageToken")
+        yield page, next_page_token
+        if not next_page_token:
+            break
+
+# Generator yielding the comments of a single video one page at a time
+# Transient failures are retried by execute_request; videos with comments disabled or
+# removed are skipped with a warning
+def iter_video_comments(YouTube, video_id, max_comments=None):
+    count = 0
     try:
-        for video_id in video_ids:
-            next_page_token = None
-            while True:
-                req = YouTube.commentThreads().list(
-                    part="snippet, replies",
-                    videoId=video_id,
-                    maxResults=50,
-                    pageToken = next_page_token
-                ).execute()
-
-                for item in req["items"]:
-                    comment_info = {
-                        "Comment_Id": item["id"],
-                        "Video_Id": item["snippet"]["videoId"],
-                        "Text_Display": item["snippet"]["topLevelComment"]["snippet"]["textDisplay"],
-                        "Author_Name": item["snippet"]["topLevelComment"]["snippet"]["authorDisplayName"],
-                        "Comment_Date": item["snippet"]["topLevelComment"]["snippet"]["publishedAt"]
-                    }
-                    comment_data.append(comment_info)
-                next_page_token = req.get("nextPageToken")
-                if not next_page_token:
-                    break    
+        for page, _ in iter_comment_pages(YouTube, video_id):
+            if max_comments and count + len(page) >= max_comments:
+                yield page[:max_comments - count]
+                return
+            count += len(page)
+            yield page
     except HttpError as e:
-        if e.resp.status == 403 and 'commentsDisabled' in str(e):
-            st.error("Comments are disabled for the video with ID: {}".format(video_id))
-        else:
-            st.error("Error retrieving comment info: {}".format(e))
-    except Exception as e:
-        st.error("Error retrieving comment info: {}".format(e))
-        
+        if e.resp.status in (403, 404) and get_error_reason(e) in UNAVAILABLE_COMMENT_REASONS:
+            show_warning("Comments are not available for the video with ID: {}".format(video_id))
+            return
+        raise
+
+# Function to harvest the comments of a single video into one list
+@instrumented("api")
+def fetch_video_comments(YouTube, video_id, max_comments=None):
+    return [comment for page in iter_video_comments(YouTube, video_id, max_comments)
+            for comment in page]
+
+# Function to retrieve comment details
+# A failing video is reported and skipped; the remaining videos are still harvested
+@instrumented("api")
+def get_comment_info(YouTube, video_ids, max_comments=None):
+    comment_data = []
+    for video_id in video_ids:
+        try:
+            comment_data.extend(fetch_video_comments(YouTube, video_id, max_comments))
+        except Exception as e:
+            show_error("Error retrieving comments for the video with ID {}: {}".format(video_id, e))
     return comment_data
 
+# Function to stream pages through a transform into a writer, one flush per page
+# Only the current page is held in memory; returns totals in the bulk_insert format
+def run_pipeline(pages, write, transform=None):
+    totals = {"table": None, "rows": 0, "pages": 0, "seconds": 0.0, "rows_per_second": 0.0,
+              "first_write_seconds": None}
+    start = time.perf_counter()
+    for page in pages:
+        if transform:
+            page = transform(page)
+        if not page:
+            continue
+        stats = write(page)
+        totals["pages"] += 1
+        if stats:
+            totals["table"] = stats["table"]
+            totals["rows"] += stats["rows"]
+        if totals["first_write_seconds"] is None:
+            totals["first_write_seconds"] = time.perf_counter() - start
+    totals["seconds"] = time.perf_counter() - start
+    if totals["seconds"] > 0:
+        totals["rows_per_second"] = totals["rows"] / totals["seconds"]
+    return totals
+
+# Concurrent harvesting engine
+# Runs the fetch_* functions on a bounded thread pool; every worker gets its own
+# API client because the googleapiclient HTTP transport is not thread-safe
+class HarvestEngine:
+    def __init__(self, client_factory, max_workers=8):
+        self.client_factory = client_factory
+        self.max_workers = max_workers
+        self.local = threading.local()
+        self.errors = []
+
+    def client(self):
+        if not hasattr(self.local, "client"):
+            self.local.client = self.client_factory()
+        return self.local.client
+
+    # Generator version of run: yields each result as soon as its worker finishes
+    # At most 2 * max_workers items are in flight, so results don't pile up ahead of the consumer
+    def imap(self, func, items):
+        items = iter(items)
+        pending = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                for item in items:
+                    pending[executor.submit(lambda item: func(self.client(), item), item)] = item
+                    if len(pending) >= 2 * self.max_workers:
+                        break
+                if not pending:
+                    break
+                done = wait(pending, return_when=FIRST_COMPLETED)[0]
+                for future in done:
+                    item = pending.pop(future)
+                    try:
+                        yield future.result()
+                    except Exception as e:
+                        self.errors.append((item, e))
+
+    # Version of imap for funcs returning an iterable of pages, e.g. iter_video_comments
+    # Pages are yielded as the workers produce them; a full queue of 2 * max_workers pages
+    # makes the workers wait, so one item's pages are never all held in memory
+    def imap_pages(self, func, items):
+        pages = queue.Queue(maxsize=2 * self.max_workers)
+        stopped = threading.Event()
+        finished = object()
+
+        # Waits for room in the queue; returns False once the consumer has stopped reading
+        def offer(page):
+            while not stopped.is_set():
+                try:
+                    pages.put(page, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce(client, item):
+            for page in func(client, item):
+                if not offer(page):
+                    return
+
+        def run_all():
+            try:
+                for _ in self.imap(produce, items):
+                    if stopped.is_set():
+                        break
+            finally:
+                offer(finished)
+
+        threading.Thread(target=run_all, daemon=True).start()
+        try:
+            while True:
+                page = pages.get()
+                if page is finished:
+                    break
+                yield page
+        finally:
+            stopped.set()
+
+    # Run func(client, item) for every item; results come back in input order
+    # A failing item is recorded in self.errors and does not stop the run
+    def run(self, func, items):
+        items = list(items)
+        results = [None] * len(items)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(lambda item: func(self.client(), item), item): index
+                       for index, item in enumerate(items)}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    self.errors.append((items[index], e))
+        return results
+
+# Function to stream video details of a channel into the videos table page by page
+# A batch of 50 IDs that fails ends up in engine.errors; the other batches are still stored
+# A database error is reported and stops the stream (None is returned); the high-water mark
+# only covers the pages written before it
+def stream_video_details(engine, connection, channel_id, video_ids):
+    def write(videos):
+        stats = write_video_details(connection, videos)
+        update_harvest_state(connection, channel_id, videos)
+        return stats
+    try:
+        result = run_pipeline(engine.imap(fetch_video_page, chunk_list(video_ids, 50)), write)
+    except db.Error as e:
+        connection.rollback()
+        show_error("Error inserting video details: {}".format(e))
+        return None
+    refresh_aggregates(connection, [channel_id], video_ids)
+    return result
+
+# Function to stream comments of the given videos into the comments table page by page
+# Each video is fetched by its own worker, so a failing video only ends up in engine.errors
+def stream_comment_details(engine, connection, video_ids, max_comments=None):
+    def write(comments):
+        return insert_comment_details(connection, comments)
+    fetch = lambda client, video_id: iter_video_comments(client, video_id, max_comments)
+    result = run_pipeline(engine.imap_pages(fetch, video_ids), write)
+    refresh_aggregates(connection, video_ids=video_ids)
+    return result
+
 # Function to execute SQL queries and return results in DataFrame format
-def execute_query(connection, query):
+# limit caps the rows read; use iter_query_chunks or export_query for results of any size
+@instrumented("db")
+def execute_query(connection, query, params=None, limit=QUERY_DISPLAY_ROWS):
     try:
-        cursor = connection.cursor()
-        cursor.execute(query)
-        columns = [col[0] for col in cursor.description]
-        data = cursor.fetchall()
+        columns, data = cached_query(connection, limit_query(query, limit) if limit else query, params)
         return pd.DataFrame(data, columns=columns)
     except db.Error as e:
-        st.error("Error executing query: {}".format(e))
+        show_error("Error executing query: {}".format(e))
         return pd.DataFrame()
     
-# Function to create the SQL queries tab                 
-def sql_queries_tab(connection):
-    cursor = connection.cursor()
-    st.subheader("SQL Queries")
-    questions = [
-        "1. What are the names of all the videos and their corresponding channels?",
-        "2. Which channels have the most number of videos, and how many videos do they have?",
-        "3. What are the top 10 most viewed videos and their respective channels?",
-        "4. How many comments were made on each video, and what are their corresponding video names?",
-        "5. Which videos have the highest number of likes, and what are their corresponding channel names?",
-        "6. What is the total number of likes and dislikes for each video, and what are their corresponding video names?",
-        "7. What is the total number of views for each channel, and what are their corresponding channel names?",
-        "8. What are the names of all the channels that have published videos in the year 2022 and 2023?",
-        "9. What is the average duration of all videos in each channel, and what are their corresponding channel names?",
-        "10. Which videos have the highest number of comments, and what are their corresponding channel names?"
-    ]
-    selected_question = st.selectbox("Select a question:", questions)
-    
-    query_results = []
-    if selected_question == questions[0]:
-        query = """
+# The 10 analytic questions with their SQL and result columns
+# "query" is written for MySQL and also runs on SQLite and DuckDB, unless the entry has its own
+# "sqlite" or "duckdb" SQL
+ANALYTIC_QUERIES = [
+    {
+        "question": "1. What are the names of all the videos and their corresponding channels?",
+        "query": """
                 SELECT v.Title AS Video_Title, c.Channel_Name AS Channel_Name 
                 FROM videos v
                 INNER JOIN channels c ON v.Channel_Id = c.Channel_Id
-                """
-        cursor.execute(query)
-        query_results.append(cursor.fetchall())
-        column_names = ["Video_Title", "Channel_Name"]
-
-    elif selected_question == questions[1]:
-        query = '''
-                SELECT c.Channel_Name, COUNT(*) AS Video_Count
-                FROM videos v
-                INNER JOIN channels c ON v.Channel_Id = c.Channel_Id
-                GROUP BY v.Channel_Id
-                ORDER BY Video_Count DESC
-                '''
-        cursor.execute(query)
-        query_results.append(cursor.fetchall())
-        column_names = ["Channel_Name", "Video_Count"]
-
-    elif selected_question == questions[2]:
-        query = """
+                """,
+        "columns": ["Video_Title", "Channel_Name"]
+    },
+    {
+        "question": "2. Which channels have the most number of videos, and how many videos do they have?",
+        "query": '''
+                SELECT c.Channel_Name, s.Video_Count
+                FROM channel_stats s
+                INNER JOIN channels c ON s.Channel_Id = c.Channel_Id
+                ORDER BY s.Video_Count DESC
+                ''',
+        "columns": ["Channel_Name", "Video_Count"]
+    },
+    {
+        "question": "3. What are the top 10 most viewed videos and their respective channels?",
+        "query": """
                 SELECT v.Title AS Video_Name, c.Channel_Name, v.Views_Count
                 FROM videos v
                 INNER JOIN channels c ON v.Channel_Id = c.Channel_Id
                 ORDER BY v.Views_Count DESC
                 LIMIT 10
-                """
-        cursor.execute(query)
-        query_results.append(cursor.fetchall())
-        column_names = ["Video_Name", "Channel_Name", "Views_Count"]
-
-    elif selected_question == questions[3]:
-        query = """
-                SELECT v.Title AS Video_Name, COUNT(c.Comment_Id) AS Comment_Count
+                """,
+        "columns": ["Video_Name", "Channel_Name", "Views_Count"]
+    },
+    {
+        "question": "4. How many comments were made on each video, and what are their corresponding video names?",
+        "query": """
+                SELECT v.Title AS Video_Name, COALESCE(cc.Comment_Count, 0) AS Comment_Count
                 FROM videos v
-                LEFT JOIN comments c ON v.Video_Id = c.Video_Id
-                GROUP BY v.Video_Id
-                """
-        cursor.execute(query)
-        query_results.append(cursor.fetchall())
-        column_names = ["Video_Name", "Comment_Count"]
-
-    elif selected_question == questions[4]:
-        query = """
+                LEFT JOIN video_comment_counts cc ON v.Video_Id = cc.Video_Id
+                """,
+        "columns": ["Video_Name", "Comment_Count"]
+    },
+    {
+        "question": "5. Which videos have the highest number of likes, and what are their corresponding channel names?",
+        "query": """
                 SELECT v.Title AS Video_Name, c.Channel_Name, v.Like_Count
                 FROM videos v
                 INNER JOIN channels c ON v.Channel_Id = c.Channel_Id
                 ORDER BY v.Like_Count DESC
                 LIMIT 10
-                """
-        cursor.execute(query)
-        query_results.append(cursor.fetchall())
-        column_names = ["Video_Name", "Channel_Name", "Like_Count"]
-
-    elif selected_question == questions[5]:
-        query = """
+                """,
+        "columns": ["Video_Name", "Channel_Name", "Like_Count"]
+    },
+    {
+        "question": "6. What is the total number of likes and dislikes for each video, and what are their corresponding video names?",
+        "query": """
                 SELECT v.Title AS Video_Name, SUM(v.Like_Count) AS Total_Likes, SUM(v.Dislike_Count) AS Total_Dislikes
                 FROM videos v
                 GROUP BY v.Video_Id
-                """
-        cursor.execute(query)
-        query_results.append(cursor.fetchall())
-        column_names = ["Video_Name", "Total_Likes", "Total_Dislikes"]
-
-    elif selected_question == questions[6]:
-        query = """
-                SELECT c.Channel_Name, SUM(v.Views_Count) AS Total_Views
+                """,
+        "duckdb": """
+                SELECT v.Title AS Video_Name, CAST(SUM(v.Like_Count) AS BIGINT) AS Total_Likes,
+                       CAST(SUM(v.Dislike_Count) AS BIGINT) AS Total_Dislikes
+                FROM videos v
+                GROUP BY v.Video_Id, v.Title
+                """,
+        "columns": ["Video_Name", "Total_Likes", "Total_Dislikes"]
+    },
+    {
+        "question": "7. What is the total number of views for each channel, and what are their corresponding channel names?",
+        "query": """
+                SELECT c.Channel_Name, s.Total_Views
                 FROM channels c
-                INNER JOIN videos v ON c.Channel_Id = v.Channel_Id
-                GROUP BY c.Channel_Id
-                """
-        cursor.execute(query)
-        query_results.append(cursor.fetchall())
-        column_names = ["Channel_Name", "Total_Views"]
-
-    elif selected_question == questions[7]:
-        query = """
+                INNER JOIN channel_stats s ON c.Channel_Id = s.Channel_Id
+                """,
+        "columns": ["Channel_Name", "Total_Views"]
+    },
+    {
+        "question": "8. What are the names of all the channels that have published videos in the year 2022 and 2023?",
+        "query": """
                 SELECT DISTINCT c.Channel_Name
                 FROM channels c
                 INNER JOIN videos v ON c.Channel_Id = v.Channel_Id
-                WHERE YEAR(v.Publish_Date) IN (2022, 2023)
-                """
-        cursor.execute(query)
-        query_results.append(cursor.fetchall())
-        column_names = ["Channel_Name"]
-
-    elif selected_question == questions[8]:
-        query = """
-                SELECT c.Channel_Name, SEC_TO_TIME(AVG(TIME_TO_SEC(TIMEDIFF(v.Duration, '00:00:00')))) AS Avg_Duration
+                WHERE v.Publish_Date >= '2022-01-01' AND v.Publish_Date < '2024-01-01'
+                """,
+        "columns": ["Channel_Name"]
+    },
+    {
+        "question": "9. What is the average duration of all videos in each channel, and what are their corresponding channel names?",
+        "query": """
+                SELECT c.Channel_Name, SEC_TO_TIME(ROUND(s.Avg_Duration_Seconds)) AS Avg_Duration
                 FROM channels c
-                INNER JOIN videos v ON c.Channel_Id = v.Channel_Id
-                GROUP BY c.Channel_Id
-                """
-        cursor.execute(query)
-        query_results.append(cursor.fetchall())
-        column_names = ["Channel_Name", "Avg_Duration"]
-
-    elif selected_question == questions[9]:
-        query = """
-                SELECT v.Title AS Video_Name, ch.Channel_Name, COUNT(co.Comment_Id) AS Comment_Count
-                FROM videos v
+                INNER JOIN channel_stats s ON c.Channel_Id = s.Channel_Id
+                """,
+        "sqlite": """
+                SELECT Channel_Name, CASE WHEN Seconds IS NOT NULL
+                                          THEN printf('%02d:%02d:%02d', Seconds / 3600, Seconds % 3600 / 60, Seconds % 60)
+                                     END AS Avg_Duration
+                FROM (SELECT c.Channel_Name, CAST(ROUND(s.Avg_Duration_Seconds) AS INTEGER) AS Seconds
+                      FROM channels c
+                      INNER JOIN channel_stats s ON c.Channel_Id = s.Channel_Id) d
+                """,
+        "duckdb": """
+                SELECT Channel_Name, CASE WHEN Seconds IS NOT NULL
+                                          THEN printf('%02d:%02d:%02d', Seconds // 3600, Seconds % 3600 // 60, Seconds % 60)
+                                     END AS Avg_Duration
+                FROM (SELECT c.Channel_Name, CAST(ROUND(s.Avg_Duration_Seconds) AS BIGINT) AS Seconds
+                      FROM channels c
+                      INNER JOIN channel_stats s ON c.Channel_Id = s.Channel_Id) d
+                """,
+        "columns": ["Channel_Name", "Avg_Duration"]
+    },
+    {
+        "question": "10. Which videos have the highest number of comments, and what are their corresponding channel names?",
+        "query": """
+                SELECT v.Title AS Video_Name, ch.Channel_Name, cc.Comment_Count
+                FROM video_comment_counts cc
+                INNER JOIN videos v ON cc.Video_Id = v.Video_Id
                 INNER JOIN channels ch ON v.Channel_Id = ch.Channel_Id
-                LEFT JOIN comments co ON v.Video_Id = co.Video_Id
-                GROUP BY v.Video_Id
-                ORDER BY Comment_Count DESC
+                ORDER BY cc.Comment_Count DESC
                 LIMIT 10
-                """
-        cursor.execute(query)
-        query_results.append(cursor.fetchall())
-        column_names = ["Video_Name", "Channel_Name", "Comment_Count"]
+                """,
+        "columns": ["Video_Name", "Channel_Name", "Comment_Count"]
+    }
+]
+
+# Function to pick the SQL of an analytic question for the current storage backend
+def analytic_query(entry):
+    return entry.get(db.name, entry["query"])
+
+# Function to create the SQL queries tab                 
+def sql_queries_tab(connection):
+    import streamlit as st
+    st.subheader("SQL Queries")
+    questions = [entry["question"] for entry in ANALYTIC_QUERIES]
+    selected_question = st.selectbox("Select a question:", questions)
+
+    number = questions.index(selected_question)
+    entry = ANALYTIC_QUERIES[number]
+    source = st.radio("Run on", [db.label, "Parquet warehouse (DuckDB)", "Parquet warehouse (pyarrow)"],
+                      horizontal=True)
+    column_names = entry["columns"]
+    if source == db.label:
+        # One extra row tells whether the result was cut off
+        data = cached_query(connection, limit_query(analytic_query(entry), QUERY_DISPLAY_ROWS + 1))[1]
+    else:
+        import warehouse
+        engine = "duckdb" if "DuckDB" in source else "pyarrow"
+        if st.button("Export Parquet warehouse snapshot"):
+            stats = warehouse.export_snapshot(connection)
+            st.success("Exported {} channels to {} in {:.2f}s".format(
+                stats["channels"], warehouse.WAREHOUSE_DIR, stats["seconds"]))
+        try:
+            data = list(warehouse.run_analytic_query(number + 1, engine).head(QUERY_DISPLAY_ROWS + 1).itertuples(index=False))
+        except ImportError as e:
+            show_error("The {} engine is not installed: {}".format(engine, e))
+            data = []
 
     # Display the result in DataFrame
-    if query_results:
-        combined_data = [result for result in query_results if result]
-        if combined_data:
-            df = pd.DataFrame([item for sublist in combined_data for item in sublist], columns=column_names)
-            st.write(df)
-        else:
-            st.warning("No data found for the selected question.")
+    if data:
+        st.write(pd.DataFrame(data[:QUERY_DISPLAY_ROWS], columns=column_names))
+        if len(data) > QUERY_DISPLAY_ROWS:
+            st.caption("Showing the first {} rows. Export the query for the full result.".format(QUERY_DISPLAY_ROWS))
+    else:
+        st.warning("No data found for the selected question.")
+
+    file_format = st.radio("Export format", ["csv", "parquet"], horizontal=True)
+    if st.button("Export full result"):
+        path = os.path.join(EXPORT_DIR, "query_{}.{}".format(number + 1, file_format))
+        try:
+            stats = export_query(connection, analytic_query(entry), path, file_format)
+            st.success("Exported {} rows ({:.1f} MB) to {} in {:.2f}s".format(
+                stats["rows"], stats["bytes"] / 2 ** 20, stats["path"], stats["seconds"]))
+        except (db.Error, OSError, ImportError) as e:
+            show_error("Error exporting query: {}".format(e))
+
+# Function to show the Previous/Next page buttons of a keyset-paginated view
+# starts holds the start keys of the pages seen so far (kept in the session), so Previous goes back one page
+def page_buttons(starts, last_key, has_next, key):
+    import streamlit as st
+    previous_column, next_column = st.columns(2)
+    if previous_column.button("Previous page", disabled=len(starts) == 1, key=key + "_previous"):
+        starts.pop()
+        st.rerun()
+    if next_column.button("Next page", disabled=not has_next, key=key + "_next"):
+        starts.append(last_key)
+        st.rerun()
+
+# Function to page through a stored table with keyset pagination
+def table_browser(connection):
+    import streamlit as st
+    st.subheader("Browse Tables")
+    table = st.selectbox("Table:", list(TABLE_KEYS))
+    page_size = st.selectbox("Rows per page:", [50, 100, 500], index=1)
+    state_key = "browse_{}_{}".format(table, page_size)
+    starts = st.session_state.setdefault(state_key, [None])
+
+    columns, rows, last_key = fetch_table_page(connection, table, starts[-1], page_size)
+    page_buttons(starts, last_key, len(rows) == page_size, "browse")
+    st.caption("Page {}".format(len(starts)))
+    st.dataframe(pd.DataFrame(rows, columns=columns))
+
+    tag = st.text_input("Videos with tag:")
+    if tag:
+        st.dataframe(fetch_videos_by_tag(connection, tag))
+
+# Function to search video titles and descriptions or comment texts, best matches first
+def search_section(connection):
+    import streamlit as st
+    st.subheader("Search")
+    table = st.radio("Search in", list(SEARCH_TABLES), horizontal=True)
+    text = st.text_input("Words to search for:")
+    if not text:
+        return
+    start = time.perf_counter()
+    try:
+        columns, rows = search_table(connection, table, text)
+    except db.Error as e:
+        show_error("Error searching {}: {}".format(table, e))
+        return
+    elapsed = time.perf_counter() - start
+    if rows:
+        st.caption("{} best matches in {:.0f} ms".format(len(rows), elapsed * 1000))
+        st.dataframe(pd.DataFrame(rows, columns=columns))
+    else:
+        st.warning("No {} found for {}".format(table, text))
+
+# Harvested rows of a channel shown by the results viewer: the filter selecting them, the columns
+# shown by default (long texts are left out) and the summary counts over all of them, read from the
+# table and filter in "summary_from" (the comment counts come from the video_comment_counts summary table)
+RESULT_VIEWS = {
+    "videos": {"where": "Channel_Id = %s",
+               "columns": ["Title", "Publish_Date", "Duration", "Views_Count", "Like_Count", "Comments"],
+               "summary_from": "videos WHERE Channel_Id = %s",
+               "summary": [("Videos", "COUNT(*)"), ("Views", "SUM(Views_Count)"), ("Likes", "SUM(Like_Count)"),
+                           ("Comments", "SUM(Comments)")]},
+    "playlists": {"where": "Channel_id = %s",
+                  "columns": ["Title", "Published_Date", "Item_Count"],
+                  "summary_from": "playlists WHERE Channel_id = %s",
+                  "summary": [("Playlists", "COUNT(*)"), ("Items", "SUM(Item_Count)")]},
+    "comments": {"where": "Video_Id IN (SELECT Video_Id FROM videos WHERE Channel_Id = %s)",
+                 "columns": ["Video_Id", "Author_Name", "Comment_Date"],
+                 "summary_from": "video_comment_counts WHERE Channel_Id = %s",
+                 "summary": [("Comments", "SUM(Comment_Count)"),
+                             ("Videos with comments", "SUM(CASE WHEN Comment_Count > 0 THEN 1 ELSE 0 END)")]}
+}
+
+# Function to count the harvested rows of a channel; returns [(label, value)] for RESULT_VIEWS[table]["summary"]
+def result_summary(connection, table, channel_id):
+    view = RESULT_VIEWS[table]
+    columns, rows = cached_query(connection, "SELECT {} FROM {}".format(
+        ", ".join(expression for _, expression in view["summary"]), view["summary_from"]), (channel_id,))
+    return [(label, int(value or 0)) for (label, _), value in zip(view["summary"], rows[0])]
+
+# Function to show the harvested rows of a channel after a fetch, read back from the database
+# Only summary counts and one page of the chosen columns are sent to the browser, however large the
+# channel. The table shown is kept in the session, so paging doesn't need the fetch button again.
+def results_viewer(connection, channel_id):
+    import streamlit as st
+    table = st.session_state.get("results_table")
+    if not channel_id or table not in RESULT_VIEWS:
+        return
+    view = RESULT_VIEWS[table]
+    st.write("Harvested {}:".format(table))
+    summary = result_summary(connection, table, channel_id)
+    for column, (label, value) in zip(st.columns(len(summary)), summary):
+        column.metric(label, "{:,}".format(value))
+
+    all_columns = cached_query(connection, "SELECT * FROM {} WHERE 1 = 0".format(table))[0]
+    columns = st.multiselect("Columns:", all_columns, default=view["columns"], key="results_columns_" + table)
+    page_size = st.selectbox("Rows per page:", [50, 100, 500], key="results_page_size")
+    state_key = "results_{}_{}_{}".format(table, channel_id, page_size)
+    starts = st.session_state.setdefault(state_key, [None])
+    names, rows, last_key = fetch_table_page(connection, table, starts[-1], page_size, columns,
+                                             view["where"], (channel_id,))
+    page_buttons(starts, last_key, len(rows) == page_size, "results")
+    st.caption("Page {} of {}".format(len(starts), max(1, -(-summary[0][1] // page_size))))
+    st.dataframe(pd.DataFrame(rows, columns=names), hide_index=True)
 
 
 # Streamlit UI
+# Function to show the collected metrics in the "Harvest stats" panel
+def harvest_stats_panel():
+    import streamlit as st
+    with st.expander("Harvest stats"):
+        rows = metrics.summary_rows()
+        if not rows:
+            st.write("Nothing measured yet.")
+            return
+        counters = metrics.to_dict()["counters"]
+        totals = lambda name: sum(counter["value"] for counter in counters if counter["name"] == name)
+        columns = st.columns(4)
+        columns[0].metric("API requests", totals("youtube_api_request_total"))
+        columns[1].metric("Quota units", totals("youtube_api_quota_units_total"))
+        columns[2].metric("Retries", totals("youtube_api_retries_total"))
+        columns[3].metric("Rows written", totals("youtube_db_rows_written_total"))
+        st.dataframe(pd.DataFrame(rows))
+        st.download_button("Download metrics (JSON)", metrics.to_json(), "metrics.json", "application/json")
+        st.download_button("Download metrics (Prometheus)", metrics.to_prometheus(), "metrics.prom", "text/plain")
+        if st.button("Reset metrics"):
+            metrics.reset()
+
+# Function to report the items a HarvestEngine fetch failed on; the other items were stored
+def show_engine_errors(engine, kind):
+    import streamlit as st
+    if not engine.errors:
+        return
+    st.error("Fetching failed for {} {}; the rest were stored.".format(len(engine.errors), kind))
+    with st.expander("Errors"):
+        for item, error in engine.errors:
+            st.write("{}: {}".format(", ".join(item) if isinstance(item, list) else item, error))
+
+# Function to render the Fetch Details tab: channel input, fetch buttons, SQL queries and table browser
+def fetch_details_tab(connection, YouTube, engine):
+    import streamlit as st
+    channel_input = st.text_input("Enter YouTube channel ID, @handle or channel URL")
+    Y_ChannelId = None
+    if channel_input:
+        try:
+            Y_ChannelId = resolve_channel_id(YouTube, channel_input)
+        except Exception as e:
+            show_error("Error resolving channel: {}".format(e))
+        if Y_ChannelId is None:
+            st.warning("No channel found for {}".format(channel_input))
+        elif Y_ChannelId != channel_input.strip():
+            st.caption("Channel ID: {}".format(Y_ChannelId))
+
+    cache = get_response_cache()
+    if cache:
+        cache_stats = cache.stats()
+        st.sidebar.caption("API cache: {} hits, {} misses, {} revalidated, {} entries".format(
+            cache_stats["hits"], cache_stats["misses"], cache_stats["revalidated"], cache_stats["entries"]))
+
+    if st.button("Fetch Channel Data"):
+        if Y_ChannelId:
+            channel_info = get_channel_info(YouTube, Y_ChannelId)
+            if channel_info:
+                show_insert_stats(insert_channel_details(connection, channel_info))
+                st.success("Channel details inserted successfully!")
+                for channel in channel_info:
+                    st.write("Channel Info: {}".format(channel["Channel_Name"]))
+                    for column, label in zip(st.columns(3), ["Subscribers", "Views", "Total_Videos"]):
+                        column.metric(label.replace("_", " "), "{:,}".format(int(channel[label] or 0)))
+            else:
+                st.warning("No channel details found.")
+
+    # Fetch video IDs
+    incremental = st.checkbox("Incremental mode (only new videos, refresh stats of the newest stored ones)")
+    if st.button("Fetch Video Data"):
+        if Y_ChannelId and incremental:
+            result = harvest_videos_incremental(YouTube, connection, Y_ChannelId)
+            st.success("{} new video(s) inserted, stats refreshed for {} stored video(s).".format(
+                len(result["new_videos"]), result["refreshed"]))
+            st.session_state["results_table"] = "videos"
+        elif Y_ChannelId:
+            video_ids = get_video_ids(YouTube, Y_ChannelId)
+            if video_ids:
+                result = stream_video_details(engine, connection, Y_ChannelId, video_ids)
+                show_engine_errors(engine, "video batch(es)")
+                if result and result["rows"]:
+                    st.success("Video details fetched successfully!")
+                    show_insert_stats(result)
+                    st.session_state["results_table"] = "videos"
+                elif result is not None:
+                    st.warning("No video details found.")
+            else:
+                st.warning("No video IDs found.")
+
+    if st.button("Fetch Playlist Data"):
+        if Y_ChannelId:
+            playlist_info = get_playlist_details(YouTube, Y_ChannelId)
+            if playlist_info:
+                show_insert_stats(insert_playlist_details(playlist_info))
+                st.success("Playlist details inserted successfully!")
+                st.session_state["results_table"] = "playlists"
+            else:
+                st.warning("No playlist details found.")
+
+    # Fetch comments for videos
+    max_comments = st.number_input("Max comments per video (0 = no limit)", min_value=0, value=0, step=100)
+    if st.button("Fetch Comment Data"):
+        if Y_ChannelId:
+            video_ids = get_video_ids(YouTube, Y_ChannelId)
+            if video_ids:
+                result = stream_comment_details(engine, connection, video_ids, max_comments or None)
+                show_engine_errors(engine, "video(s)")
+                if result["rows"]:
+                    show_insert_stats(result)
+                    st.success("Comment details inserted successfully!")
+                    st.session_state["results_table"] = "comments"
+                else:
+                    st.warning("No comment details found.")
+
+    # The rows of the last fetch are read back from the database one page at a time
+    results_viewer(connection, Y_ChannelId)
+    harvest_stats_panel()
+
+    st.markdown("<h1 style='color: red;font-family: Harlow Solid Italic;'>Execute SQL Queries</h1>", unsafe_allow_html=True)
+    sql_queries_tab(connection)
+    table_browser(connection)
+    search_section(connection)
+
+# Function to create the tables and apply migrations once per process (wrapped in st.cache_resource)
+# Connection errors are raised, so that a failed attempt is not cached
+def prepare_database():
+    with pooled_connection() as connection:
+        create_channel_table(connection)
+        create_videos_table()
+        create_playlists_table()
+        create_comments_table(connection)
+        create_harvest_state_table(connection)
+        run_migrations(connection)
+    return True
+
+# Function to create the metrics registry kept across Streamlit reruns (wrapped in st.cache_resource)
+def create_shared_metrics():
+    return Metrics()
+
+# Function to create the API rate limiter kept across Streamlit reruns (wrapped in st.cache_resource)
+def create_shared_limiter():
+    return RateLimiter()
+
+# Function to create the query cache kept across Streamlit reruns (wrapped in st.cache_resource)
+def create_shared_query_cache():
+    return QueryCache()
+
+# Function to open the response and channel caches kept across Streamlit reruns (wrapped in st.cache_resource)
+def create_shared_caches():
+    return get_response_cache(), get_channel_cache()
+
 def main():
-    
+    import streamlit as st
+
+    # Suppress warnings globally (newer Streamlit releases removed these options)
+    for option in ('deprecation.showfileUploaderEncoding', 'deprecation.showPyplotGlobalUse'):
+        try:
+            st.set_option(option, False)
+        except st.errors.StreamlitAPIException:
+            pass
+
     st.set_page_config(page_title="YouTube Data Harvesting and Warehousing", layout="wide")
+    # Every rerun executes this module again; keep one metrics registry and server per process
+    global metrics
+    metrics = st.cache_resource(create_shared_metrics)()
+    # The per-second budget and the daily quota count are shared by every session too
+    global api_limiter, db_pool, query_cache
+    api_limiter = st.cache_resource(create_shared_limiter)()
+    # Cached results and the table versions that invalidate them outlive a rerun as well
+    query_cache = st.cache_resource(create_shared_query_cache)()
+    if os.environ.get("YOUTUBE_METRICS_PORT"):
+        st.cache_resource(start_metrics_server)(int(os.environ["YOUTUBE_METRICS_PORT"]))
     st.markdown("") 
     current_tab = st.sidebar.radio("Navigation", ["Home", "Technologies Used", "Fetch Details"])
     if current_tab == "Home":
@@ -579,7 +2685,8 @@ def main():
         st.markdown("")  # Add a blank line
         
         gif_path = r"C:\Users\sindh\Downloads\fyFl.gif."
-        st.image(gif_path, use_column_width=True)
+        if os.path.exists(gif_path):
+            st.image(gif_path, use_column_width=True)
 
     elif current_tab == "Technologies Used":
         st.markdown("<h1 style='color: red;font-family: Harlow Solid Italic;'>YouTube Data Harvesting and Warehousing</h1>", unsafe_allow_html=True)
@@ -595,79 +2702,27 @@ def main():
 
     elif current_tab == "Fetch Details":  
         st.markdown("<h1 style='color: red;font-family: Harlow Solid Italic;'>YouTube Data Harvesting and Warehousing</h1>", unsafe_allow_html=True)  
-    # Database connection
-        connection = establish_connection()
-        video_ids = []  # Initialize video_ids
-        if connection:
-            create_channel_table(connection)
-            create_videos_table()
-            create_playlists_table()
-            create_comments_table(connection)
+        # Tables are created and migrated once per process. The parsed discovery document is shared,
+        # but each session gets its own API client since googleapiclient clients are not thread-safe
+        try:
+            # One MySQL pool per process; a new pool on every rerun would open new connections
+            if db.name == "mysql":
+                db_pool = st.cache_resource(create_connection_pool)()
+            st.cache_resource(prepare_database)()
+        except db.Error as e:
+            show_error("Error establishing connection: {}".format(e))
+            return
+        # The cache files are opened once, and their hit counts and in-memory entries are kept
+        global response_cache, channel_cache
+        response_cache, channel_cache = st.cache_resource(create_shared_caches)()
+        Api_id = os.environ.get("YOUTUBE_API_KEY", "### API Key ###")
+        document = st.cache_resource(load_discovery_document)()
+        if "youtube_client" not in st.session_state:
+            st.session_state["youtube_client"] = build_youtube_client(Api_id, document)
+        engine = HarvestEngine(lambda: build_youtube_client(Api_id, document), max_workers=8)
+        with pooled_connection() as connection:
             st.success("Database connection established and tables created successfully!")
-
-            # YouTube API
-            Api_id = "### API Key ###"  
-            Api_name = "youtube"
-            Api_ver = "v3"
-            YouTube = build(Api_name, Api_ver, developerKey=Api_id)
-         
-            Y_ChannelId = st.text_input("Enter YouTube channel ID")
-    
-    
-        if st.button("Fetch Channel Data"):
-            if Y_ChannelId:
-                channel_info = get_channel_info(YouTube, Y_ChannelId)
-                if channel_info:
-                    st.write("Channel Info:")
-                    st.write(channel_info)
-                    insert_channel_details(connection, channel_info)
-                    st.success("Channel details inserted successfully!")
-                else:
-                    st.warning("No channel details found.")
-         
-        # Fetch video IDs
-        if st.button("Fetch Video Data"):
-            if Y_ChannelId:
-                video_ids = get_video_ids(YouTube, Y_ChannelId)
-                if video_ids:
-                    video_info = get_video_info(YouTube, video_ids)
-                    if video_info:
-                        st.success("Video details fetched successfully!")
-                        st.write("Video Details:")
-                        st.dataframe(pd.DataFrame(video_info))
-                        insert_video_details(video_info)
-                    else:
-                        st.warning("No video details found.")
-                else:
-                    st.warning("No video IDs found.")
-
-        if st.button("Fetch Playlist Data"):
-            if Y_ChannelId:
-                playlist_info = get_playlist_details(YouTube, Y_ChannelId)
-                if playlist_info:
-                    insert_playlist_details(playlist_info)
-                    st.success("Playlist details inserted successfully!")
-                    st.write("Playlist Details:")
-                    st.dataframe(pd.DataFrame(playlist_info))
-                else:
-                    st.warning("No playlist details found.")      
-
-        # Fetch comments for videos
-        if st.button("Fetch Comment Data"):
-            if Y_ChannelId:
-                video_ids = get_video_ids(YouTube, Y_ChannelId)
-                if video_ids:
-                    comment_info = get_comment_info(YouTube, video_ids)
-                    if comment_info:
-                        insert_comment_details(connection, comment_info)
-                        st.success("Comment details inserted successfully!")
-                        st.write("Comment Details:")
-                        st.dataframe(pd.DataFrame(comment_info))
-                    else:
-                        st.warning("No comment details found.")  
-                          
-        st.markdown("<h1 style='color: red;font-family: Harlow Solid Italic;'>Execute SQL Queries</h1>", unsafe_allow_html=True)
-        sql_queries_tab(connection)                      
+            fetch_details_tab(connection, st.session_state["youtube_client"], engine)
 
     
 if __name__ == "__main__":
@@ -0,0 +1,94 @@
+# End-to-end throughput benchmark: the full channel -> playlists -> videos -> comments
+# harvest of harvest.py against the local stub API (benchmarks/stub_api.py)
+# Needs a MySQL server; the data goes into a disposable database that is dropped afterwards
+#
+#   python benchmarks/benchmark_harvest.py --channels 20 --videos 500 --workers 8 --latency 0.02
+
+import argparse
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from googleapiclient.discovery import build
+
+import YouTube as app
+import harvest
+import stub_api
+from benchmark_queries import create_schema, use_database
+
+
+def drop_database(name):
+    with app.pooled_connection() as connection:
+        connection.cursor().execute("DROP DATABASE IF EXISTS {}".format(name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time a full harvest against the stub YouTube API")
+    parser.add_argument("--database", default="y_data_e2e", help="disposable database, dropped at the end")
+    parser.add_argument("--keep", action="store_true", help="keep the database for inspection")
+    parser.add_argument("--workers", type=int, default=8, help="channels harvested concurrently")
+    parser.add_argument("--max-comments", type=int, default=None, help="cap on comments (with replies) per video")
+    parser.add_argument("--requests-per-second", type=float, default=1000)
+    parser.add_argument("--response-cache", action="store_true",
+                        help="keep the SQLite response cache on (off by default so every call reaches the stub)")
+    stub_api.add_state_arguments(parser)
+    args = parser.parse_args()
+
+    if not args.response_cache:
+        app.RESPONSE_CACHE_PATH = ""
+    app.DB_POOL_SIZE = max(app.DB_POOL_SIZE, args.workers + 1)
+    app.api_limiter = app.RateLimiter(args.requests_per_second, 10 ** 9)
+    state = stub_api.state_from_args(args)
+    server, url = stub_api.start_server(state)
+
+    use_database(args.database)
+    with app.pooled_connection() as connection:
+        create_schema(connection)
+
+    stats = harvest.HarvestStats()
+    checkpoint = harvest.Checkpoint(None)
+    engine = app.HarvestEngine(
+        lambda: build("youtube", "v3", developerKey="stub", client_options={"api_endpoint": url}),
+        max_workers=args.workers)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    engine.run(lambda client, channel_id: harvest.harvest_channel(client, channel_id, checkpoint, stats,
+                                                                  args.max_comments),
+               state.channel_ids())
+    elapsed = time.perf_counter() - start
+    peak_traced = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    server.shutdown()
+
+    if not args.keep:
+        drop_database(args.database)
+
+    served = state.stats()
+    total_rows = sum(stats.rows.values())
+    print("Channels: {} harvested, {} failed in {:.2f}s".format(
+        args.channels - len(engine.errors), len(engine.errors), elapsed))
+    for channel_id, error in engine.errors[:5]:
+        print("  {} failed: {}".format(channel_id, error))
+    for stage in harvest.STAGES:
+        print("  {:<10} {:>9} rows".format(stage, stats.rows[stage]))
+    print("Rows:      {} ({:.0f} rows/s)".format(total_rows, total_rows / elapsed if elapsed > 0 else 0))
+    print("API calls: {} ({}), errors served: {}".format(
+        served["total_calls"], ", ".join("{}={}".format(name, count) for name, count in sorted(served["calls"].items())),
+        served["errors"]))
+    print("Quota:     {} units served, {} units charged by the rate limiter".format(
+        served["quota_units"], app.api_limiter.total_quota_used()))
+    print("Latency:   {:<26} {:<40} {:>7} {:>6} {:>9} {:>9}".format("metric", "labels", "calls", "errors", "mean ms", "p95 ms"))
+    for row in app.metrics.summary_rows():
+        print("           {Metric:<26} {Labels:<40} {Calls:>7} {Errors:>6} {Mean_ms:>9.2f} {P95_ms!s:>9}".format(**row))
+    # ru_maxrss is in kilobytes on Linux
+    print("Memory:    peak traced {:.1f} MB, max RSS {:.1f} MB".format(
+        peak_traced / 2 ** 20, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# Benchmark for the 10 analytic queries of the SQL Queries tab on a generated dataset
+# Needs a MySQL server; the data goes into a separate scratch database (default y_data_bench)
+#
+#   python benchmarks/benchmark_queries.py --videos 100000 --comments 1000000 --compare
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mysql.connector as db
+
+import YouTube as app
+
+ANALYTIC_INDEXES = [
+    ("comments", "idx_comments_video"),
+    ("videos", "idx_videos_channel"),
+    ("videos", "idx_videos_publish_date"),
+    ("videos", "idx_videos_views"),
+    ("videos", "idx_videos_likes"),
+    ("videos", "idx_videos_comments")
+]
+
+
+# Function to create the scratch database and point the app's pool at it
+def use_database(name):
+    settings = dict(app.DB_CONFIG)
+    settings.pop("database")
+    connection = db.connect(**settings)
+    connection.cursor().execute("CREATE DATABASE IF NOT EXISTS {}".format(name))
+    connection.close()
+    app.DB_CONFIG["database"] = name
+
+
+# Function to create the tables and bring the schema up to date
+def create_schema(connection):
+    app.create_channel_table(connection)
+    app.create_videos_table()
+    app.create_playlists_table()
+    app.create_comments_table(connection)
+    app.create_harvest_state_table(connection)
+    app.run_migrations(connection)
+
+
+# Generators for synthetic API-shaped rows
+def generate_channels(count):
+    for i in range(count):
+        yield {"Channel_Name": "Channel {}".format(i), "Channel_Id": "UC{:022d}".format(i),
+               "Subscribers": random.randint(0, 10 ** 7), "Views": random.randint(0, 10 ** 9),
+               "Total_Videos": 0, "Channel_Description": "Synthetic channel", "Playlist_Id": "UU{:022d}".format(i)}
+
+
+def generate_videos(count, channels):
+    for i in range(count):
+        yield {"Video_Name": "Channel", "Channel_Id": "UC{:022d}".format(random.randrange(channels)),
+               "Video_Id": "v{:010d}".format(i), "Title": "Video {}".format(i), "Tags": ["bench"],
+               "Thumbnail_Url": "https://i.ytimg.com/vi/{}/hqdefault.jpg".format(i),
+               "Description": "Synthetic video " * 10,
+               "Publish_Date": "{}-{:02d}-15T12:00:00Z".format(random.randint(2015, 2024), random.randint(1, 12)),
+               "Duration": "PT{}M{}S".format(random.randint(0, 59), random.randint(0, 59)),
+               "Definition": "hd", "Caption": False, "Views_Count": random.randint(0, 10 ** 7),
+               "Comments": random.randint(0, 10 ** 4), "Favorite_Count": 0,
+               "Like_Count": random.randint(0, 10 ** 6), "Dislike_Count": 0}
+
+
+def generate_comments(count, videos):
+    for i in range(count):
+        yield {"Comment_Id": "c{:012d}".format(i), "Video_Id": "v{:010d}".format(random.randrange(videos)),
+               "Text_Display": "Synthetic comment {}".format(i), "Author_Name": "Author {}".format(i % 5000),
+               "Comment_Date": "2023-06-01T08:30:00Z"}
+
+
+# Function to load the synthetic dataset with the app's bulk writers
+def load_data(connection, channels, videos, comments):
+    for stats in (app.insert_channel_details(connection, generate_channels(channels)),
+                  app.insert_video_details(generate_videos(videos, channels)),
+                  app.insert_comment_details(connection, generate_comments(comments, videos))):
+        print("loaded {:>9} rows into {:<9} ({:.0f} rows/s)".format(stats["rows"], stats["table"], stats["rows_per_second"]))
+    app.refresh_channel_stats(connection)
+    app.refresh_comment_counts(connection)
+
+
+# Function to time every analytic query; returns the median seconds per query
+def time_queries(connection, runs):
+    timings = []
+    cursor = connection.cursor()
+    for entry in app.ANALYTIC_QUERIES:
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            cursor.execute(entry["query"])
+            cursor.fetchall()
+            samples.append(time.perf_counter() - start)
+        timings.append(sorted(samples)[len(samples) // 2])
+    cursor.close()
+    return timings
+
+
+def drop_analytic_indexes(connection):
+    cursor = connection.cursor()
+    for table, index in ANALYTIC_INDEXES:
+        if app.index_exists(cursor, table, index):
+            cursor.execute("DROP INDEX {} ON {}".format(index, table))
+    cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the 10 analytic queries on generated data")
+    parser.add_argument("--database", default="y_data_bench", help="scratch database, created if missing")
+    parser.add_argument("--channels", type=int, default=100)
+    parser.add_argument("--videos", type=int, default=100000)
+    parser.add_argument("--comments", type=int, default=1000000)
+    parser.add_argument("--runs", type=int, default=3, help="runs per query, the median is reported")
+    parser.add_argument("--skip-load", action="store_true", help="reuse the data already in the database")
+    parser.add_argument("--compare", action="store_true", help="also time the queries without the analytic indexes")
+    args = parser.parse_args()
+
+    random.seed(42)
+    use_database(args.database)
+    with app.pooled_connection() as connection:
+        create_schema(connection)
+        if not args.skip_load:
+            load_data(connection, args.channels, args.videos, args.comments)
+
+        indexed = time_queries(connection, args.runs)
+        unindexed = None
+        if args.compare:
+            drop_analytic_indexes(connection)
+            unindexed = time_queries(connection, args.runs)
+            app.migrate_analytic_indexes(connection)
+
+    print("{:<6} {:>12} {:>12}".format("query", "indexed", "no indexes" if unindexed else ""))
+    for number, seconds in enumerate(indexed, start=1):
+        print("{:<6} {:>11.3f}s {:>12}".format(
+            number, seconds, "{:.3f}s".format(unindexed[number - 1]) if unindexed else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# Benchmark of what the Fetch Details page sends to the browser after a harvest: the old handlers
+# passed every fetched row to st.dataframe, the results viewer sends summary counts and one page
+#
+#   python benchmarks/benchmark_results_viewer.py --videos 20000 --comments 200000
+#
+# The rows are generated into a temporary SQLite (or DuckDB) file. The payload is the Arrow data
+# Streamlit serializes for the dataframe; the render time is a run of the script in Streamlit's app
+# test harness, which includes that serialization. No API key or database server is needed.
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd
+from streamlit.dataframe_util import convert_pandas_df_to_arrow_bytes
+from streamlit.testing.v1 import AppTest
+
+import YouTube as app
+from benchmark_queries import create_schema, generate_channels, generate_comments, generate_videos
+
+
+# Script of the old handlers: every fetched row, as returned by the API functions
+def show_all_rows(rows):
+    import pandas as pd
+    import streamlit as st
+    st.dataframe(pd.DataFrame(rows))
+
+
+# Script of the results viewer, reading the harvested rows of the channel from the database
+def show_results_viewer(table, channel_id):
+    import streamlit as st
+    import YouTube as app
+    st.session_state["results_table"] = table
+    with app.pooled_connection() as connection:
+        app.results_viewer(connection, channel_id)
+
+
+# Function to time the first run of a script; returns the median seconds of `runs` fresh sessions
+def time_script(script, args, runs):
+    samples = []
+    for _ in range(runs):
+        app.query_cache.clear()
+        app_test = AppTest.from_function(script, args=args, default_timeout=600)
+        start = time.perf_counter()
+        app_test.run()
+        samples.append(time.perf_counter() - start)
+        if app_test.exception:
+            raise SystemExit("Script failed: {}".format(app_test.exception[0].value))
+    return sorted(samples)[len(samples) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Payload and render time of fetched results in the Streamlit app")
+    parser.add_argument("--storage", default="sqlite", choices=["sqlite", "duckdb"])
+    parser.add_argument("--videos", type=int, default=20000)
+    parser.add_argument("--comments", type=int, default=200000)
+    parser.add_argument("--runs", type=int, default=3, help="fresh sessions per measurement, the median is reported")
+    args = parser.parse_args()
+
+    random.seed(42)
+    app.RESPONSE_CACHE_PATH = ""
+    folder = tempfile.mkdtemp(prefix="viewer_bench_")
+    try:
+        app.use_storage(args.storage, os.path.join(folder, "bench." + args.storage))
+        channel_id = next(generate_channels(1))["Channel_Id"]
+        fetched = {"videos": list(generate_videos(args.videos, 1)),
+                   "comments": list(generate_comments(args.comments, args.videos))}
+        with app.pooled_connection() as connection:
+            create_schema(connection)
+            app.insert_channel_details(connection, generate_channels(1))
+            app.insert_video_details(fetched["videos"])
+            app.insert_comment_details(connection, fetched["comments"])
+            # The app refreshes the summary tables after every fetch
+            app.refresh_channel_stats(connection)
+            app.refresh_comment_counts(connection)
+
+            print("{:<10} {:>14} {:>14} {:>12} {:>12}".format("table", "payload all", "payload page", "render all",
+                                                              "render page"))
+            for table, rows in fetched.items():
+                view = app.RESULT_VIEWS[table]
+                names, page = app.fetch_table_page(connection, table, None, 50, view["columns"], view["where"],
+                                                   (channel_id,))[:2]
+                payload_all = len(convert_pandas_df_to_arrow_bytes(pd.DataFrame(rows)))
+                payload_page = len(convert_pandas_df_to_arrow_bytes(pd.DataFrame(page, columns=names)))
+                render_all = time_script(show_all_rows, (rows,), args.runs)
+                render_page = time_script(show_results_viewer, (table, channel_id), args.runs)
+                print("{:<10} {:>12.1f}MB {:>12.1f}KB {:>11.3f}s {:>11.3f}s".format(
+                    table, payload_all / 2 ** 20, payload_page / 2 ** 10, render_all, render_page))
+        app.use_storage(args.storage)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# Startup benchmark for the Streamlit app: time to first paint of the Home page and the cost of
+# building the YouTube API client on a rerun
+#
+#   python benchmarks/benchmark_startup.py --repeat 5
+#
+# Every measurement runs in a fresh interpreter so that imports are cold, like a new server process.
+# "eager" imports pandas, numpy, MySQL Connector and the discovery client before the first run, as the
+# app did when they were imported at the top of YouTube.py. No network or database is needed.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+HEAVY_MODULES = ["pandas", "numpy", "mysql.connector", "googleapiclient.discovery"]
+
+
+# Child: first run and rerun of the Home page through Streamlit's app test harness
+def measure_first_paint(eager):
+    from streamlit.testing.v1 import AppTest
+    app_test = AppTest.from_file(os.path.join(ROOT, "YouTube.py"), default_timeout=60)
+    start = time.perf_counter()
+    if eager:
+        for name in HEAVY_MODULES:
+            __import__(name)
+    app_test.run()
+    first_run = time.perf_counter() - start
+    start = time.perf_counter()
+    app_test.run()
+    rerun = time.perf_counter() - start
+    if app_test.exception:
+        raise SystemExit("Home page failed: {}".format(app_test.exception[0].value))
+    return {"first_run": first_run, "rerun": rerun,
+            "loaded": [name for name in HEAVY_MODULES if name in sys.modules]}
+
+
+# Child: the old per-rerun build() call vs a client built from the cached, already parsed document
+def measure_client(builds):
+    start = time.perf_counter()
+    from googleapiclient.discovery import build
+    build("youtube", "v3", developerKey="benchmark")
+    cold_build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(builds):
+        build("youtube", "v3", developerKey="benchmark")
+    warm_build = (time.perf_counter() - start) / builds
+
+    import YouTube as app
+    start = time.perf_counter()
+    document = app.load_discovery_document()
+    load_document = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(builds):
+        app.build_youtube_client("benchmark", document)
+    cached_document = (time.perf_counter() - start) / builds
+    return {"cold_build": cold_build, "warm_build": warm_build, "load_document": load_document,
+            "cached_document": cached_document}
+
+
+def run_child(*args):
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"] + list(args),
+                            check=True, capture_output=True, text=True, cwd=ROOT).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def median(results, key):
+    return statistics.median(result[key] for result in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time to first paint of the Streamlit app and API client build cost")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh processes per measurement")
+    parser.add_argument("--builds", type=int, default=50, help="client builds averaged per process")
+    parser.add_argument("--child", nargs="+", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        if args.child[0] == "paint":
+            result = measure_first_paint(args.child[1] == "eager")
+        else:
+            result = measure_client(args.builds)
+        print(json.dumps(result))
+        return
+
+    print("Home page, median of {} fresh processes:".format(args.repeat))
+    for mode in ("lazy", "eager"):
+        results = [run_child("paint", mode) for _ in range(args.repeat)]
+        print("  {:<6} first paint {:7.1f} ms  rerun {:6.1f} ms  heavy modules loaded: {}".format(
+            mode, median(results, "first_run") * 1000, median(results, "rerun") * 1000,
+            ", ".join(results[0]["loaded"]) or "none"))
+
+    results = [run_child("client") for _ in range(args.repeat)]
+    print("YouTube API client:")
+    print("  build() first call, including its import   {:7.1f} ms".format(median(results, "cold_build") * 1000))
+    print("  build() on every rerun                     {:7.2f} ms".format(median(results, "warm_build") * 1000))
+    print("  bundled document, loaded once per process  {:7.1f} ms".format(median(results, "load_document") * 1000))
+    print("  client from the cached document per rerun {:7.2f} ms".format(median(results, "cached_document") * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# Benchmark of the storage backends: the same generated dataset is written with the app's bulk
+# writers into SQLite, DuckDB and MySQL, and the 10 analytic queries and comment searches are timed on each
+#
+#   python benchmarks/benchmark_storage.py --videos 20000 --comments 200000
+#
+# The embedded engines write to fresh files in a temporary folder. MySQL uses the scratch database
+# y_data_storage_bench and is skipped when no server is reachable.
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import YouTube as app
+from benchmark_queries import create_schema, generate_channels, generate_comments, generate_videos, use_database
+
+
+# Function to point the app at a fresh database of the engine; returns False if it can't be reached
+def open_storage(engine, folder, database):
+    if engine != "mysql":
+        app.use_storage(engine, os.path.join(folder, "bench." + engine))
+        return True
+    app.use_storage("mysql")
+    try:
+        use_database(database)
+        with app.pooled_connection() as connection:
+            cursor = connection.cursor()
+            for table in ("video_tags", "tags", "video_stats_history", "channel_stats", "video_comment_counts",
+                          "comments", "playlists", "videos", "channels", "harvest_state", "schema_migrations"):
+                cursor.execute("DROP TABLE IF EXISTS {}".format(table))
+        return True
+    except app.db.Error as e:
+        print("mysql: skipped ({})".format(e))
+        return False
+
+
+# Function to load the dataset and refresh the summary tables; returns the timings of one engine
+def load(connection, channels, videos, comments):
+    random.seed(42)
+    result = {}
+    for stats in (app.insert_channel_details(connection, generate_channels(channels)),
+                  app.insert_video_details(generate_videos(videos, channels)),
+                  app.insert_comment_details(connection, generate_comments(comments, videos))):
+        result[stats["table"]] = stats["rows_per_second"]
+    start = time.perf_counter()
+    app.refresh_channel_stats(connection)
+    app.refresh_comment_counts(connection)
+    result["refresh"] = time.perf_counter() - start
+    return result
+
+
+# Function to time every analytic query in the engine's dialect; returns the median seconds per query
+def time_queries(connection, runs):
+    timings = []
+    cursor = connection.cursor()
+    for entry in app.ANALYTIC_QUERIES:
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            cursor.execute(app.analytic_query(entry))
+            cursor.fetchall()
+            samples.append(time.perf_counter() - start)
+        timings.append(sorted(samples)[len(samples) // 2])
+    cursor.close()
+    return timings
+
+
+# Searches over the generated comments: a word in a handful of them and words in all of them
+SEARCHES = [("rare", "4242"), ("common", "synthetic comment")]
+
+
+# Function to time the searches of the search section; returns the median seconds per search
+def time_searches(connection, runs):
+    timings = []
+    for _, text in SEARCHES:
+        samples = []
+        for _ in range(runs):
+            # Every run goes to the database, not to the query cache
+            app.query_cache.clear()
+            start = time.perf_counter()
+            app.search_table(connection, "comments", text)
+            samples.append(time.perf_counter() - start)
+        timings.append(sorted(samples)[len(samples) // 2])
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare write and query speed of the storage backends")
+    parser.add_argument("--engines", nargs="+", default=["sqlite", "duckdb", "mysql"], choices=["sqlite", "duckdb", "mysql"])
+    parser.add_argument("--database", default="y_data_storage_bench", help="scratch MySQL database")
+    parser.add_argument("--channels", type=int, default=50)
+    parser.add_argument("--videos", type=int, default=20000)
+    parser.add_argument("--comments", type=int, default=200000)
+    parser.add_argument("--runs", type=int, default=3, help="runs per query, the median is reported")
+    args = parser.parse_args()
+
+    app.RESPONSE_CACHE_PATH = ""
+    folder = tempfile.mkdtemp(prefix="storage_bench_")
+    results = {}
+    try:
+        for engine in args.engines:
+            if not open_storage(engine, folder, args.database):
+                continue
+            with app.pooled_connection() as connection:
+                create_schema(connection)
+                loaded = load(connection, args.channels, args.videos, args.comments)
+                loaded["queries"] = time_queries(connection, args.runs)
+                loaded["searches"] = time_searches(connection, args.runs)
+            # Switching away closes the DuckDB file, which checkpoints its write-ahead log
+            app.use_storage(engine)
+            path = os.path.join(folder, "bench." + engine)
+            loaded["size"] = os.path.getsize(path) if os.path.exists(path) else None
+            results[engine] = loaded
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    engines = list(results)
+    print("{:<18}".format("") + "".join("{:>14}".format(engine) for engine in engines))
+    for table in ("channels", "videos", "comments"):
+        print("{:<18}".format(table + " rows/s") + "".join("{:>14.0f}".format(results[e][table]) for e in engines))
+    print("{:<18}".format("refresh") + "".join("{:>13.3f}s".format(results[e]["refresh"]) for e in engines))
+    for number in range(len(app.ANALYTIC_QUERIES)):
+        print("{:<18}".format("query {}".format(number + 1)) +
+              "".join("{:>13.3f}s".format(results[e]["queries"][number]) for e in engines))
+    for number, (name, _) in enumerate(SEARCHES):
+        print("{:<18}".format("search " + name) +
+              "".join("{:>13.3f}s".format(results[e]["searches"][number]) for e in engines))
+    print("{:<18}".format("file size") + "".join(
+        "{:>12.1f}MB".format(results[e]["size"] / 2 ** 20) if results[e]["size"] else "{:>14}".format("-")
+        for e in engines))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# Benchmark for get_video_info: one videos().list request per video vs batches of 50 IDs
+# Uses a stubbed API client, so no API key or network access is needed
+#
+#   python benchmarks/benchmark_video_info.py --videos 20000 --latency 0.001
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import YouTube as app
+
+
+# Stub for a googleapiclient request object
+class StubRequest:
+    def __init__(self, client, response):
+        self.client = client
+        self.response = response
+
+    def execute(self):
+        self.client.requests += 1
+        if self.client.latency:
+            time.sleep(self.client.latency)
+        return self.response
+
+
+# Stub for YouTube.videos()
+class StubVideos:
+    def __init__(self, client):
+        self.client = client
+
+    def list(self, part, id, maxResults=None):
+        items = [self.client.make_item(video_id) for video_id in id.split(",")
+                 if video_id not in self.client.missing_ids]
+        return StubRequest(self.client, {"items": items})
+
+
+# Stub for the client returned by build("youtube", "v3", ...)
+class StubYouTube:
+    def __init__(self, latency=0.0, missing_ids=()):
+        self.latency = latency
+        self.missing_ids = set(missing_ids)
+        self.requests = 0
+
+    def videos(self):
+        return StubVideos(self)
+
+    def make_item(self, video_id):
+        return {
+            "id": video_id,
+            "snippet": {
+                "channelTitle": "Bench Channel",
+                "channelId": "UCbench",
+                "title": "Video {}".format(video_id),
+                "tags": ["bench", "stub"],
+                "thumbnails": {"default": {"url": "https://i.ytimg.com/vi/{}/default.jpg".format(video_id)}},
+                "description": "Synthetic video",
+                "publishedAt": "2023-01-01T00:00:00Z"
+            },
+            "contentDetails": {"duration": "PT4M13S", "definition": "hd", "caption": "false"},
+            "statistics": {"viewCount": "100", "commentCount": "5", "favoriteCount": "0", "likeCount": "10"}
+        }
+
+
+# Baseline: the original one-request-per-video loop
+def get_video_info_per_id(YouTube, video_ids):
+    video_data = []
+    for video_id in video_ids:
+        req = YouTube.videos().list(
+            part="snippet,contentDetails,statistics",
+            id=video_id
+        ).execute()
+        for item in req["items"]:
+            video_data.append(app.parse_video_item(item))
+    return video_data
+
+
+# Batched path: fetch_video_items with up to 50 IDs per request
+def get_video_info_batched(YouTube, video_ids):
+    items, YouTube.reported_missing = app.fetch_video_items(YouTube, video_ids)
+    return [app.parse_video_item(item) for item in items]
+
+
+def run(label, func, client, video_ids):
+    start = time.perf_counter()
+    rows = func(client, video_ids)
+    elapsed = time.perf_counter() - start
+    print("{:<10} requests={:<7} rows={:<7} quota_units={:<7} wall={:.3f}s".format(
+        label, client.requests, len(rows), client.requests, elapsed))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-ID vs batched videos().list calls")
+    parser.add_argument("--videos", type=int, default=20000, help="number of video IDs")
+    parser.add_argument("--latency", type=float, default=0.001, help="simulated seconds per request")
+    parser.add_argument("--missing", type=int, default=3, help="IDs the stub leaves out of the response")
+    args = parser.parse_args()
+
+    # The batched path goes through execute_request; compare request counts, not the app's rate limit
+    app.api_limiter = app.RateLimiter(10 ** 6, 10 ** 9)
+    app.RESPONSE_CACHE_PATH = ""
+    video_ids = ["vid{:07d}".format(i) for i in range(args.videos)]
+    missing_ids = video_ids[::max(1, args.videos // max(1, args.missing))][:args.missing]
+
+    before = run("per-id", get_video_info_per_id, StubYouTube(args.latency, missing_ids), video_ids)
+    batched_client = StubYouTube(args.latency, missing_ids)
+    after = run("batched", get_video_info_batched, batched_client, video_ids)
+
+    assert [row["Video_Id"] for row in after] == [row["Video_Id"] for row in before]
+    print("missing IDs reported: {}".format(", ".join(batched_client.reported_missing) or "none"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+# Local stand-in for the YouTube Data API v3, serving synthetic channels, playlists,
+# videos and comment threads with real pagination
+#
+#   python benchmarks/stub_api.py --port 8765 --channels 10 --videos 500 --latency 0.02
+#
+# Point a client at it with
+#   build("youtube", "v3", developerKey="stub", client_options={"api_endpoint": "http://127.0.0.1:8765"})
+# GET /stats returns the calls and quota units served so far.
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+QUOTA_COSTS = {"channels": 1, "playlistItems": 1, "playlists": 1, "videos": 1,
+               "commentThreads": 1, "comments": 1}
+
+
+# Synthetic dataset and request counters shared by all handler threads
+class StubState:
+    def __init__(self, channels=10, videos=200, playlists=5, comments=20, replies=2,
+                 latency=0.0, error_rate=0.0, daily_quota=None, disabled_comments_every=0, seed=42):
+        self.channels = channels
+        self.videos = videos
+        self.playlists = playlists
+        self.comments = comments
+        self.replies = replies
+        self.latency = latency
+        self.error_rate = error_rate
+        self.daily_quota = daily_quota
+        self.disabled_comments_every = disabled_comments_every
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.quota_used = 0
+        self.errors = 0
+
+    def channel_ids(self):
+        return [self.channel_id(number) for number in range(self.channels)]
+
+    @staticmethod
+    def channel_id(number):
+        return "UC{:022d}".format(number)
+
+    @staticmethod
+    def video_id(channel, number):
+        return "c{}v{:06d}".format(channel, number)
+
+    @staticmethod
+    def split_video_id(video_id):
+        channel, number = video_id[1:].split("v")
+        return int(channel), int(number)
+
+    # Returns an (status, error reason) to fail the request with, or None
+    def charge(self, endpoint):
+        with self.lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+            cost = QUOTA_COSTS.get(endpoint, 1)
+            if self.daily_quota is not None and self.quota_used + cost > self.daily_quota:
+                self.errors += 1
+                return 403, "quotaExceeded"
+            self.quota_used += cost
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.errors += 1
+                return 503, "backendError"
+        return None
+
+    def stats(self):
+        with self.lock:
+            return {"calls": dict(self.calls), "total_calls": sum(self.calls.values()),
+                    "quota_units": self.quota_used, "errors": self.errors}
+
+
+def page(items, params, default_size):
+    size = int(params.get("maxResults", default_size))
+    start = int(params.get("pageToken") or 0)
+    body = {"items": items[start:start + size], "pageInfo": {"totalResults": len(items)}}
+    if start + size < len(items):
+        body["nextPageToken"] = str(start + size)
+    return body
+
+
+def snippet_time(number):
+    return "2023-{:02d}-{:02d}T{:02d}:00:00Z".format(number % 12 + 1, number % 28 + 1, number % 24)
+
+
+def comment_snippet(text, number):
+    return {"textDisplay": text, "authorDisplayName": "Author {}".format(number % 97),
+            "publishedAt": snippet_time(number)}
+
+
+# Builders for each endpoint's JSON body; unknown channel IDs are left out like the real API does
+# Handles are @stub<N> and legacy usernames stub<N>
+def channels_body(state, params):
+    items = []
+    name = params.get("forHandle", "").lstrip("@") or params.get("forUsername", "")
+    channel_ids = params.get("id", "").split(",")
+    if name:
+        channel_ids = [state.channel_id(int(name[4:]))] if name.startswith("stub") and name[4:].isdigit() else []
+    for channel_id in channel_ids:
+        number = int(channel_id[2:]) if channel_id[2:].isdigit() else -1
+        if 0 <= number < state.channels:
+            items.append({
+                "id": channel_id,
+                "snippet": {"title": "Stub Channel {}".format(number), "description": "Synthetic channel"},
+                "contentDetails": {"relatedPlaylists": {"uploads": "UU" + channel_id[2:]}},
+                "statistics": {"subscriberCount": str(1000 * (number + 1)), "viewCount": str(10 ** 6 * (number + 1)),
+                               "videoCount": str(state.videos)}
+            })
+    return {"items": items}
+
+
+def playlist_items_body(state, params):
+    channel = int(params.get("playlistId", "UU0")[2:])
+    # Uploads playlists are newest first
+    items = [{"snippet": {"resourceId": {"videoId": state.video_id(channel, number)}}}
+             for number in range(state.videos - 1, -1, -1)]
+    return page(items, params, 5)
+
+
+def playlists_body(state, params):
+    channel_id = params.get("channelId", "")
+    items = [{"id": "PL{}x{}".format(channel_id[2:], number),
+              "snippet": {"title": "Playlist {}".format(number), "channelId": channel_id,
+                          "channelTitle": "Stub Channel", "publishedAt": snippet_time(number)},
+              "contentDetails": {"itemCount": number * 3}}
+             for number in range(state.playlists)]
+    return page(items, params, 5)
+
+
+def videos_body(state, params):
+    items = []
+    for video_id in params.get("id", "").split(","):
+        channel, number = state.split_video_id(video_id)
+        items.append({
+            "id": video_id,
+            "snippet": {"channelTitle": "Stub Channel {}".format(channel), "channelId": state.channel_id(channel),
+                        "title": "Video {}".format(number), "description": "Synthetic video " * 20,
+                        "publishedAt": snippet_time(number), "tags": ["stub", "video {}".format(number)],
+                        "thumbnails": {size: {"url": "https://i.ytimg.com/vi/{}/{}.jpg".format(video_id, size)}
+                                       for size in ("default", "medium", "high")}},
+            "contentDetails": {"duration": "PT{}M{}S".format(number % 60, number % 59), "definition": "hd",
+                               "caption": "false"},
+            "statistics": {"viewCount": str(number * 101), "likeCount": str(number * 7),
+                           "commentCount": str(state.comments), "favoriteCount": "0"}
+        })
+    return {"items": items}
+
+
+def comment_threads_body(state, params):
+    video_id = params.get("videoId", "")
+    items = []
+    for number in range(state.comments):
+        thread_id = "{}t{}".format(video_id, number)
+        replies = [{"id": "{}r{}".format(thread_id, reply), "snippet": comment_snippet("Reply", reply)}
+                   for reply in range(min(state.replies, 5))]
+        items.append({"id": thread_id,
+                      "snippet": {"videoId": video_id, "totalReplyCount": state.replies,
+                                  "topLevelComment": {"snippet": comment_snippet("Comment {}".format(number), number)}},
+                      "replies": {"comments": replies}})
+    return page(items, params, 20)
+
+
+def comments_body(state, params):
+    parent_id = params.get("parentId", "")
+    items = [{"id": "{}r{}".format(parent_id, reply), "snippet": comment_snippet("Reply", reply)}
+             for reply in range(state.replies)]
+    return page(items, params, 20)
+
+
+ENDPOINTS = {
+    "channels": channels_body,
+    "playlistItems": playlist_items_body,
+    "playlists": playlists_body,
+    "videos": videos_body,
+    "commentThreads": comment_threads_body,
+    "comments": comments_body
+}
+
+
+def make_handler(state):
+    class StubHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=UTF-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def send_error_json(self, status, reason):
+            self.send_json(status, {"error": {"code": status, "message": reason,
+                                              "errors": [{"reason": reason, "domain": "youtube"}]}})
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            if parts.path == "/stats":
+                return self.send_json(200, state.stats())
+            endpoint = parts.path.rstrip("/").rsplit("/", 1)[-1]
+            if endpoint not in ENDPOINTS:
+                return self.send_error_json(404, "notFound")
+            params = dict((name, values[-1]) for name, values in parse_qs(parts.query).items())
+
+            if state.latency:
+                time.sleep(state.latency)
+            failure = state.charge(endpoint)
+            if failure:
+                return self.send_error_json(*failure)
+            if endpoint in ("commentThreads", "comments") and state.disabled_comments_every:
+                video_id = params.get("videoId") or params.get("parentId", "").split("t")[0]
+                if state.split_video_id(video_id)[1] % state.disabled_comments_every == 0:
+                    return self.send_error_json(403, "commentsDisabled")
+            self.send_json(200, ENDPOINTS[endpoint](state, params))
+
+    return StubHandler
+
+
+# Function to start the stub server on a background thread; returns (server, base URL)
+def start_server(state, host="127.0.0.1", port=0):
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://{}:{}".format(host, server.server_address[1])
+
+
+def add_state_arguments(parser):
+    parser.add_argument("--channels", type=int, default=10)
+    parser.add_argument("--videos", type=int, default=200, help="videos per channel")
+    parser.add_argument("--playlists", type=int, default=5, help="playlists per channel")
+    parser.add_argument("--comments", type=int, default=20, help="comment threads per video")
+    parser.add_argument("--replies", type=int, default=2, help="replies per thread")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests failing with 503")
+    parser.add_argument("--daily-quota", type=int, default=None, help="answer quotaExceeded after this many units")
+    parser.add_argument("--disabled-comments-every", type=int, default=0,
+                        help="every Nth video has comments disabled (0 = none)")
+
+
+def state_from_args(args):
+    return StubState(args.channels, args.videos, args.playlists, args.comments, args.replies,
+                     args.latency, args.error_rate, args.daily_quota, args.disabled_comments_every)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic YouTube Data API v3")
+    parser.add_argument("--port", type=int, default=8765)
+    add_state_arguments(parser)
+    args = parser.parse_args()
+    state = state_from_args(args)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(state))
+    print("Stub YouTube API on http://127.0.0.1:{} with channels {}".format(
+        args.port, ", ".join(state.channel_ids()[:3]) + (", ..." if args.channels > 3 else "")))
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
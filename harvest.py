@@ -0,0 +1,202 @@
+# Headless batch harvest over a list of channel IDs
+#
+#   python harvest.py channels.txt --workers 8 --checkpoint harvest_checkpoint.json
+#
+# channels.txt holds one channel ID per line (blank lines and lines starting with # are skipped).
+# Every channel goes through the channel, playlist, video and comment stages; finished stages
+# are recorded in the checkpoint file so that a killed run resumes where it stopped.
+# The checkpoint is deleted once every channel succeeded, so the next run harvests again;
+# --fresh ignores a leftover checkpoint and starts over.
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+
+import YouTube as app
+
+STAGES = ["channel", "playlists", "videos", "comments"]
+
+
+# Finished stages per channel, persisted as JSON after every stage
+class Checkpoint:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.done = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.done = json.load(f)
+
+    def is_done(self, channel_id, stage):
+        with self.lock:
+            return stage in self.done.get(channel_id, [])
+
+    def mark_done(self, channel_id, stage):
+        with self.lock:
+            self.done.setdefault(channel_id, []).append(stage)
+            if self.path:
+                tmp_path = self.path + ".tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(self.done, f)
+                os.replace(tmp_path, self.path)
+
+    # Forgets every finished stage and deletes the file
+    def clear(self):
+        with self.lock:
+            self.done = {}
+            if self.path and os.path.exists(self.path):
+                os.remove(self.path)
+
+
+# Rows written per stage across all channels
+class HarvestStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rows = dict((stage, 0) for stage in STAGES)
+
+    def add(self, stage, stats):
+        if stats:
+            with self.lock:
+                self.rows[stage] += stats["rows"]
+
+
+# Function to read channel IDs from a file
+def read_channel_ids(path):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+# Function to run the stages of one channel that are not checkpointed yet
+# Each stage is timed as youtube_harvest_stage{stage}
+# API and database errors are raised, not reported and skipped, so a stage is only checkpointed
+# after a clean run; the worker's connection is used for all writes of the channel
+def harvest_channel(client, channel_id, checkpoint, stats, max_comments=None, warehouse_dir=None):
+    with app.pooled_connection() as connection:
+        if not checkpoint.is_done(channel_id, "channel"):
+            with app.metrics.timed("youtube_harvest_stage", stage="channel"):
+                channel_info = app.fetch_channel_info(client, channel_id)
+                if not channel_info:
+                    raise ValueError("Channel {} not found".format(channel_id))
+                stats.add("channel", app.write_channel_details(connection, channel_info))
+            checkpoint.mark_done(channel_id, "channel")
+
+        if not checkpoint.is_done(channel_id, "playlists"):
+            with app.metrics.timed("youtube_harvest_stage", stage="playlists"):
+                playlists = app.fetch_playlist_details(client, channel_id)
+                if playlists:
+                    stats.add("playlists", app.write_playlist_details(connection, playlists))
+            checkpoint.mark_done(channel_id, "playlists")
+
+        video_ids = None
+        if not checkpoint.is_done(channel_id, "videos"):
+            with app.metrics.timed("youtube_harvest_stage", stage="videos"):
+                video_ids = app.fetch_video_ids(client, channel_id)
+
+                def write_videos(videos):
+                    result = app.write_video_details(connection, videos)
+                    app.update_harvest_state(connection, channel_id, videos)
+                    return result
+
+                stats.add("videos", app.run_pipeline(app.iter_video_pages(client, video_ids), write_videos))
+                app.refresh_channel_stats(connection, [channel_id])
+            checkpoint.mark_done(channel_id, "videos")
+
+        if not checkpoint.is_done(channel_id, "comments"):
+            with app.metrics.timed("youtube_harvest_stage", stage="comments"):
+                if video_ids is None:
+                    video_ids = app.fetch_video_ids(client, channel_id)
+                # Videos with comments disabled are skipped; any other failing video fails the stage
+                pages = (page for video_id in video_ids
+                         for page in app.iter_video_comments(client, video_id, max_comments))
+                stats.add("comments", app.run_pipeline(
+                    pages, lambda comments: app.write_comment_details(connection, comments)))
+                app.refresh_comment_counts(connection, video_ids)
+            checkpoint.mark_done(channel_id, "comments")
+
+        # The channel's Parquet partitions are rewritten once all its stages are done
+        if warehouse_dir:
+            import warehouse
+            with app.metrics.timed("youtube_harvest_stage", stage="warehouse"):
+                warehouse.export_channel(connection, channel_id, warehouse_dir)
+
+
+# Function to create all tables once before the workers start
+def create_tables():
+    connection = app.establish_connection()
+    if connection is None:
+        raise SystemExit("Could not connect to the {} database".format(app.db.label))
+    app.create_channel_table(connection)
+    app.create_videos_table()
+    app.create_playlists_table()
+    app.create_comments_table(connection)
+    app.create_harvest_state_table(connection)
+    app.run_migrations(connection)
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Harvest many YouTube channels into the database without the Streamlit UI")
+    parser.add_argument("channels_file", help="file with one channel ID per line")
+    parser.add_argument("--api-key", default=os.environ.get("YOUTUBE_API_KEY"), help="defaults to $YOUTUBE_API_KEY")
+    parser.add_argument("--workers", type=int, default=8, help="channels harvested concurrently")
+    parser.add_argument("--checkpoint", default="harvest_checkpoint.json", help="progress file used to resume")
+    parser.add_argument("--fresh", action="store_true", help="ignore the checkpoint of an earlier run and start over")
+    parser.add_argument("--requests-per-second", type=float, default=10)
+    parser.add_argument("--daily-quota", type=int, default=10000)
+    parser.add_argument("--max-comments", type=int, default=None, help="cap on comments (with replies) per video")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve Prometheus metrics on http://localhost:PORT/metrics while harvesting")
+    parser.add_argument("--warehouse", default=None,
+                        help="also export every harvested channel to this Parquet warehouse folder")
+    parser.add_argument("--metrics-json", default=None, help="write the collected metrics to this JSON file at the end")
+    args = parser.parse_args()
+    if not args.api_key:
+        parser.error("an API key is required (--api-key or YOUTUBE_API_KEY)")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    # Every worker writes on the one connection it holds; the extra one is for create_tables
+    app.DB_POOL_SIZE = max(app.DB_POOL_SIZE, args.workers + 1)
+    app.api_limiter = app.RateLimiter(args.requests_per_second, args.daily_quota)
+
+    channel_ids = read_channel_ids(args.channels_file)
+    checkpoint = Checkpoint(args.checkpoint)
+    if args.fresh:
+        checkpoint.clear()
+    pending = [channel_id for channel_id in channel_ids
+               if not all(checkpoint.is_done(channel_id, stage) for stage in STAGES)]
+    logging.info("%d channels, %d left to harvest", len(channel_ids), len(pending))
+
+    if args.metrics_port:
+        app.start_metrics_server(args.metrics_port)
+    create_tables()
+    stats = HarvestStats()
+    document = app.load_discovery_document()
+    engine = app.HarvestEngine(lambda: app.build_youtube_client(args.api_key, document), max_workers=args.workers)
+    start = time.perf_counter()
+    engine.run(lambda client, channel_id: harvest_channel(
+        client, channel_id, checkpoint, stats, args.max_comments, args.warehouse), pending)
+    elapsed = time.perf_counter() - start
+
+    for channel_id, error in engine.errors:
+        logging.error("Channel %s failed: %s", channel_id, error)
+    # A run with failures keeps its checkpoint, so running it again only retries what is missing
+    if not engine.errors:
+        checkpoint.clear()
+    total_rows = sum(stats.rows.values())
+    print("Channels: {} harvested, {} failed in {:.1f}s ({:.2f} channels/s)".format(
+        len(pending) - len(engine.errors), len(engine.errors), elapsed,
+        (len(pending) - len(engine.errors)) / elapsed if elapsed > 0 else 0))
+    for stage in STAGES:
+        print("  {:<10} {} rows".format(stage, stats.rows[stage]))
+    print("Rows: {} ({:.0f} rows/s), API quota used: {} units".format(
+        total_rows, total_rows / elapsed if elapsed > 0 else 0, app.api_limiter.total_quota_used()))
+    if args.metrics_json:
+        with open(args.metrics_json, "w") as f:
+            f.write(app.metrics.to_json())
+
+
+if __name__ == "__main__":
+    main()
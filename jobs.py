@@ -0,0 +1,537 @@
+# Durable harvest job queue and refresh scheduler, stored in MySQL next to the harvested data
+#
+#   python jobs.py add channels.txt                 # register channels; they are due right away
+#   python jobs.py schedule --loop                  # enqueue due channels within the daily quota
+#   python jobs.py worker --processes 4 --threads 4 # lease and run jobs (start on as many hosts as needed)
+#   python jobs.py status
+#   python jobs.py retry-dead
+#
+# A job is one unit of API work: a channel, its playlists, one page of its uploads or one page of a
+# video's comment threads. Workers lease jobs with SELECT ... FOR UPDATE SKIP LOCKED (MySQL 8), so
+# any number of processes on any number of hosts can share the queue. A worker extends the leases
+# of its jobs while it runs them; a job whose worker dies is leased again once its lease expires.
+# A failing job is retried with backoff, and moved to the dead-letter status ("dead") after
+# Max_Attempts, also when its last attempt ended with an expired lease. Follow-up jobs are enqueued
+# in the same transaction that completes the job.
+#
+# The scheduler refreshes busy channels (new uploads since the last refresh) more often than
+# dormant ones, and only enqueues as many channels per tick as the daily quota allows. A channel's
+# estimate is the quota its last refresh actually used, comment pages included.
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from googleapiclient.errors import HttpError
+
+import YouTube as app
+from harvest import create_tables, read_channel_ids
+
+# Job priorities; follow-up pages go first so that started channels finish before new ones begin
+JOB_PRIORITIES = {"channel": 0, "playlists": 5, "comment_page": 5, "video_page": 10}
+LEASE_SECONDS = 300
+# Seconds between the lease extensions of a worker
+HEARTBEAT_SECONDS = LEASE_SECONDS // 3
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF_SECONDS = 30
+
+# Refresh intervals of the scheduler; halved after a refresh finds new uploads, doubled otherwise
+MIN_REFRESH_SECONDS = 3600
+DEFAULT_REFRESH_SECONDS = 86400
+MAX_REFRESH_SECONDS = 14 * 86400
+# Estimated units of a channel's first refresh, which lists every upload and its comments
+NEW_CHANNEL_UNITS = 200
+
+
+# Function to create the queue and schedule tables
+def create_job_tables(connection):
+    cursor = connection.cursor()
+    cursor.execute('''CREATE TABLE IF NOT EXISTS harvest_jobs (
+                          Job_Id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                          Kind VARCHAR(20) NOT NULL,
+                          Payload TEXT NOT NULL,
+                          Dedupe_Key VARCHAR(255) NULL,
+                          Status VARCHAR(10) NOT NULL DEFAULT 'queued',
+                          Priority INT NOT NULL DEFAULT 0,
+                          Attempts INT NOT NULL DEFAULT 0,
+                          Max_Attempts INT NOT NULL DEFAULT 5,
+                          Available_At DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                          Leased_By VARCHAR(100) NULL,
+                          Lease_Expires_At DATETIME NULL,
+                          Last_Error TEXT NULL,
+                          Created_At TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                          Updated_At TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                          UNIQUE KEY uq_jobs_dedupe (Dedupe_Key),
+                          KEY idx_jobs_ready (Status, Available_At),
+                          KEY idx_jobs_lease (Status, Lease_Expires_At)
+                      )''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS channel_schedule (
+                          Channel_Id VARCHAR(100) PRIMARY KEY,
+                          Next_Refresh_At DATETIME NOT NULL,
+                          Interval_Seconds INT NOT NULL,
+                          Last_Video_Count INT NULL,
+                          Estimated_Units INT NOT NULL DEFAULT {:d},
+                          Refresh_Units INT NOT NULL DEFAULT 0,
+                          Full_Refresh BOOLEAN NOT NULL DEFAULT FALSE,
+                          Last_Refreshed_At DATETIME NULL,
+                          KEY idx_schedule_due (Next_Refresh_At)
+                      )'''.format(NEW_CHANNEL_UNITS))
+    app.add_column_if_missing(cursor, "channel_schedule", "Refresh_Units", "INT NOT NULL DEFAULT 0")
+    connection.commit()
+    cursor.close()
+
+
+# Function to add a job unless an unfinished job with the same dedupe key exists; does not commit
+def enqueue(cursor, kind, payload, dedupe_key=None, delay_seconds=0):
+    cursor.execute('''INSERT IGNORE INTO harvest_jobs (Kind, Payload, Dedupe_Key, Priority, Max_Attempts, Available_At)
+                      VALUES (%s, %s, %s, %s, %s, NOW() + INTERVAL %s SECOND)''',
+                   (kind, json.dumps(payload), dedupe_key, JOB_PRIORITIES[kind], MAX_ATTEMPTS, int(delay_seconds)))
+
+
+# Function to lease up to limit ready jobs (queued and due, or leased with an expired lease)
+# Every lease counts as an attempt; a job whose lease expired on its last attempt is dead-lettered
+def lease_jobs(connection, worker_id, limit, lease_seconds=LEASE_SECONDS):
+    cursor = connection.cursor()
+    try:
+        cursor.execute('''SELECT Job_Id, Kind, Payload, Attempts, Max_Attempts, Status FROM harvest_jobs
+                          WHERE (Status = 'queued' AND Available_At <= NOW())
+                             OR (Status = 'leased' AND Lease_Expires_At < NOW())
+                          ORDER BY Priority DESC, Available_At
+                          LIMIT %s
+                          FOR UPDATE SKIP LOCKED''', (limit,))
+        rows = cursor.fetchall()
+        spent = [row[0] for row in rows if row[5] == "leased" and row[3] >= row[4]]
+        rows = [row for row in rows if row[0] not in spent]
+        if spent:
+            cursor.execute('''UPDATE harvest_jobs
+                              SET Status = 'dead', Dedupe_Key = NULL, Lease_Expires_At = NULL,
+                                  Last_Error = 'Lease expired on the last attempt'
+                              WHERE Job_Id IN ({})'''.format(", ".join(["%s"] * len(spent))), spent)
+        if rows:
+            cursor.execute('''UPDATE harvest_jobs
+                              SET Status = 'leased', Leased_By = %s, Attempts = Attempts + 1,
+                                  Lease_Expires_At = NOW() + INTERVAL %s SECOND
+                              WHERE Job_Id IN ({})'''.format(", ".join(["%s"] * len(rows))),
+                           [worker_id, lease_seconds] + [row[0] for row in rows])
+        connection.commit()
+    except app.db.Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    return [{"id": job_id, "kind": kind, "payload": json.loads(payload), "attempts": attempts + 1,
+             "max_attempts": max_attempts}
+            for job_id, kind, payload, attempts, max_attempts, status in rows]
+
+
+# Function to extend the leases a worker holds, so that jobs running longer than a lease stay with it
+def extend_leases(connection, worker_id, lease_seconds=LEASE_SECONDS):
+    cursor = connection.cursor()
+    cursor.execute('''UPDATE harvest_jobs SET Lease_Expires_At = NOW() + INTERVAL %s SECOND
+                      WHERE Status = 'leased' AND Leased_By = %s''', (lease_seconds, worker_id))
+    connection.commit()
+    cursor.close()
+
+
+# Thread body extending the worker's leases every interval seconds until stop is set
+def heartbeat(worker_id, stop, interval=HEARTBEAT_SECONDS):
+    while not stop.wait(interval):
+        try:
+            with app.pooled_connection() as connection:
+                extend_leases(connection, worker_id)
+        except app.db.Error as e:
+            logging.warning("Could not extend the leases of %s: %s", worker_id, e)
+
+
+# Function to mark a leased job done; the dedupe key is released so the work can be queued again
+def complete_job(cursor, job, worker_id):
+    cursor.execute('''UPDATE harvest_jobs SET Status = 'done', Dedupe_Key = NULL, Lease_Expires_At = NULL
+                      WHERE Job_Id = %s AND Leased_By = %s''', (job["id"], worker_id))
+
+
+# Function to put a failed job back with exponential backoff, or dead-letter it after its last attempt
+def fail_job(connection, job, worker_id, error):
+    cursor = connection.cursor()
+    if job["attempts"] >= job["max_attempts"]:
+        cursor.execute('''UPDATE harvest_jobs SET Status = 'dead', Dedupe_Key = NULL, Lease_Expires_At = NULL,
+                                                  Last_Error = %s
+                          WHERE Job_Id = %s AND Leased_By = %s''', (str(error)[:2000], job["id"], worker_id))
+    else:
+        delay = min(RETRY_BACKOFF_SECONDS * 2 ** (job["attempts"] - 1), 6 * 3600)
+        cursor.execute('''UPDATE harvest_jobs SET Status = 'queued', Lease_Expires_At = NULL, Last_Error = %s,
+                                                  Available_At = NOW() + INTERVAL %s SECOND
+                          WHERE Job_Id = %s AND Leased_By = %s''', (str(error)[:2000], delay, job["id"], worker_id))
+    connection.commit()
+    cursor.close()
+
+
+# Function to give a job back without counting the attempt, to run again after delay_seconds
+def defer_job(connection, job, worker_id, delay_seconds):
+    cursor = connection.cursor()
+    cursor.execute('''UPDATE harvest_jobs SET Status = 'queued', Attempts = Attempts - 1, Lease_Expires_At = NULL,
+                                              Available_At = NOW() + INTERVAL %s SECOND
+                      WHERE Job_Id = %s AND Leased_By = %s''', (int(delay_seconds), job["id"], worker_id))
+    connection.commit()
+    cursor.close()
+
+
+# Function to get the seconds until the API quota resets (midnight Pacific time)
+def seconds_until_quota_reset():
+    now = datetime.now(ZoneInfo("America/Los_Angeles"))
+    midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (midnight - now).total_seconds()
+
+
+# Rate limiter that also counts the quota units charged by each thread, so a job knows what it cost
+class MeteredRateLimiter(app.RateLimiter):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.local = threading.local()
+
+    def acquire(self, endpoint):
+        super().acquire(endpoint)
+        self.local.units = self.thread_units() + self.quota_costs.get(endpoint, 1)
+
+    # Units charged by the calling thread so far
+    def thread_units(self):
+        return getattr(self.local, "units", 0)
+
+
+# Function to get the quota units charged by the calling thread (0 without a metered limiter)
+def thread_units():
+    if isinstance(app.api_limiter, MeteredRateLimiter):
+        return app.api_limiter.thread_units()
+    return 0
+
+
+# Function to add the units of a job to the refresh of its channel; does not commit
+def charge_units(cursor, channel_id, units):
+    if channel_id and units:
+        cursor.execute("UPDATE channel_schedule SET Refresh_Units = Refresh_Units + %s WHERE Channel_Id = %s",
+                       (units, channel_id))
+
+
+# Function to record a channel refresh and pick its next refresh time
+# The units charged by the previous refresh (every job of it) become the channel's estimate,
+# and the count starts over for the refresh that begins here
+def update_schedule(cursor, channel_id, video_count):
+    cursor.execute('''SELECT Interval_Seconds, Last_Video_Count, Refresh_Units, Estimated_Units, Last_Refreshed_At
+                      FROM channel_schedule WHERE Channel_Id = %s''', (channel_id,))
+    row = cursor.fetchone()
+    interval, previous_count, used_units, estimate, refreshed_at = row if row else (
+        DEFAULT_REFRESH_SECONDS, None, 0, NEW_CHANNEL_UNITS, None)
+    if refreshed_at is not None:
+        estimate = max(1, used_units)
+    if previous_count is not None:
+        if video_count > previous_count:
+            interval = max(MIN_REFRESH_SECONDS, interval // 2)
+        else:
+            interval = min(MAX_REFRESH_SECONDS, interval * 2)
+    cursor.execute('''INSERT INTO channel_schedule (Channel_Id, Next_Refresh_At, Interval_Seconds, Last_Video_Count,
+                                                    Estimated_Units, Refresh_Units, Full_Refresh, Last_Refreshed_At)
+                      VALUES (%s, NOW() + INTERVAL %s SECOND, %s, %s, %s, 0, FALSE, NOW())
+                      ON DUPLICATE KEY UPDATE
+                          Next_Refresh_At = VALUES(Next_Refresh_At),
+                          Interval_Seconds = VALUES(Interval_Seconds),
+                          Last_Video_Count = VALUES(Last_Video_Count),
+                          Estimated_Units = VALUES(Estimated_Units),
+                          Refresh_Units = 0,
+                          Full_Refresh = FALSE,
+                          Last_Refreshed_At = VALUES(Last_Refreshed_At)''',
+                   (channel_id, interval, interval, video_count, estimate))
+
+
+# Function to return the IDs among video_ids that are already stored
+def stored_video_ids(cursor, video_ids):
+    if not video_ids:
+        return set()
+    cursor.execute("SELECT Video_Id FROM videos WHERE Video_Id IN ({})".format(", ".join(["%s"] * len(video_ids))),
+                   list(video_ids))
+    return set(row[0] for row in cursor.fetchall())
+
+
+# Job handlers: run one unit of work and return the follow-up jobs as (kind, payload, dedupe key)
+# They call the app functions that raise API and database errors, so that run_job can defer a job
+# on quotaExceeded or retry it, and write on the job's connection
+
+# The channel is always read from the API: a cached videoCount would make update_schedule back off
+def run_channel_job(client, connection, cursor, payload):
+    channel_id = payload["channel_id"]
+    channel_info = app.fetch_channel_info(client, channel_id, use_cache=False)
+    if not channel_info:
+        raise LookupError("Channel {} not found".format(channel_id))
+    app.write_channel_details(connection, channel_info)
+    update_schedule(cursor, channel_id, int(channel_info[0]["Total_Videos"]))
+    page = {"channel_id": channel_id, "playlist_id": channel_info[0]["Playlist_Id"], "page_token": None,
+            "full": bool(payload.get("full")), "max_comments": payload.get("max_comments")}
+    return [("playlists", {"channel_id": channel_id}, "playlists:" + channel_id),
+            ("video_page", page, "video_page:{}:".format(channel_id))]
+
+
+def run_playlists_job(client, connection, cursor, payload):
+    playlists = app.fetch_playlist_details(client, payload["channel_id"])
+    if playlists:
+        app.write_playlist_details(connection, playlists)
+    return []
+
+
+# One page of uploads: new videos get their comments queued; paging stops at the first page
+# without new videos unless the payload asks for a full refresh of every video's statistics
+# The uploads page is not served from the response cache, which could hide the newest uploads
+def run_video_page_job(client, connection, cursor, payload):
+    channel_id = payload["channel_id"]
+    video_ids, next_page_token = app.fetch_video_id_page(client, payload["playlist_id"], payload["page_token"],
+                                                         use_cache=False)
+    stored_ids = stored_video_ids(cursor, video_ids)
+    new_ids = [video_id for video_id in video_ids if video_id not in stored_ids]
+    items, missing_ids = app.fetch_video_items(client, video_ids)
+    videos = [app.parse_video_item(item) for item in items]
+    if videos:
+        app.write_video_details(connection, videos)
+        app.update_harvest_state(connection, channel_id, videos)
+        app.refresh_channel_stats(connection, [channel_id])
+        app.refresh_comment_counts(connection, video_ids)
+
+    follow_ups = [("comment_page", {"channel_id": channel_id, "video_id": video_id, "page_token": None,
+                                    "remaining": payload.get("max_comments")},
+                   "comment_page:{}:".format(video_id))
+                  for video_id in new_ids if video_id not in missing_ids]
+    if next_page_token and (new_ids or payload.get("full")):
+        follow_ups.append(("video_page", dict(payload, page_token=next_page_token),
+                           "video_page:{}:{}".format(channel_id, next_page_token)))
+    return follow_ups
+
+
+def run_comment_page_job(client, connection, cursor, payload):
+    video_id = payload["video_id"]
+    try:
+        comments, next_page_token = next(app.iter_comment_pages(client, video_id, payload["page_token"]))
+    except HttpError as e:
+        if e.resp.status in (403, 404) and app.get_error_reason(e) in app.UNAVAILABLE_COMMENT_REASONS:
+            return []
+        raise
+    remaining = payload.get("remaining")
+    if remaining is not None:
+        comments = comments[:remaining]
+        remaining -= len(comments)
+    if comments:
+        app.write_comment_details(connection, comments)
+        app.refresh_comment_counts(connection, [video_id])
+    if next_page_token and (remaining is None or remaining > 0):
+        return [("comment_page", dict(payload, page_token=next_page_token, remaining=remaining),
+                 "comment_page:{}:{}".format(video_id, next_page_token))]
+    return []
+
+
+JOB_HANDLERS = {
+    "channel": run_channel_job,
+    "playlists": run_playlists_job,
+    "video_page": run_video_page_job,
+    "comment_page": run_comment_page_job
+}
+
+
+# Function to run one leased job; its follow-ups, quota units and completion are committed together
+# The units of failed attempts are not charged to the channel's refresh
+def run_job(client, job, worker_id):
+    with app.pooled_connection() as connection:
+        try:
+            with app.metrics.timed("youtube_job", kind=job["kind"]):
+                cursor = connection.cursor()
+                start_units = thread_units()
+                for kind, payload, dedupe_key in JOB_HANDLERS[job["kind"]](client, connection, cursor, job["payload"]):
+                    enqueue(cursor, kind, payload, dedupe_key)
+                charge_units(cursor, job["payload"].get("channel_id"), thread_units() - start_units)
+                complete_job(cursor, job, worker_id)
+                connection.commit()
+                cursor.close()
+        except app.QuotaExceededError:
+            connection.rollback()
+            defer_job(connection, job, worker_id, seconds_until_quota_reset())
+        except Exception as e:
+            connection.rollback()
+            if isinstance(e, HttpError) and app.get_error_reason(e) == "quotaExceeded":
+                defer_job(connection, job, worker_id, seconds_until_quota_reset())
+                return
+            logging.warning("Job %s (%s) failed on attempt %d: %s", job["id"], job["kind"], job["attempts"], e)
+            fail_job(connection, job, worker_id, e)
+
+
+# Function to register channels with the scheduler, due right away
+def add_channels(connection, channel_ids, full=False):
+    cursor = connection.cursor()
+    cursor.executemany('''INSERT INTO channel_schedule (Channel_Id, Next_Refresh_At, Interval_Seconds, Full_Refresh)
+                          VALUES (%s, NOW(), %s, %s)
+                          ON DUPLICATE KEY UPDATE Next_Refresh_At = NOW(), Full_Refresh = VALUES(Full_Refresh)''',
+                       [(channel_id, DEFAULT_REFRESH_SECONDS, full) for channel_id in channel_ids])
+    connection.commit()
+    cursor.close()
+
+
+# Function to enqueue due channels, most overdue first, while their estimated units fit in budget_units
+# A channel that doesn't fit is left for a later tick and smaller ones behind it still go; the most
+# overdue channel is always enqueued, so one larger than the whole budget isn't starved.
+# Their next refresh is pushed back by their interval, so the next tick doesn't pick them again;
+# the channel job sets the real next refresh time when it runs
+def schedule_due_channels(connection, budget_units, max_comments=None, limit=10000):
+    cursor = connection.cursor()
+    cursor.execute('''SELECT Channel_Id, Estimated_Units, Full_Refresh FROM channel_schedule
+                      WHERE Next_Refresh_At <= NOW()
+                      ORDER BY Next_Refresh_At
+                      LIMIT %s''', (limit,))
+    chosen = []
+    spent = 0
+    for channel_id, units, full in cursor.fetchall():
+        if chosen and spent + units > budget_units:
+            continue
+        chosen.append(channel_id)
+        spent += units
+        enqueue(cursor, "channel", {"channel_id": channel_id, "full": bool(full), "max_comments": max_comments},
+                "channel:" + channel_id)
+    if chosen:
+        cursor.execute('''UPDATE channel_schedule SET Next_Refresh_At = NOW() + INTERVAL Interval_Seconds SECOND
+                          WHERE Channel_Id IN ({})'''.format(", ".join(["%s"] * len(chosen))), chosen)
+    connection.commit()
+    cursor.close()
+    return chosen, spent
+
+
+# Function to count jobs by kind and status
+def queue_status(connection):
+    cursor = connection.cursor()
+    cursor.execute("SELECT Kind, Status, COUNT(*) FROM harvest_jobs GROUP BY Kind, Status ORDER BY Kind, Status")
+    rows = cursor.fetchall()
+    cursor.close()
+    return rows
+
+
+# Function to put every dead-lettered job back in the queue with fresh attempts
+def retry_dead_jobs(connection):
+    cursor = connection.cursor()
+    cursor.execute('''UPDATE harvest_jobs SET Status = 'queued', Attempts = 0, Available_At = NOW()
+                      WHERE Status = 'dead' ''')
+    count = cursor.rowcount
+    connection.commit()
+    cursor.close()
+    return count
+
+
+# Function to delete finished jobs older than the given number of days
+def purge_done_jobs(connection, days=7):
+    cursor = connection.cursor()
+    cursor.execute("DELETE FROM harvest_jobs WHERE Status = 'done' AND Updated_At < NOW() - INTERVAL %s DAY",
+                   (days,))
+    connection.commit()
+    cursor.close()
+
+
+# Worker process: leases a batch of jobs at a time and runs them on a thread pool
+def run_worker(api_key, threads, requests_per_second, daily_quota, poll_seconds, stop_when_idle=False):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(process)d %(levelname)s %(message)s")
+    worker_id = "{}:{}".format(socket.gethostname(), os.getpid())
+    # Every job writes on the one connection it holds; the extra ones are for leasing and the heartbeat
+    app.DB_POOL_SIZE = max(app.DB_POOL_SIZE, threads + 2)
+    app.api_limiter = MeteredRateLimiter(requests_per_second, daily_quota)
+    document = app.load_discovery_document()
+    engine = app.HarvestEngine(lambda: app.build_youtube_client(api_key, document), max_workers=threads)
+    stop = threading.Event()
+    threading.Thread(target=heartbeat, args=(worker_id, stop), daemon=True).start()
+    try:
+        while True:
+            with app.pooled_connection() as connection:
+                jobs = lease_jobs(connection, worker_id, threads * 2)
+            if not jobs:
+                if stop_when_idle:
+                    return
+                time.sleep(poll_seconds)
+                continue
+            engine.run(lambda client, job: run_job(client, job, worker_id), jobs)
+    finally:
+        stop.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Durable harvest job queue and refresh scheduler")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="register channels with the scheduler")
+    add.add_argument("channels_file", help="file with one channel ID per line")
+    add.add_argument("--full", action="store_true", help="walk every uploads page, refreshing all video stats")
+
+    schedule = commands.add_parser("schedule", help="enqueue the channels that are due")
+    schedule.add_argument("--daily-quota", type=int, default=10000, help="units the refreshes may use per day")
+    schedule.add_argument("--interval", type=int, default=300, help="seconds between ticks with --loop")
+    schedule.add_argument("--loop", action="store_true", help="keep scheduling every --interval seconds")
+    schedule.add_argument("--max-comments", type=int, default=None, help="cap on comments per new video")
+
+    worker = commands.add_parser("worker", help="run jobs from the queue")
+    worker.add_argument("--api-key", default=os.environ.get("YOUTUBE_API_KEY"), help="defaults to $YOUTUBE_API_KEY")
+    worker.add_argument("--processes", type=int, default=1)
+    worker.add_argument("--threads", type=int, default=4, help="jobs run concurrently per process")
+    worker.add_argument("--requests-per-second", type=float, default=10, help="shared by all processes of this host")
+    worker.add_argument("--daily-quota", type=int, default=10000, help="shared by all processes of this host")
+    worker.add_argument("--poll-seconds", type=float, default=5)
+    worker.add_argument("--stop-when-idle", action="store_true", help="exit once the queue is empty")
+
+    commands.add_parser("status", help="count jobs by kind and status")
+    commands.add_parser("retry-dead", help="requeue dead-lettered jobs")
+    purge = commands.add_parser("purge", help="delete finished jobs")
+    purge.add_argument("--days", type=int, default=7)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if app.db.name != "mysql":
+        raise SystemExit("The job queue needs MySQL 8, but YOUTUBE_STORAGE is {}".format(app.db.name))
+    connection = app.establish_connection()
+    if connection is None:
+        raise SystemExit("Could not connect to MySQL")
+    create_job_tables(connection)
+
+    if args.command == "add":
+        channel_ids = read_channel_ids(args.channels_file)
+        add_channels(connection, channel_ids, args.full)
+        print("{} channels scheduled".format(len(channel_ids)))
+    elif args.command == "schedule":
+        while True:
+            # Each tick may spend its share of the day's quota
+            budget = max(1, args.daily_quota * args.interval // 86400) if args.loop else args.daily_quota
+            chosen, units = schedule_due_channels(connection, budget, args.max_comments)
+            logging.info("Enqueued %d channels (about %d quota units)", len(chosen), units)
+            if not args.loop:
+                break
+            time.sleep(args.interval)
+    elif args.command == "worker":
+        if not args.api_key:
+            parser.error("an API key is required (--api-key or YOUTUBE_API_KEY)")
+        connection.close()
+        create_tables()
+        worker_args = (args.api_key, args.threads, args.requests_per_second / args.processes,
+                       args.daily_quota // args.processes, args.poll_seconds, args.stop_when_idle)
+        if args.processes == 1:
+            run_worker(*worker_args)
+        else:
+            processes = [multiprocessing.Process(target=run_worker, args=worker_args) for _ in range(args.processes)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+        return
+    elif args.command == "status":
+        for kind, status, count in queue_status(connection):
+            print("{:<13} {:<7} {}".format(kind, status, count))
+    elif args.command == "retry-dead":
+        print("{} jobs requeued".format(retry_dead_jobs(connection)))
+    elif args.command == "purge":
+        purge_done_jobs(connection, args.days)
+    connection.close()
+
+
+if __name__ == "__main__":
+    main()
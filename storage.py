@@ -0,0 +1,444 @@
+# Storage backends behind the `db` object of YouTube.py: MySQL (the default) and the embedded
+# SQLite and DuckDB engines, which keep everything in one local file and need no database server
+#
+#   YOUTUBE_STORAGE=sqlite YOUTUBE_STORAGE_PATH=youtube.sqlite3 streamlit run YouTube.py
+#
+# The SQL in YouTube.py is written for MySQL with %s placeholders. A backend supplies what differs
+# between the dialects (INSERT IGNORE, upserts, catalog lookups, JSON access, full-text search and a
+# few DDL clauses), and the connections of the embedded engines accept the %s placeholders.
+
+import html
+import importlib
+import os
+import re
+import threading
+from datetime import datetime
+
+STORAGE = os.environ.get("YOUTUBE_STORAGE", "mysql").lower()
+STORAGE_PATH = os.environ.get("YOUTUBE_STORAGE_PATH")
+
+
+# Function to split text into lower-case search words; comments arrive as HTML, so tags and entities are removed
+def search_words(text):
+    text = html.unescape(re.sub(r"<[^>]*>", " ", text or ""))
+    return [word for word in re.findall(r"\w+", text.lower()) if len(word) <= 100]
+
+
+# MySQL through MySQL Connector; connections come from the pool in YouTube.py
+class MySQLBackend:
+    name = "mysql"
+    label = "MySQL"
+    secondary_indexes = True
+    search_postings = False
+
+    # mysql.connector is imported on first use, like in YouTube.py
+    @property
+    def Error(self):
+        return importlib.import_module("mysql.connector").Error
+
+    def insert_prefix(self, ignore=False):
+        return "INSERT IGNORE INTO" if ignore else "INSERT INTO"
+
+    # Clause turning an INSERT into an upsert on the given key columns, followed by the assignments
+    def upsert_clause(self, keys):
+        return "ON DUPLICATE KEY UPDATE"
+
+    # The value an upsert tried to insert into column, for use in its assignments
+    def new_value(self, column):
+        return "VALUES({})".format(column)
+
+    # Text at a JSON path of a column, e.g. '$.high.url'
+    def json_text(self, column, path):
+        return "JSON_UNQUOTE(JSON_EXTRACT({}, '{}'))".format(column, path)
+
+    def column_exists(self, cursor, table, column):
+        cursor.execute('''SELECT COUNT(*) FROM information_schema.COLUMNS
+                          WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s''', (table, column))
+        return cursor.fetchone()[0] > 0
+
+    def index_exists(self, cursor, table, index):
+        cursor.execute('''SELECT COUNT(*) FROM information_schema.STATISTICS
+                          WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s''', (table, index))
+        return cursor.fetchone()[0] > 0
+
+    # Runs a CREATE TABLE written for MySQL
+    def create_table(self, cursor, ddl):
+        cursor.execute(ddl)
+
+    # FULLTEXT index over the text columns of table; InnoDB keeps it up to date on every write
+    def create_search_index(self, cursor, table, key, columns):
+        index = "ft_{}_text".format(table)
+        if not self.index_exists(cursor, table, index):
+            cursor.execute("ALTER TABLE {} ADD FULLTEXT INDEX {} ({})".format(table, index, ", ".join(columns)))
+
+    # Query ranking the rows of table (alias t) by relevance to the words of text; returns (query, params)
+    # Natural language mode ignores stopwords and, by default, words shorter than 3 characters
+    def search_query(self, table, key, columns, select, text, limit):
+        match = "MATCH({}) AGAINST (%s IN NATURAL LANGUAGE MODE)".format(", ".join(columns))
+        words = " ".join(search_words(text))
+        return ("SELECT {}, {} AS Score FROM {} t WHERE {} ORDER BY Score DESC LIMIT {:d}".format(
+            select, match, table, match, limit), (words, words))
+
+
+# Cursor of an embedded engine that takes the %s placeholders of the MySQL queries
+class EmbeddedCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def execute(self, query, params=()):
+        self.cursor.execute(query.replace("%s", "?"), tuple(params or ()))
+        return self
+
+    def executemany(self, query, rows):
+        self.cursor.executemany(query.replace("%s", "?"), [tuple(row) for row in rows])
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+    def fetchmany(self, size):
+        return self.cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    @property
+    def description(self):
+        return self.cursor.description
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
+    def close(self):
+        self.cursor.close()
+
+
+# Statements that change rows; on DuckDB the first one opens the connection's transaction
+DML_PATTERN = re.compile(r"\s*(INSERT|UPDATE|DELETE)\b", re.IGNORECASE)
+
+
+# Column list of an INSERT and the key columns of its ON CONFLICT ... DO UPDATE clause
+INSERT_COLUMNS_PATTERN = re.compile(r"INSERT\s+(?:OR\s+\w+\s+)?INTO\s+\S+\s*\(([^)]*)\)", re.IGNORECASE)
+UPSERT_KEYS_PATTERN = re.compile(r"ON\s+CONFLICT\s*\(([^)]*)\)\s*DO\s+UPDATE", re.IGNORECASE)
+
+
+# Function to tell whether two rows of an upsert batch share a conflict key
+# A multi-row upsert on DuckDB keeps the first of those rows, where MySQL applies them in order
+def has_duplicate_keys(query, rows):
+    keys = UPSERT_KEYS_PATTERN.search(query)
+    if keys is None:
+        return False
+    columns = INSERT_COLUMNS_PATTERN.search(query)
+    if columns is None:
+        return True
+    names = [name.strip() for name in columns.group(1).split(",")]
+    positions = [names.index(key.strip()) for key in keys.group(1).split(",") if key.strip() in names]
+    if not positions:
+        return True
+    seen = set()
+    for row in rows:
+        key = tuple(row[position] for position in positions)
+        if key in seen:
+            return True
+        seen.add(key)
+    return False
+
+
+# DuckDB runs an executemany INSERT as one statement per row, which is slow; like MySQL Connector,
+# the rows are sent as a single multi-row VALUES statement instead. An upsert batch that meets the
+# same key twice is written one row at a time, so the last row wins as on MySQL.
+# Errors are raised, and the connection's transaction is rolled back by the caller
+# All cursors of a connection run on its DuckDB connection, which holds the open transaction
+class DuckDBCursor(EmbeddedCursor):
+    def __init__(self, cursor, connection):
+        super().__init__(cursor)
+        self.connection = connection
+
+    def execute(self, query, params=()):
+        self.connection.begin(query)
+        return super().execute(query, params)
+
+    def executemany(self, query, rows):
+        self.connection.begin(query)
+        rows = [tuple(row) for row in rows]
+        match = re.search(r"VALUES\s*(\([^)]*\))", query)
+        if match is None or len(rows) < 2 or has_duplicate_keys(query, rows):
+            return super().executemany(query, rows)
+        values = ", ".join([match.group(1)] * len(rows))
+        statement = query[:match.start(1)] + values + query[match.end(1):]
+        self.cursor.execute(statement.replace("%s", "?"), [value for row in rows for value in row])
+
+    # The DuckDB connection stays open for the other cursors; DuckDBConnection.close closes it
+    def close(self):
+        pass
+
+
+# Connection of an embedded engine with the parts of the MySQL Connector API that YouTube.py uses
+class EmbeddedConnection:
+    # Embedded results are never left unread on the connection
+    unread_result = False
+
+    def __init__(self, connection, backend):
+        self.connection = connection
+        self.backend = backend
+
+    def cursor(self, **kwargs):
+        return self.backend.cursor_class(self.connection.cursor())
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def consume_results(self):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        self.connection.close()
+
+
+# DuckDB connections run in autocommit mode. Like MySQL Connector and sqlite3, this connection opens
+# a transaction at the first INSERT, UPDATE or DELETE that lasts until commit(); an uncommitted
+# transaction is rolled back on close. DDL commits the open transaction first, as in MySQL.
+class DuckDBConnection(EmbeddedConnection):
+    def __init__(self, connection, backend):
+        super().__init__(connection, backend)
+        self.in_transaction = False
+
+    def cursor(self, **kwargs):
+        return DuckDBCursor(self.connection, self)
+
+    # Called by the cursors before every statement
+    def begin(self, query):
+        if DML_PATTERN.match(query):
+            if not self.in_transaction:
+                self.connection.begin()
+                self.in_transaction = True
+        elif not re.match(r"\s*(SELECT|WITH)\b", query, re.IGNORECASE):
+            self.commit()
+
+    def commit(self):
+        if self.in_transaction:
+            self.in_transaction = False
+            self.connection.commit()
+
+    def rollback(self):
+        if self.in_transaction:
+            self.in_transaction = False
+            self.connection.rollback()
+
+    def close(self):
+        self.rollback()
+        self.connection.close()
+
+
+# Shared by the SQLite and DuckDB backends: ON CONFLICT upserts and DDL translated from MySQL
+class EmbeddedBackend:
+    secondary_indexes = True
+    search_postings = False
+    cursor_class = EmbeddedCursor
+
+    def __init__(self, path):
+        self.path = path
+
+    def insert_prefix(self, ignore=False):
+        return "INSERT OR IGNORE INTO" if ignore else "INSERT INTO"
+
+    def upsert_clause(self, keys):
+        return "ON CONFLICT ({}) DO UPDATE SET".format(", ".join(keys))
+
+    def new_value(self, column):
+        return "excluded." + column
+
+    # Translates a MySQL CREATE TABLE; inline KEY clauses become CREATE INDEX statements
+    # ON UPDATE CURRENT_TIMESTAMP is dropped, so Updated_At columns keep their insert time, and
+    # BOOLEAN becomes TINYINT, which is what MySQL stores and returns for it
+    def create_table(self, cursor, ddl):
+        table = re.search(r"CREATE TABLE IF NOT EXISTS (\w+)", ddl).group(1)
+        before = []
+        after = []
+
+        def auto_increment(match):
+            return self.auto_increment_column(table, match.group(1), before)
+
+        def index(match):
+            if self.secondary_indexes:
+                after.append("CREATE INDEX IF NOT EXISTS {} ON {} ({})".format(match.group(1), table, match.group(2)))
+            return ""
+
+        ddl = re.sub(r"(\w+) INT AUTO_INCREMENT PRIMARY KEY", auto_increment, ddl)
+        ddl = re.sub(r",\s*KEY (\w+) \(([^)]*)\)", index, ddl)
+        ddl = re.sub(r"UNIQUE KEY (\w+) \(", r"CONSTRAINT \1 UNIQUE (", ddl)
+        ddl = re.sub(r"\s+CHARACTER SET \w+ COLLATE \w+", "", ddl)
+        ddl = ddl.replace(" ON UPDATE CURRENT_TIMESTAMP", "")
+        ddl = re.sub(r"\bBOOLEAN\b", "TINYINT", ddl)
+        for statement in before + [ddl] + after:
+            cursor.execute(statement)
+
+
+# Function to read a TIMESTAMP column of SQLite (stored as text) back as a datetime, like MySQL returns it
+def convert_sqlite_timestamp(value):
+    return datetime.fromisoformat(value.decode())
+
+
+# SQLite file database; every borrowed connection is a new sqlite3 connection in WAL mode,
+# so readers don't block the writer and harvest threads wait for each other's writes
+class SQLiteBackend(EmbeddedBackend):
+    name = "sqlite"
+    label = "SQLite"
+
+    @property
+    def Error(self):
+        import sqlite3
+        return sqlite3.Error
+
+    def connect(self):
+        import sqlite3
+        sqlite3.register_converter("TIMESTAMP", convert_sqlite_timestamp)
+        connection = sqlite3.connect(self.path, timeout=30, detect_types=sqlite3.PARSE_DECLTYPES)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return EmbeddedConnection(connection, self)
+
+    def auto_increment_column(self, table, column, before):
+        return "{} INTEGER PRIMARY KEY AUTOINCREMENT".format(column)
+
+    def json_text(self, column, path):
+        return "json_extract({}, '{}')".format(column, path)
+
+    def column_exists(self, cursor, table, column):
+        cursor.execute("SELECT name FROM pragma_table_info(%s)", (table,))
+        return any(name.lower() == column.lower() for (name,) in cursor.fetchall())
+
+    def index_exists(self, cursor, table, index):
+        cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND name = %s",
+                       (table, index))
+        return cursor.fetchone()[0] > 0
+
+    def table_exists(self, cursor, table):
+        cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = %s", (table,))
+        return cursor.fetchone()[0] > 0
+
+    # FTS5 index {table}_fts over the key and the text columns of table. The key is stored UNINDEXED
+    # and hits are joined back on it: the rowids of a table with a VARCHAR primary key can change on VACUUM.
+    # An index of the earlier rowid layout is rebuilt, and an empty index is filled from the table.
+    # Triggers index every inserted row and re-index a row whose text columns change; removing a row
+    # scans the index for its key, which is fine as the app never deletes videos or comments
+    def create_search_index(self, cursor, table, key, columns):
+        index = table + "_fts"
+        names = ", ".join(columns)
+        triggers = [index + "_insert", index + "_delete", index + "_update"]
+        if self.table_exists(cursor, index) and not self.column_exists(cursor, index, key):
+            for trigger in triggers:
+                cursor.execute("DROP TRIGGER IF EXISTS " + trigger)
+            cursor.execute("DROP TABLE " + index)
+        remove = "DELETE FROM {} WHERE {} = old.{};".format(index, key, key)
+        add = "INSERT INTO {0} ({1}, {2}) VALUES (new.{1}, {3});".format(
+            index, key, names, ", ".join("new." + column for column in columns))
+        cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS {} USING fts5({} UNINDEXED, {})".format(index, key, names))
+        cursor.execute("CREATE TRIGGER IF NOT EXISTS {} AFTER INSERT ON {} BEGIN {} END".format(triggers[0], table, add))
+        cursor.execute("CREATE TRIGGER IF NOT EXISTS {} AFTER DELETE ON {} BEGIN {} END".format(triggers[1], table, remove))
+        cursor.execute("CREATE TRIGGER IF NOT EXISTS {} AFTER UPDATE OF {} ON {} BEGIN {} {} END".format(
+            triggers[2], names, table, remove, add))
+        cursor.execute("SELECT COUNT(*) FROM " + index)
+        if cursor.fetchone()[0] == 0:
+            cursor.execute("INSERT INTO {0} ({1}, {2}) SELECT {1}, {2} FROM {3}".format(index, key, names, table))
+
+    # Any of the words may match; rows are ranked by BM25
+    def search_query(self, table, key, columns, select, text, limit):
+        index = table + "_fts"
+        match = " OR ".join('"{}"'.format(word) for word in search_words(text))
+        return ('''SELECT {1}, -bm25({0}) AS Score FROM {0} JOIN {2} t ON t.{4} = {0}.{4}
+                   WHERE {0} MATCH %s ORDER BY bm25({0}) LIMIT {3:d}'''.format(index, select, table, limit, key), (match,))
+
+
+# DuckDB file database, opened once per process; every borrowed connection is a cursor of it,
+# which DuckDB allows to be used from its own thread. DuckDB scans columns fast enough without
+# secondary indexes, and an index would stop later migrations from dropping columns of its table.
+class DuckDBBackend(EmbeddedBackend):
+    name = "duckdb"
+    label = "DuckDB"
+    secondary_indexes = False
+    search_postings = True
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.database = None
+        self.lock = threading.Lock()
+
+    @property
+    def Error(self):
+        import duckdb
+        return duckdb.Error
+
+    def connect(self):
+        import duckdb
+        with self.lock:
+            if self.database is None:
+                self.database = duckdb.connect(self.path)
+            return DuckDBConnection(self.database.cursor(), self)
+
+    def close(self):
+        with self.lock:
+            if self.database is not None:
+                self.database.close()
+                self.database = None
+
+    # DuckDB has no AUTO_INCREMENT; the key defaults to the next value of a sequence
+    def auto_increment_column(self, table, column, before):
+        sequence = "{}_{}_seq".format(table, column)
+        before.append("CREATE SEQUENCE IF NOT EXISTS {}".format(sequence))
+        return "{} BIGINT DEFAULT nextval('{}') PRIMARY KEY".format(column, sequence)
+
+    def json_text(self, column, path):
+        return "json_extract_string({}, '{}')".format(column, path)
+
+    def column_exists(self, cursor, table, column):
+        cursor.execute('''SELECT COUNT(*) FROM information_schema.columns
+                          WHERE table_name = %s AND lower(column_name) = lower(%s)''', (table, column))
+        return cursor.fetchone()[0] > 0
+
+    def index_exists(self, cursor, table, index):
+        cursor.execute("SELECT COUNT(*) FROM duckdb_indexes() WHERE table_name = %s AND index_name = %s",
+                       (table, index))
+        return cursor.fetchone()[0] > 0
+
+    # DuckDB's fts extension can only rebuild its index as a whole, so the app keeps its own
+    # inverted index in search_postings instead (see index_search_documents in YouTube.py)
+    def create_search_index(self, cursor, table, key, columns):
+        pass
+
+    # Rows are ranked by the summed weight of the words they contain: idf times the saturated word count
+    def search_query(self, table, key, columns, select, text, limit):
+        words = sorted(set(search_words(text)))
+        terms = ", ".join(["%s"] * len(words))
+        query = '''SELECT {select}, s.Score FROM (
+                       SELECT p.Doc_Id, SUM(w.Weight * p.Hits / (p.Hits + 1.2)) AS Score
+                       FROM search_postings p
+                       JOIN (SELECT Term, LN(1 + (SELECT COUNT(*) FROM {table}) / COUNT(*)) AS Weight
+                             FROM search_postings
+                             WHERE Doc_Table = %s AND Term IN ({terms})
+                             GROUP BY Term) w ON w.Term = p.Term
+                       WHERE p.Doc_Table = %s AND p.Term IN ({terms})
+                       GROUP BY p.Doc_Id
+                       ORDER BY Score DESC LIMIT {limit:d}) s
+                   JOIN {table} t ON t.{key} = s.Doc_Id
+                   ORDER BY s.Score DESC'''.format(select=select, table=table, key=key, terms=terms, limit=limit)
+        return query, [table] + words + [table] + words
+
+
+BACKENDS = {"mysql": MySQLBackend, "sqlite": SQLiteBackend, "duckdb": DuckDBBackend}
+DEFAULT_PATHS = {"sqlite": "youtube.sqlite3", "duckdb": "youtube.duckdb"}
+
+
+# Function to create a backend by name; path is the database file of the embedded engines
+def create_backend(name=STORAGE, path=STORAGE_PATH):
+    if name not in BACKENDS:
+        raise ValueError("Unknown storage backend {!r}, expected one of {}".format(name, ", ".join(BACKENDS)))
+    if name == "mysql":
+        return MySQLBackend()
+    return BACKENDS[name](path or DEFAULT_PATHS[name])
@@ -0,0 +1,350 @@
+# Columnar Parquet warehouse of the harvested tables
+#
+#   python warehouse.py export                          # full snapshot of every channel
+#   python warehouse.py export --channel UC... UC...    # rewrite only these channels' partitions
+#   python warehouse.py query --engine duckdb           # the 10 analytic questions on the Parquet files
+#
+# Layout (hive partitioning; paths starting with "_" or "." are ignored by readers):
+#   warehouse/channels/Channel_Id=<id>/part-0.parquet
+#   warehouse/playlists/Channel_Id=<id>/part-0.parquet
+#   warehouse/videos/Channel_Id=<id>/Publish_Month=<YYYY-MM>/part-0.parquet
+#   warehouse/comments/Channel_Id=<id>/Comment_Month=<YYYY-MM>/part-0.parquet
+#
+# A channel's partitions are written to a staging folder and swapped in, so a reader sees
+# either the old or the new data of a channel. Needs pyarrow; the duckdb engine needs duckdb.
+
+import argparse
+import os
+import shutil
+import time
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import YouTube as app
+
+WAREHOUSE_DIR = os.environ.get("YOUTUBE_WAREHOUSE_DIR", "warehouse")
+
+# Per table: the rows of one channel (t is the exported table), the stored columns and
+# the timestamp column the month partition is derived from
+WAREHOUSE_TABLES = {
+    "channels": {
+        "source": "channels t",
+        "channel_column": "t.Channel_Id",
+        "columns": [("Channel_Name", pa.string()), ("Subscribers", pa.int64()), ("Views", pa.int64()),
+                    ("Total_Videos", pa.int64()), ("Channel_Description", pa.string()),
+                    ("Playlist_Id", pa.string())],
+        "month": None
+    },
+    "playlists": {
+        "source": "playlists t",
+        "channel_column": "t.Channel_id",
+        "columns": [("Playlist_id", pa.string()), ("Title", pa.string()), ("Channel_Title", pa.string()),
+                    ("Published_Date", pa.timestamp("us")), ("Item_Count", pa.int64())],
+        "month": None
+    },
+    "videos": {
+        "source": "videos t",
+        "channel_column": "t.Channel_Id",
+        "columns": [("Video_Name", pa.string()), ("Video_Id", pa.string()), ("Title", pa.string()),
+                    ("Description", pa.string()), ("Publish_Date", pa.timestamp("us")), ("Duration", pa.string()),
+                    ("Definition", pa.string()), ("Caption", pa.int64()), ("Views_Count", pa.int64()),
+                    ("Comments", pa.int64()), ("Favorite_Count", pa.int64()), ("Like_Count", pa.int64()),
+                    ("Dislike_Count", pa.int64()), ("Thumbnail_Url", pa.string()),
+                    ("Duration_Seconds", pa.int64())],
+        "month": ("Publish_Date", "Publish_Month")
+    },
+    "comments": {
+        "source": "comments t INNER JOIN videos v ON t.Video_Id = v.Video_Id",
+        "channel_column": "v.Channel_Id",
+        "columns": [("Comment_Id", pa.string()), ("Video_Id", pa.string()), ("Text_Display", pa.string()),
+                    ("Author_Name", pa.string()), ("Comment_Date", pa.timestamp("us")), ("Parent_Id", pa.string())],
+        "month": ("Comment_Date", "Comment_Month")
+    }
+}
+
+
+# Function to get the schema of a stored table, without its partition columns
+def file_schema(table):
+    return pa.schema(WAREHOUSE_TABLES[table]["columns"])
+
+
+# Function to get the hive partitioning of a table
+def table_partitioning(table):
+    fields = [("Channel_Id", pa.string())]
+    if WAREHOUSE_TABLES[table]["month"]:
+        fields.append((WAREHOUSE_TABLES[table]["month"][1], pa.string()))
+    return ds.partitioning(pa.schema(fields), flavor="hive")
+
+
+# Function to write one channel's rows of a table under folder; returns the rows written
+def write_channel_rows(connection, table, channel_id, folder, chunk_size=app.QUERY_CHUNK_SIZE):
+    spec = WAREHOUSE_TABLES[table]
+    schema = file_schema(table)
+    query = "SELECT {} FROM {} WHERE {} = %s".format(
+        ", ".join("t." + name for name in schema.names), spec["source"], spec["channel_column"])
+    written = 0
+    for number, (columns, rows) in enumerate(app.iter_query_chunks(connection, query, (channel_id,), chunk_size)):
+        if not rows:
+            continue
+        values = list(zip(*rows))
+        arrays = [pa.array(column, type=field.type) for column, field in zip(values, schema)]
+        names = list(schema.names)
+        partition_cols = None
+        if spec["month"]:
+            dates = values[schema.names.index(spec["month"][0])]
+            arrays.append(pa.array([date.strftime("%Y-%m") if date else "unknown" for date in dates], pa.string()))
+            names.append(spec["month"][1])
+            partition_cols = [spec["month"][1]]
+        pq.write_to_dataset(pa.Table.from_arrays(arrays, names=names), folder, partition_cols=partition_cols,
+                            basename_template="part-{}-{{i}}.parquet".format(number))
+        written += len(rows)
+    return written
+
+
+# Function to rewrite every table partition of one channel
+# Used after a harvest; the other channels' files are left untouched
+# The new partition is written next to the old one and swapped in with two renames, so a reader
+# never sees a half-deleted folder; the old folder is only deleted once the new one is in place
+@app.instrumented("db")
+def export_channel(connection, channel_id, root=WAREHOUSE_DIR):
+    rows = {}
+    for table in WAREHOUSE_TABLES:
+        table_dir = os.path.join(root, table)
+        staging = os.path.join(table_dir, "_staging-" + channel_id)
+        previous = os.path.join(table_dir, "_previous-" + channel_id)
+        target = os.path.join(table_dir, "Channel_Id=" + channel_id)
+        # A run killed between the two renames left the old partition aside
+        if os.path.isdir(previous) and not os.path.exists(target):
+            os.rename(previous, target)
+        shutil.rmtree(previous, ignore_errors=True)
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        rows[table] = write_channel_rows(connection, table, channel_id, staging)
+        if os.path.exists(target):
+            os.rename(target, previous)
+        if rows[table]:
+            os.rename(staging, target)
+        else:
+            shutil.rmtree(staging)
+        shutil.rmtree(previous, ignore_errors=True)
+    app.metrics.increment("youtube_warehouse_channels_exported_total")
+    return rows
+
+
+# Function to list every channel with stored data
+# Not read through the query cache: this module's copy of the app doesn't see the writes of the app
+# that imported it, so a cached list could miss channels harvested since
+def stored_channel_ids(connection):
+    cursor = connection.cursor()
+    cursor.execute("SELECT Channel_Id FROM channels UNION SELECT Channel_Id FROM videos")
+    rows = cursor.fetchall()
+    cursor.close()
+    return sorted(row[0] for row in rows if row[0])
+
+
+# Function to export a full snapshot: every channel goes into a new folder that replaces root at the end
+def export_snapshot(connection, root=WAREHOUSE_DIR):
+    start = time.perf_counter()
+    staging = root.rstrip(os.sep) + ".staging"
+    shutil.rmtree(staging, ignore_errors=True)
+    totals = dict((table, 0) for table in WAREHOUSE_TABLES)
+    channel_ids = stored_channel_ids(connection)
+    for channel_id in channel_ids:
+        for table, count in export_channel(connection, channel_id, staging).items():
+            totals[table] += count
+    os.makedirs(staging, exist_ok=True)
+    previous = root.rstrip(os.sep) + ".previous"
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(root):
+        os.rename(root, previous)
+    os.rename(staging, root)
+    shutil.rmtree(previous, ignore_errors=True)
+    return {"channels": len(channel_ids), "rows": totals, "seconds": time.perf_counter() - start}
+
+
+# Function to open a table of the warehouse as a pyarrow dataset (an empty table if never exported)
+def open_table(root, table):
+    partitioning = table_partitioning(table)
+    schema = pa.unify_schemas([file_schema(table), partitioning.schema])
+    path = os.path.join(root, table)
+    if not os.path.isdir(path):
+        return schema.empty_table()
+    return ds.dataset(path, format="parquet", partitioning=partitioning, schema=schema)
+
+
+# The 10 analytic questions over the base tables
+# The warehouse has no summary tables; columnar scans make the GROUP BYs cheap
+WAREHOUSE_QUERIES = [
+    """SELECT v.Title AS Video_Title, c.Channel_Name
+       FROM videos v INNER JOIN channels c ON v.Channel_Id = c.Channel_Id""",
+    """SELECT c.Channel_Name, COUNT(*) AS Video_Count
+       FROM videos v INNER JOIN channels c ON v.Channel_Id = c.Channel_Id
+       GROUP BY c.Channel_Id, c.Channel_Name
+       ORDER BY Video_Count DESC""",
+    """SELECT v.Title AS Video_Name, c.Channel_Name, v.Views_Count
+       FROM videos v INNER JOIN channels c ON v.Channel_Id = c.Channel_Id
+       ORDER BY v.Views_Count DESC
+       LIMIT 10""",
+    """SELECT v.Title AS Video_Name, COUNT(cm.Comment_Id) AS Comment_Count
+       FROM videos v LEFT JOIN comments cm ON v.Video_Id = cm.Video_Id
+       GROUP BY v.Video_Id, v.Title""",
+    """SELECT v.Title AS Video_Name, c.Channel_Name, v.Like_Count
+       FROM videos v INNER JOIN channels c ON v.Channel_Id = c.Channel_Id
+       ORDER BY v.Like_Count DESC
+       LIMIT 10""",
+    """SELECT v.Title AS Video_Name, CAST(SUM(v.Like_Count) AS BIGINT) AS Total_Likes,
+              CAST(SUM(v.Dislike_Count) AS BIGINT) AS Total_Dislikes
+       FROM videos v
+       GROUP BY v.Video_Id, v.Title""",
+    """SELECT c.Channel_Name, CAST(SUM(v.Views_Count) AS BIGINT) AS Total_Views
+       FROM videos v INNER JOIN channels c ON v.Channel_Id = c.Channel_Id
+       GROUP BY c.Channel_Id, c.Channel_Name""",
+    """SELECT DISTINCT c.Channel_Name
+       FROM channels c INNER JOIN videos v ON c.Channel_Id = v.Channel_Id
+       WHERE v.Publish_Date >= TIMESTAMP '2022-01-01' AND v.Publish_Date < TIMESTAMP '2024-01-01'""",
+    """SELECT c.Channel_Name, AVG(v.Duration_Seconds) AS Avg_Duration
+       FROM videos v INNER JOIN channels c ON v.Channel_Id = c.Channel_Id
+       GROUP BY c.Channel_Id, c.Channel_Name""",
+    """SELECT v.Title AS Video_Name, ch.Channel_Name, COUNT(*) AS Comment_Count
+       FROM comments cm
+       INNER JOIN videos v ON cm.Video_Id = v.Video_Id
+       INNER JOIN channels ch ON v.Channel_Id = ch.Channel_Id
+       GROUP BY v.Video_Id, v.Title, ch.Channel_Name
+       ORDER BY Comment_Count DESC
+       LIMIT 10"""
+]
+
+
+# Function to give an engine's result the column names of the MySQL version
+# Question 9 comes back as average seconds and is shown as HH:MM:SS like SEC_TO_TIME does
+def finish_result(df, number):
+    df.columns = app.ANALYTIC_QUERIES[number - 1]["columns"]
+    if number == 9:
+        df["Avg_Duration"] = [app.format_seconds(round(value)) if value == value else None
+                              for value in df["Avg_Duration"]]
+    return df
+
+
+# Function to run analytic question number (1-10) with DuckDB over the Parquet files
+# The tables are registered as pyarrow datasets, so DuckDB only reads the columns it needs
+def duckdb_query(root, number):
+    import duckdb
+    con = duckdb.connect()
+    try:
+        for table in WAREHOUSE_TABLES:
+            con.register(table, open_table(root, table))
+        return finish_result(con.execute(WAREHOUSE_QUERIES[number - 1]).fetch_df(), number)
+    finally:
+        con.close()
+
+
+# Function to load the given columns of a table
+def load_columns(root, table, columns):
+    return open_table(root, table).to_table(columns=columns)
+
+
+# Function to join a table holding Channel_Id with the channel names
+def with_channel_names(root, table):
+    return table.join(load_columns(root, "channels", ["Channel_Id", "Channel_Name"]), "Channel_Id", join_type="inner")
+
+
+# Function to keep the first n rows of a table by a column, largest first
+def top(table, column, n=10):
+    return table.sort_by([(column, "descending")]).slice(0, n)
+
+
+# Function to run analytic question number (1-10) with pyarrow compute only (no SQL engine)
+def pyarrow_query(root, number):
+    videos = lambda *columns: load_columns(root, "videos", list(columns))
+    if number == 1:
+        result = with_channel_names(root, videos("Title", "Channel_Id")).select(["Title", "Channel_Name"])
+    elif number == 2:
+        counts = videos("Channel_Id").group_by("Channel_Id").aggregate([("Channel_Id", "count")])
+        result = with_channel_names(root, counts).sort_by([("Channel_Id_count", "descending")])
+        result = result.select(["Channel_Name", "Channel_Id_count"])
+    elif number in (3, 5):
+        column = "Views_Count" if number == 3 else "Like_Count"
+        result = top(with_channel_names(root, videos("Title", "Channel_Id", column)), column)
+        result = result.select(["Title", "Channel_Name", column])
+    elif number == 4:
+        counts = load_columns(root, "comments", ["Video_Id"]).group_by("Video_Id").aggregate([("Video_Id", "count")])
+        result = videos("Video_Id", "Title").join(counts, "Video_Id", join_type="left outer")
+        result = result.set_column(result.schema.get_field_index("Video_Id_count"), "Video_Id_count",
+                                   pc.fill_null(result["Video_Id_count"], 0)).select(["Title", "Video_Id_count"])
+    elif number == 6:
+        result = videos("Video_Id", "Title", "Like_Count", "Dislike_Count").group_by(["Video_Id", "Title"]).aggregate(
+            [("Like_Count", "sum"), ("Dislike_Count", "sum")]).select(["Title", "Like_Count_sum", "Dislike_Count_sum"])
+    elif number == 7:
+        totals = videos("Channel_Id", "Views_Count").group_by("Channel_Id").aggregate([("Views_Count", "sum")])
+        result = with_channel_names(root, totals).select(["Channel_Name", "Views_Count_sum"])
+    elif number == 8:
+        published = open_table(root, "videos").to_table(
+            columns=["Channel_Id"],
+            filter=(ds.field("Publish_Date") >= pa.scalar(datetime(2022, 1, 1), pa.timestamp("us")))
+                   & (ds.field("Publish_Date") < pa.scalar(datetime(2024, 1, 1), pa.timestamp("us"))))
+        channel_ids = published.group_by("Channel_Id").aggregate([])
+        result = with_channel_names(root, channel_ids).group_by("Channel_Name").aggregate([])
+    elif number == 9:
+        averages = videos("Channel_Id", "Duration_Seconds").group_by("Channel_Id").aggregate(
+            [("Duration_Seconds", "mean")])
+        result = with_channel_names(root, averages).select(["Channel_Name", "Duration_Seconds_mean"])
+    elif number == 10:
+        counts = load_columns(root, "comments", ["Video_Id"]).group_by("Video_Id").aggregate([("Video_Id", "count")])
+        counted = videos("Video_Id", "Title", "Channel_Id").join(counts, "Video_Id", join_type="inner")
+        result = top(with_channel_names(root, counted), "Video_Id_count").select(
+            ["Title", "Channel_Name", "Video_Id_count"])
+    else:
+        raise ValueError("There are only {} analytic questions".format(len(app.ANALYTIC_QUERIES)))
+
+    return finish_result(result.to_pandas(), number)
+
+
+WAREHOUSE_ENGINES = {"duckdb": duckdb_query, "pyarrow": pyarrow_query}
+
+
+# Function to run analytic question number (1-10) on the warehouse with the given engine
+def run_analytic_query(number, engine="duckdb", root=WAREHOUSE_DIR):
+    with app.metrics.timed("youtube_warehouse_query", engine=engine, question=str(number)):
+        return WAREHOUSE_ENGINES[engine](root, number)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the harvested tables to Parquet and query them")
+    parser.add_argument("--root", default=WAREHOUSE_DIR, help="warehouse folder (default $YOUTUBE_WAREHOUSE_DIR)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write a snapshot, or only the given channels")
+    export.add_argument("--channel", nargs="+", default=None, help="channel IDs to rewrite incrementally")
+    query = commands.add_parser("query", help="run the analytic questions on the Parquet files")
+    query.add_argument("--engine", choices=sorted(WAREHOUSE_ENGINES), default="duckdb")
+    query.add_argument("--question", type=int, nargs="+", default=None, help="question numbers (default all)")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        connection = app.establish_connection()
+        if connection is None:
+            raise SystemExit("Could not connect to MySQL")
+        start = time.perf_counter()
+        if args.channel:
+            for channel_id in args.channel:
+                print("{}: {}".format(channel_id, export_channel(connection, channel_id, args.root)))
+        else:
+            stats = export_snapshot(connection, args.root)
+            print("Snapshot of {} channels: {}".format(stats["channels"], stats["rows"]))
+        connection.close()
+        print("Exported in {:.2f}s".format(time.perf_counter() - start))
+    else:
+        for number in args.question or range(1, len(app.ANALYTIC_QUERIES) + 1):
+            start = time.perf_counter()
+            result = run_analytic_query(number, args.engine, args.root)
+            print("{} ({} rows, {:.3f}s)".format(app.ANALYTIC_QUERIES[number - 1]["question"], len(result),
+                                                 time.perf_counter() - start))
+            print(result.head(10).to_string(index=False))
+            print()
+
+
+if __name__ == "__main__":
+    main()